@@ -0,0 +1,72 @@
+"""
+Tiny in-process ASGI client.
+
+Calls an ASGI application (ishemalink.asgi.application) directly with a
+hand-built HTTP scope, so benchmarks exercise the real middleware/view stack
+without a socket or a separate server process.
+"""
+import asyncio
+import json
+
+
+class ASGIResponse:
+    def __init__(self):
+        self.status = None
+        self.headers = {}
+        self.body = b''
+
+    def json(self):
+        return json.loads(self.body)
+
+
+async def request(app, method, path, data=None, headers=None, host='localhost'):
+    """
+    Sends one HTTP request to `app` and returns the collected ASGIResponse.
+    `data` is sent as a JSON body.
+    """
+    path, _, query = path.partition('?')
+    body = json.dumps(data).encode() if data is not None else b''
+
+    raw_headers = [(b'host', host.encode())]
+    if data is not None:
+        raw_headers.append((b'content-type', b'application/json'))
+        raw_headers.append((b'content-length', str(len(body)).encode()))
+    for name, value in (headers or {}).items():
+        raw_headers.append((name.lower().encode(), value.encode()))
+
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': query.encode(),
+        'root_path': '',
+        'headers': raw_headers,
+        'client': ('127.0.0.1', 50000),
+        'server': (host, 80),
+    }
+
+    sent_body = False
+
+    async def receive():
+        nonlocal sent_body
+        if not sent_body:
+            sent_body = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+        # The client never disconnects; Django cancels this wait once it has responded
+        await asyncio.Future()
+
+    response = ASGIResponse()
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response.status = message['status']
+            response.headers = {k.decode().lower(): v.decode() for k, v in message.get('headers', [])}
+        elif message['type'] == 'http.response.body':
+            response.body += message.get('body', b'')
+
+    await app(scope, receive, send)
+    return response
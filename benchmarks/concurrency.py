@@ -0,0 +1,139 @@
+"""
+Latency and throughput of the API as concurrent clients are added.
+
+    python -m benchmarks.concurrency --levels 1,8,32,64
+    python -m benchmarks.concurrency --only status_update,list --output after.json --compare before.json
+
+Uses the same seeded datasets, scenarios and in-process ASGI application as
+benchmarks.run, but instead of one throughput pass it sweeps the number of
+concurrent clients. At each level every request is timed, so the table shows
+how p50/p95/p99 latency degrade under load, not only requests per second.
+--compare prints the change in throughput and p95 against an earlier --output
+(e.g. the same sweep on the previous commit).
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.run import _timed_request, build_scenarios, install_query_counter, percentile, prepare_database
+
+DEFAULT_SCENARIOS = 'status_update,shipment_create,list,sector_active,cargo_list,cargo_create'
+
+
+async def sweep_level(app, factory, requests, clients, offset, token):
+    """
+    `requests` requests from `clients` concurrent clients; every request is timed.
+    """
+    latencies, errors = [], 0
+
+    async def client(share):
+        nonlocal errors
+        for _ in range(share):
+            elapsed, _, status = await asyncio.create_task(_timed_request(app, factory, next(offset), token))
+            latencies.append(elapsed)
+            errors += status >= 400
+
+    share = max(1, requests // clients)
+    start = time.perf_counter()
+    await asyncio.gather(*(client(share) for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        'requests': share * clients,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'throughput_rps': round(share * clients / elapsed, 1),
+        'errors': errors,
+    }
+
+
+def _change(now, before):
+    return f"{(now - before) / before:+.0%}" if before else 'n/a'
+
+
+def print_sweep(results, baseline=None):
+    print(f"{'endpoint':<16} {'clients':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'errors':>7}", end='')
+    print(f" {'req/s vs':>9} {'p95 vs':>8}" if baseline else '')
+    for name, levels in results['endpoints'].items():
+        for clients, row in levels.items():
+            print(
+                f"{name:<16} {clients:>7} {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f} "
+                f"{row['throughput_rps']:>8.1f} {row['errors']:>7}", end='',
+            )
+            before = (baseline or {}).get('endpoints', {}).get(name, {}).get(clients)
+            if before:
+                print(f" {_change(row['throughput_rps'], before['throughput_rps']):>9} "
+                      f"{_change(row['p95_ms'], before['p95_ms']):>8}", end='')
+            print()
+
+
+def main(argv=None):
+    from benchmarks.datasets import DATASETS
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dataset', choices=sorted(DATASETS), default='10k')
+    parser.add_argument('--only', default=DEFAULT_SCENARIOS, help="Comma separated endpoints to sweep.")
+    parser.add_argument('--levels', default='1,8,32,64', help="Comma separated numbers of concurrent clients.")
+    parser.add_argument('--requests', type=int, default=256, help="Requests per endpoint and level.")
+    parser.add_argument('--output', type=Path, help="Write the results JSON here.")
+    parser.add_argument('--compare', type=Path, help="Earlier --output to compare with.")
+    args = parser.parse_args(argv)
+
+    levels = [int(level) for level in args.levels.split(',')]
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        prepare_database(args.dataset, work_dir)
+
+        from django.core.cache import cache
+        from rest_framework_simplejwt.tokens import RefreshToken
+        from benchmarks.datasets import BENCH_PHONE
+        from core.models import User
+        from ishemalink.asgi import application
+        import domestic.views
+
+        async def no_sms(phone_number, message):
+            return True
+        domestic.views.send_sms_notification = no_sms
+
+        install_query_counter()
+        user = User.objects.get(phone=BENCH_PHONE)
+        token = str(RefreshToken.for_user(user).access_token)
+
+        scenarios = build_scenarios(user, token)
+        selected = args.only.split(',')
+        unknown = set(selected) - set(scenarios)
+        if unknown:
+            parser.error(f"unknown endpoints: {', '.join(sorted(unknown))}")
+
+        results = {'dataset': args.dataset, 'endpoints': {}}
+        for name in selected:
+            factory, _, setup = scenarios[name]
+            offset = itertools.count()
+            results['endpoints'][name] = {}
+            for clients in levels:
+                cache.clear()
+                if setup:
+                    setup()
+                # One warm-up request, so the first level doesn't pay for cold caches
+                asyncio.run(_timed_request(application, factory, next(offset), token))
+                results['endpoints'][name][str(clients)] = asyncio.run(
+                    sweep_level(application, factory, args.requests, clients, offset, token)
+                )
+
+    baseline = json.loads(args.compare.read_text()) if args.compare else None
+    print(f"Dataset {args.dataset}, {args.requests} requests per level")
+    print_sweep(results, baseline)
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
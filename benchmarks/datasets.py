@@ -0,0 +1,106 @@
+"""
+Seeded datasets for the benchmark suite.
+
+Each dataset is built once into benchmarks/.data/<name>.sqlite3 and copied
+for every run, because inserting a million shipments takes a while.
+"""
+from decimal import Decimal
+
+DATASETS = {
+    '10k': 10_000,
+    '100k': 100_000,
+    '1m': 1_000_000,
+}
+
+BATCH_SIZE = 5_000
+OWNERS = 100
+BENCH_PHONE = '+250788000000'
+BENCH_PASSWORD = 'bench-pass-123'
+
+CITIES = ['Kigali', 'Huye', 'Musanze', 'Rubavu', 'Rusizi', 'Nyagatare', 'Muhanga', 'Karongi']
+# Sector-level addresses, so agent manifests have something to partition
+SECTORS = ['Nyamirambo', 'Remera', 'Kimironko', 'Gikondo', 'Muhoza']
+BENCH_SECTOR = 'Nyamirambo'
+PLACES = CITIES + SECTORS
+STATUSES = ['PENDING', 'IN_TRANSIT', 'DELIVERED', 'FAILED']
+COUNTRIES = ['UG', 'KE', 'TZ', 'CD']
+
+
+def seed(shipment_count):
+    """
+    Fills an empty, migrated database with users, tariffs, shipments (each
+    with one log entry), international cargo (one per ten shipments) and
+    their delta sync log entries.
+    """
+    from django.db import transaction
+    from core.models import User
+    from domestic.gazetteer import resolve_location
+    from domestic.models import Shipment, ShipmentLog, Tariff
+    from international.models import InternationalCargo
+    from international import signals as cargo_signals
+    from sync.models import ChangeLogEntry
+    from sync.tracking import places, write_entries
+
+    bench_user = User.objects.create_user(
+        username=BENCH_PHONE, phone=BENCH_PHONE, password=BENCH_PASSWORD, role='AGENT',
+        assigned_sector=BENCH_SECTOR,
+    )
+    # Other owners never log in, so skip password hashing for them
+    User.objects.bulk_create(
+        User(username=f'+2507880{i:05d}', phone=f'+2507880{i:05d}', role='CUSTOMER', password='!')
+        for i in range(1, OWNERS)
+    )
+    owner_ids = list(User.objects.values_list('pk', flat=True))
+
+    Tariff.objects.bulk_create([
+        Tariff(zone='ZONE1', base_rate=Decimal('1000'), weight_multiplier=Decimal('200')),
+        Tariff(zone='ZONE2', base_rate=Decimal('2500'), weight_multiplier=Decimal('350')),
+        Tariff(zone='ZONE3', base_rate=Decimal('15000'), weight_multiplier=Decimal('900')),
+    ])
+
+    # place -> (location ID, zone)
+    locations = {place: resolve_location(place) for place in PLACES}
+    for start in range(0, shipment_count, BATCH_SIZE):
+        end = min(start + BATCH_SIZE, shipment_count)
+        with transaction.atomic():
+            rows = []
+            for i in range(start, end):
+                origin, destination = PLACES[i % len(PLACES)], PLACES[(i * 7 + 3) % len(PLACES)]
+                rows.append(Shipment(
+                    owner_id=owner_ids[i % len(owner_ids)],
+                    tracking_number=f'RW-{i:08d}',
+                    current_status=STATUSES[i % len(STATUSES)],
+                    origin=origin,
+                    destination=destination,
+                    # bulk_create skips save(), which normally resolves these
+                    origin_location=locations[origin][0],
+                    destination_location=locations[destination][0],
+                    destination_zone=locations[destination][1],
+                ))
+            shipments = Shipment.objects.bulk_create(rows)
+            logs = ShipmentLog.objects.bulk_create(
+                ShipmentLog(shipment=shipment, status=shipment.current_status, location=shipment.origin)
+                for shipment in shipments
+            )
+            cargo = InternationalCargo.objects.bulk_create(
+                InternationalCargo(
+                    owner_id=owner_ids[i % len(owner_ids)],
+                    manifest_id=f'EAC-{i:08d}',
+                    tin_number=f'TIN{i:06d}',
+                    destination_country=COUNTRIES[i % len(COUNTRIES)],
+                    weight_kg=Decimal(100 + i % 900),
+                )
+                for i in range(start, end, 10)
+            )
+
+            # bulk_create skips the signals that feed the delta sync log
+            write_entries(
+                [ChangeLogEntry(model=ChangeLogEntry.SHIPMENT, object_id=row.pk, **places(row)) for row in shipments]
+                + [
+                    ChangeLogEntry(model=ChangeLogEntry.SHIPMENT_LOG, object_id=log.pk, **places(log.shipment))
+                    for log in logs
+                ]
+            )
+            cargo_signals.cargo_created.send(sender=InternationalCargo, cargo=cargo)
+
+    return bench_user
@@ -0,0 +1,421 @@
+"""
+In-process ASGI benchmark suite with regression gates.
+
+    python -m benchmarks.run --dataset 10k                  # measure and compare with the baseline
+    python -m benchmarks.run --dataset 10k --save-baseline  # record a new baseline
+    python -m benchmarks.run --dataset 100k --only list,search --threshold 0.25
+
+Every request goes through ishemalink.asgi.application (all middleware,
+authentication, throttling and views) against a copy of a seeded SQLite
+dataset. For each endpoint the suite reports p50/p95/p99 latency, throughput
+at --concurrency and SQL queries per request, each the median of --runs
+passes over all the endpoints. Results are written as JSON;
+the run exits with status 1 when a metric regresses past --threshold, and
+with status 2 when there is no baseline to compare with. The baseline for the
+reference dataset (benchmarks/baselines/10k.json) is committed; re-record it
+with --save-baseline on the machine that runs the gate.
+
+The simulated 2s SMS gateway delay in update_shipment_status is replaced by a
+no-op so the server's own cost is measured (use --keep-sms-delay to keep it).
+"""
+import argparse
+import asyncio
+import contextvars
+import io
+import itertools
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+DATA_DIR = BENCH_DIR / '.data'
+BASELINE_DIR = BENCH_DIR / 'baselines'
+
+# Lower is better for latency and queries, higher is better for throughput
+LOWER_IS_BETTER = ['p50_ms', 'p95_ms', 'p99_ms', 'queries_per_request']
+HIGHER_IS_BETTER = ['throughput_rps']
+
+# Requests attribute their SQL queries to the counter in this context variable
+_query_counter = contextvars.ContextVar('bench_query_counter', default=None)
+
+
+def _count_queries(execute, sql, params, many, context):
+    counter = _query_counter.get()
+    if counter is not None:
+        counter[0] += 1
+    return execute(sql, params, many, context)
+
+
+def install_query_counter():
+    """
+    Wraps every DB connection (in every thread) with the query counter.
+    """
+    from django.db import connections
+    from django.db.backends.signals import connection_created
+
+    def on_connection_created(sender, connection, **kwargs):
+        if _count_queries not in connection.execute_wrappers:
+            connection.execute_wrappers.append(_count_queries)
+
+    connection_created.connect(on_connection_created, weak=False)
+    for connection in connections.all():
+        if _count_queries not in connection.execute_wrappers:
+            connection.execute_wrappers.append(_count_queries)
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def prepare_database(dataset, work_dir):
+    """
+    Points Django at a fresh copy of the seeded dataset and sets it up.
+    Builds and caches the dataset on first use.
+    """
+    from benchmarks.datasets import DATASETS
+
+    cached = DATA_DIR / f'{dataset}.sqlite3'
+    db_path = Path(work_dir) / 'bench.sqlite3'
+    if cached.exists():
+        shutil.copy(cached, db_path)
+
+    os.environ['DB_NAME'] = str(db_path)
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'benchmarks.settings'
+
+    import django
+    django.setup()
+
+    if not cached.exists():
+        from django.core.management import call_command
+        from django.db import connections
+        from benchmarks.datasets import seed
+
+        print(f"Seeding dataset '{dataset}' ({DATASETS[dataset]:,} shipments), this is done once...")
+        call_command('migrate', verbosity=0)
+        seed(DATASETS[dataset])
+        call_command('backfill_corridor_rollups', stdout=io.StringIO())
+        connections.close_all()
+
+        DATA_DIR.mkdir(exist_ok=True)
+        shutil.copy(db_path, cached)
+    elif _has_unapplied_migrations():
+        # The cached dataset predates a new migration: migrate it once and re-cache
+        from django.core.management import call_command
+        from django.db import connections
+
+        from core.models import User
+        from benchmarks.datasets import BENCH_PHONE, BENCH_SECTOR
+
+        print(f"Migrating cached dataset '{dataset}'...")
+        call_command('migrate', verbosity=0)
+        # Datasets seeded before sector manifests: give the bench agent its sector
+        User.objects.filter(username=BENCH_PHONE, assigned_sector__isnull=True).update(assigned_sector=BENCH_SECTOR)
+        # Datasets seeded before the location columns: resolve their places
+        call_command('normalize_shipment_locations', stdout=io.StringIO())
+        connections.close_all()
+        shutil.copy(db_path, cached)
+
+
+def _has_unapplied_migrations():
+    from django.db import connection
+    from django.db.migrations.executor import MigrationExecutor
+
+    executor = MigrationExecutor(connection)
+    return bool(executor.migration_plan(executor.loader.graph.leaf_nodes()))
+
+
+def build_scenarios(user, token):
+    """
+    Returns {name: (request_factory, default_request_count, setup)}.
+    A request factory takes the iteration number and returns
+    (method, path, json_data, authenticated). setup (or None) is called right
+    before each measurement of the scenario, so what it measures does not depend
+    on which scenarios ran before it, or on the date.
+    """
+    from django.db.models import Max
+    from django.utils import timezone
+    from benchmarks.datasets import BENCH_PASSWORD, BENCH_PHONE
+    from domestic.manifests import manifest_queryset
+    from domestic.models import ShipmentLog
+    from international.models import CorridorDailyRollup
+    from sync.models import ChangeLogEntry
+    from sync.tracking import places, write_entries
+
+    # Hub scans: IN_TRANSIT is allowed from PENDING and from itself, so every update applies
+    shipment_ids = list(
+        manifest_queryset(user).filter(current_status__in=['PENDING', 'IN_TRANSIT'])
+        .order_by('pk').values_list('pk', flat=True)[:500]
+    )
+    hubs = itertools.cycle(['Muhanga', 'Huye', 'Rusizi', 'Musanze'])
+    unique = itertools.count(1)
+
+    def register(i):
+        phone = f'+25072{next(unique):07d}'
+        return 'POST', '/api/register/', {
+            'username': phone, 'phone': phone, 'password': 'bench-pass-123', 'role': 'CUSTOMER',
+        }, False
+
+    def login(i):
+        return 'POST', '/api/auth/token/obtain/', {'username': BENCH_PHONE, 'password': BENCH_PASSWORD}, False
+
+    def shipment_create(i):
+        return 'POST', '/api/domestic/shipments/', {'origin': 'Kigali', 'destination': 'Huye'}, True
+
+    def status_update(i):
+        pk = shipment_ids[i % len(shipment_ids)]
+        return 'POST', f'/api/domestic/shipments/{pk}/update/', {'status': 'IN_TRANSIT', 'location': next(hubs)}, True
+
+    def shipment_list(i):
+        return 'GET', f'/api/domestic/shipments/list/?page={1 + i % 5}', None, True
+
+    def shipment_search(i):
+        return 'GET', f'/api/domestic/shipments/list/?search=RW-{i * 37 % 10000:08d}', None, True
+
+    def status_filter(i):
+        return 'GET', '/api/domestic/shipments/list/?status=IN_TRANSIT&destination=Huye', None, True
+
+    def sector_active(i):
+        return 'GET', f'/api/domestic/shipments/sector/active/?page={1 + i % 5}', None, True
+
+    def tariffs(i):
+        return 'GET', '/api/domestic/pricing/tariffs/', None, False
+
+    def cargo_list(i):
+        return 'GET', '/api/international/cargo/', None, True
+
+    def cargo_create(i):
+        n = next(unique)
+        return 'POST', '/api/international/cargo/', {
+            'manifest_id': f'BENCH-{n:08d}', 'tin_number': 'TIN1', 'destination_country': 'KE', 'weight_kg': '120.00',
+        }, True
+
+    sync_token = 0
+
+    def sync_delta_setup():
+        # The same delta every time: 50 shipments on the agent's manifest and 50 of their logs
+        # changed just after the token. Cost should track churn, not table size
+        nonlocal sync_token
+        sync_token = ChangeLogEntry.objects.aggregate(newest=Max('seq'))['newest'] or 0
+        logs = ShipmentLog.objects.filter(shipment_id__in=shipment_ids).select_related('shipment').order_by('pk')[:50]
+        shipments = {log.shipment_id: log.shipment for log in logs}
+        write_entries([
+            ChangeLogEntry(model=ChangeLogEntry.SHIPMENT_LOG, object_id=log.pk, **places(log.shipment))
+            for log in logs
+        ] + [
+            ChangeLogEntry(model=ChangeLogEntry.SHIPMENT, object_id=pk, **places(shipment))
+            for pk, shipment in shipments.items()
+        ])
+
+    def sync_delta(i):
+        return 'GET', f'/api/sync/changes/?token={sync_token}', None, True
+
+    def cargo_create_setup():
+        # Today's rollup row exists, so no create costs the extra INSERT of the day's first cargo
+        CorridorDailyRollup.objects.get_or_create(
+            day=timezone.localdate(), destination_country='KE', is_customs_cleared=False
+        )
+
+    # Password hashing makes register/login deliberately slow, so they run fewer times
+    return {
+        'register': (register, 20, None),
+        'jwt_login': (login, 20, None),
+        'shipment_create': (shipment_create, 200, None),
+        'status_update': (status_update, 200, None),
+        'list': (shipment_list, 200, None),
+        'search': (shipment_search, 200, None),
+        'status_filter': (status_filter, 200, None),
+        'sector_active': (sector_active, 200, None),
+        'tariffs': (tariffs, 200, None),
+        'cargo_list': (cargo_list, 200, None),
+        'cargo_create': (cargo_create, 200, cargo_create_setup),
+        'sync_delta': (sync_delta, 200, sync_delta_setup),
+    }
+
+
+async def _timed_request(app, factory, i, token):
+    from benchmarks.asgi_client import request
+
+    method, path, data, authenticated = factory(i)
+    headers = {'authorization': f'Bearer {token}'} if authenticated else {}
+
+    counter = [0]
+    _query_counter.set(counter)
+    start = time.perf_counter()
+    response = await request(app, method, path, data=data, headers=headers)
+    elapsed = time.perf_counter() - start
+    return elapsed, counter[0], response.status
+
+
+async def measure(app, factory, requests, concurrency, token):
+    """
+    Sequential pass for latency and query counts, then a concurrent pass for throughput.
+    """
+    latencies, queries, errors = [], [], 0
+    for i in range(requests):
+        # Each request runs in its own task so its context (query counter) is isolated
+        elapsed, count, status = await asyncio.create_task(_timed_request(app, factory, i, token))
+        latencies.append(elapsed)
+        queries.append(count)
+        errors += status >= 400
+
+    offset = itertools.count(requests)
+
+    async def worker(share):
+        nonlocal errors
+        for _ in range(share):
+            _, _, status = await asyncio.create_task(_timed_request(app, factory, next(offset), token))
+            errors += status >= 400
+
+    share = max(1, requests // concurrency)
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(share) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        'requests': requests,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'throughput_rps': round(share * concurrency / elapsed, 1),
+        'queries_per_request': round(sum(queries) / len(queries), 2),
+        'errors': errors,
+    }
+
+
+def median_results(runs):
+    """
+    Each endpoint's median of every metric over several runs of the suite, so one
+    run slowed down by the machine neither fails the gate nor becomes the baseline.
+    """
+    merged = {**runs[0], 'endpoints': {}}
+    for name, first in runs[0]['endpoints'].items():
+        rows = [run['endpoints'][name] for run in runs]
+        merged['endpoints'][name] = {metric: statistics.median(row[metric] for row in rows) for metric in first}
+    return merged
+
+
+def compare_results(current, baseline, threshold):
+    """
+    Returns a list of human readable regressions of `current` against `baseline`.
+    Latency/throughput may drift by `threshold` (0.2 = 20%); query counts may not grow.
+    """
+    regressions = []
+    for endpoint, base in baseline.get('endpoints', {}).items():
+        now = current['endpoints'].get(endpoint)
+        if now is None:
+            continue
+        for metric in LOWER_IS_BETTER:
+            allowed = base[metric] if metric == 'queries_per_request' else base[metric] * (1 + threshold)
+            if now[metric] > allowed:
+                regressions.append(f"{endpoint}.{metric}: {base[metric]} -> {now[metric]}")
+        for metric in HIGHER_IS_BETTER:
+            if now[metric] < base[metric] * (1 - threshold):
+                regressions.append(f"{endpoint}.{metric}: {base[metric]} -> {now[metric]}")
+    return regressions
+
+
+def print_table(results):
+    print(f"{'endpoint':<16} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'queries':>8} {'errors':>7}")
+    for name, row in results['endpoints'].items():
+        print(
+            f"{name:<16} {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f} "
+            f"{row['throughput_rps']:>8.1f} {row['queries_per_request']:>8.2f} {row['errors']:>7}"
+        )
+
+
+def main(argv=None):
+    from benchmarks.datasets import DATASETS
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dataset', choices=sorted(DATASETS), default='10k')
+    parser.add_argument('--only', help="Comma separated endpoints to run (default: all).")
+    parser.add_argument('--requests', type=int, help="Requests per endpoint (overrides the defaults).")
+    parser.add_argument('--concurrency', type=int, default=8, help="Concurrent clients for the throughput pass.")
+    parser.add_argument('--runs', type=int, default=3, help="Passes over the endpoints; each metric is their median.")
+    # Unchanged code drifts by up to ~40% between runs on a shared machine; query counts are exact
+    parser.add_argument('--threshold', type=float, default=0.5, help="Allowed timing regression, 0.5 = 50%%.")
+    parser.add_argument('--baseline', type=Path, help="Baseline JSON (default: benchmarks/baselines/<dataset>.json).")
+    parser.add_argument('--save-baseline', action='store_true', help="Write the results as the new baseline.")
+    parser.add_argument('--output', type=Path, help="Also write the results JSON here.")
+    parser.add_argument('--keep-sms-delay', action='store_true', help="Keep the simulated 2s SMS delay.")
+    args = parser.parse_args(argv)
+
+    if args.runs < 1:
+        parser.error("--runs must be at least 1.")
+    baseline_path = args.baseline or BASELINE_DIR / f'{args.dataset}.json'
+    if not args.save_baseline and not baseline_path.exists():
+        # Without a baseline there is nothing to gate on: fail before spending minutes measuring
+        parser.error(f"no baseline at {baseline_path}; record one with --save-baseline.")
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        prepare_database(args.dataset, work_dir)
+
+        from django.core.cache import cache
+        from rest_framework_simplejwt.tokens import RefreshToken
+        from benchmarks.datasets import BENCH_PHONE
+        from core.models import User
+        from ishemalink.asgi import application
+        import domestic.views
+
+        if not args.keep_sms_delay:
+            async def no_sms(phone_number, message):
+                return True
+            domestic.views.send_sms_notification = no_sms
+
+        install_query_counter()
+        user = User.objects.get(phone=BENCH_PHONE)
+        token = str(RefreshToken.for_user(user).access_token)
+
+        scenarios = build_scenarios(user, token)
+        selected = args.only.split(',') if args.only else list(scenarios)
+        unknown = set(selected) - set(scenarios)
+        if unknown:
+            parser.error(f"unknown endpoints: {', '.join(sorted(unknown))}")
+
+        runs = []
+        for _ in range(args.runs):
+            run = {'dataset': args.dataset, 'concurrency': args.concurrency, 'runs': args.runs, 'endpoints': {}}
+            for name in selected:
+                factory, default_requests, setup = scenarios[name]
+                cache.clear()
+                if setup:
+                    setup()
+                run['endpoints'][name] = asyncio.run(
+                    measure(application, factory, args.requests or default_requests, args.concurrency, token)
+                )
+            runs.append(run)
+        results = median_results(runs)
+
+    print(f"Dataset {args.dataset}, concurrency {args.concurrency}, median of {args.runs} runs")
+    print_table(results)
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+
+    if args.save_baseline:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        baseline_path.write_text(json.dumps(results, indent=2))
+        print(f"Baseline saved to {baseline_path}")
+        return 0
+
+    regressions = compare_results(results, json.loads(baseline_path.read_text()), args.threshold)
+    if regressions:
+        print(f"\nREGRESSIONS (threshold {args.threshold:.0%}):")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+
+    print(f"\nNo regressions against {baseline_path} (threshold {args.threshold:.0%}).")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
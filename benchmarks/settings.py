@@ -0,0 +1,18 @@
+"""
+Settings for benchmark runs: the project settings with throttling limits
+raised so thousands of requests from one user are measured, not rejected.
+The throttle classes themselves stay on, so their cost is still included.
+"""
+from ishemalink.settings import *  # noqa: F401,F403
+from ishemalink.settings import REST_FRAMEWORK
+
+DEBUG = False
+
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    'DEFAULT_THROTTLE_RATES': {
+        'anon': '1000000/min',
+        'user': '1000000/min',
+        'login_attempts': '1000000/min',
+    },
+}
@@ -0,0 +1,125 @@
+"""
+Throughput of concurrent shipment status writers on SQLite.
+
+    python -m benchmarks.sqlite_writers --writers 1,4,8,16 --updates 200
+    python -m benchmarks.sqlite_writers --profile default   # Django's stock SQLite settings
+
+Each writer thread repeatedly applies record_status_update() (the write path
+behind POST /api/domestic/shipments/<pk>/update/) against a scratch database
+file, so your real db.sqlite3 is never touched. Writers pick a transition the
+state machine allows; "stale" counts updates that lost the optimistic
+concurrency race to another writer (the API's 409).
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+
+def setup_django(profile, db_path):
+    # Must be set before settings are imported
+    os.environ['DB_NAME'] = db_path
+    os.environ['SQLITE_PROFILE'] = profile
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ishemalink.settings')
+
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+def seed(count):
+    from core.models import User
+    from domestic.models import Shipment
+
+    owner = User.objects.create_user(username='+250788999999', phone='+250788999999', password='bench-pass')
+    Shipment.objects.bulk_create(
+        Shipment(owner=owner, origin='Kigali', destination='Huye', tracking_number=f'RW-BENCH{i:05d}')
+        for i in range(count)
+    )
+    return list(Shipment.objects.values_list('pk', flat=True))
+
+
+def writer(shipment_ids, updates, barrier, latencies, errors, stale):
+    from django.db import OperationalError, connection
+    from domestic.models import Shipment
+    from domestic.services import ALLOWED_TRANSITIONS, StaleShipmentError, record_status_update
+
+    barrier.wait()
+    try:
+        for _ in range(updates):
+            shipment = Shipment.objects.get(pk=random.choice(shipment_ids))
+            # Never DELIVERED (final), so every shipment always has a next status
+            new_status = random.choice(sorted(ALLOWED_TRANSITIONS[shipment.current_status] - {'DELIVERED'}))
+            start = time.perf_counter()
+            try:
+                record_status_update(shipment, new_status, 'Benchmark')
+            except OperationalError:
+                # "database is locked"
+                errors.append(1)
+                continue
+            except StaleShipmentError:
+                stale.append(1)
+                continue
+            latencies.append(time.perf_counter() - start)
+    finally:
+        connection.close()
+
+
+def run_round(shipment_ids, writers, updates):
+    latencies, errors, stale = [], [], []
+    barrier = threading.Barrier(writers + 1)
+    threads = [
+        threading.Thread(target=writer, args=(shipment_ids, updates, barrier, latencies, errors, stale))
+        for _ in range(writers)
+    ]
+    for thread in threads:
+        thread.start()
+
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    return latencies, len(errors), len(stale), elapsed
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--writers', default='1,2,4,8,16', help="Comma separated writer counts to try.")
+    parser.add_argument('--updates', type=int, default=200, help="Status updates per writer.")
+    parser.add_argument('--shipments', type=int, default=1000, help="Shipments seeded in the scratch DB.")
+    parser.add_argument('--profile', choices=['concurrent', 'default'], default='concurrent')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        setup_django(args.profile, os.path.join(tmp, 'bench.sqlite3'))
+        shipment_ids = seed(args.shipments)
+
+        print(f"SQLite profile: {args.profile}, {args.updates} updates per writer")
+        print(f"{'writers':>7} {'ops/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'locked':>7} {'stale':>6}")
+        for writers in [int(n) for n in args.writers.split(',')]:
+            latencies, locked, stale, elapsed = run_round(shipment_ids, writers, args.updates)
+            print(
+                f"{writers:>7} {len(latencies) / elapsed:>9.1f} "
+                f"{percentile(latencies, 50) * 1000:>8.2f} {percentile(latencies, 95) * 1000:>8.2f} "
+                f"{percentile(latencies, 99) * 1000:>8.2f} {locked:>7} {stale:>6}"
+            )
+        if latencies:
+            print(f"mean write latency (last round): {statistics.mean(latencies) * 1000:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+from io import StringIO
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from .run import BASELINE_DIR, compare_results, main, median_results
+
+
+class RegressionGateTests(SimpleTestCase):
+    """
+    Tests for the benchmark baseline comparison.
+    """
+    baseline = {'endpoints': {'list': {
+        'p50_ms': 10.0, 'p95_ms': 20.0, 'p99_ms': 30.0, 'throughput_rps': 100.0, 'queries_per_request': 3.0,
+    }}}
+
+    def results(self, **changes):
+        return {'endpoints': {'list': {**self.baseline['endpoints']['list'], **changes}}}
+
+    def test_within_threshold_passes(self):
+        """Noise below the threshold is not a regression."""
+        current = self.results(p50_ms=11.0, throughput_rps=90.0)
+        self.assertEqual(compare_results(current, self.baseline, threshold=0.2), [])
+
+    def test_slower_or_chattier_endpoint_fails(self):
+        """Latency past the threshold, lost throughput and extra queries are all flagged."""
+        current = self.results(p95_ms=30.0, throughput_rps=50.0, queries_per_request=4.0)
+        regressions = compare_results(current, self.baseline, threshold=0.2)
+        self.assertEqual(
+            sorted(r.split(':')[0] for r in regressions),
+            ['list.p95_ms', 'list.queries_per_request', 'list.throughput_rps'],
+        )
+
+    def test_runs_are_merged_by_median(self):
+        """One slow run out of three moves neither the reported nor the gated numbers."""
+        runs = [self.results(), self.results(p95_ms=60.0, throughput_rps=40.0), self.results(p95_ms=22.0)]
+        merged = median_results(runs)
+        self.assertEqual(merged['endpoints']['list']['p95_ms'], 22.0)
+        self.assertEqual(compare_results(merged, self.baseline, threshold=0.2), [])
+
+    def test_missing_baseline_fails(self):
+        """Without a baseline the gate exits non-zero instead of passing by default."""
+        with mock.patch('sys.stderr', new_callable=StringIO) as stderr, \
+                mock.patch('benchmarks.run.prepare_database') as prepare, self.assertRaises(SystemExit) as exit:
+            main(['--baseline', '/nonexistent/baseline.json'])
+        self.assertEqual(exit.exception.code, 2)
+        self.assertIn('--save-baseline', stderr.getvalue())
+        prepare.assert_not_called()
+
+    def test_reference_baseline_is_committed(self):
+        """The default dataset has a baseline to gate on."""
+        self.assertTrue((BASELINE_DIR / '10k.json').exists())
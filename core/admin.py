@@ -1,3 +1,55 @@
 from django.contrib import admin
+from django.http import HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html
 
-# Register your models here.
+from .models import RequestProfile
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    """
+    Read-only listing of sampled request profiles with download links.
+    """
+    list_display = ['created_at', 'method', 'path', 'view_name', 'status_code', 'duration_ms', 'sql_count', 'trigger', 'downloads']
+    list_filter = ['trigger', 'view_name', 'status_code']
+    search_fields = ['path', 'view_name']
+    readonly_fields = [field.name for field in RequestProfile._meta.fields] + ['sql_statements', 'downloads']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description='SQL')
+    def sql_count(self, obj):
+        return len(obj.sql_statements)
+
+    @admin.display(description='Download')
+    def downloads(self, obj):
+        return format_html(
+            '<a href="{}">flamegraph</a> | <a href="{}">sql</a>',
+            reverse('admin:core_requestprofile_stacks', args=[obj.pk]),
+            reverse('admin:core_requestprofile_sql', args=[obj.pk]),
+        )
+
+    def get_urls(self):
+        return [
+            path('<int:pk>/stacks/', self.admin_site.admin_view(self.download_stacks), name='core_requestprofile_stacks'),
+            path('<int:pk>/sql/', self.admin_site.admin_view(self.download_sql), name='core_requestprofile_sql'),
+        ] + super().get_urls()
+
+    def download_stacks(self, request, pk):
+        """Collapsed stacks, ready for flamegraph.pl or speedscope."""
+        profile = get_object_or_404(RequestProfile, pk=pk)
+        response = HttpResponse(profile.collapsed_stacks, content_type='text/plain')
+        response['Content-Disposition'] = f'attachment; filename="profile-{profile.pk}.folded"'
+        return response
+
+    def download_sql(self, request, pk):
+        profile = get_object_or_404(RequestProfile, pk=pk)
+        response = JsonResponse(profile.sql_statements, safe=False)
+        response['Content-Disposition'] = f'attachment; filename="profile-{profile.pk}-sql.json"'
+        return response
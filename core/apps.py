@@ -3,3 +3,9 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        # Time SQL on every connection from startup, not only those opened after the
+        # metrics middleware loads (under ASGI it loads on the event loop thread)
+        from ishemalink.metrics import install_db_instrumentation
+        install_db_instrumentation()
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ishemalink import schema_cache
+
+
+class Command(BaseCommand):
+    help = "Builds the OpenAPI schema for the current code version into SCHEMA_CACHE_DIR (run at deploy time)."
+
+    def handle(self, *args, **options):
+        if not getattr(settings, 'SCHEMA_CACHE_DIR', None):
+            raise CommandError("SCHEMA_CACHE_DIR is not set.")
+
+        written = schema_cache.build_artifacts()
+        if not all(written.values()):
+            raise CommandError(f"Could not write the schema to {settings.SCHEMA_CACHE_DIR}.")
+
+        self.stdout.write(f"Code version: {schema_cache.code_version()}")
+        for path in written.values():
+            self.stdout.write(self.style.SUCCESS(f"Wrote {path} (+ .gz)"))
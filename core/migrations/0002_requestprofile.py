@@ -0,0 +1,35 @@
+# Generated by Django 6.0.1 on 2026-10-19 17:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('trigger', models.CharField(choices=[('HEADER', 'X-Profile header'), ('SAMPLED', 'Random sample')], max_length=10)),
+                ('method', models.CharField(max_length=10)),
+                ('path', models.CharField(max_length=255)),
+                ('view_name', models.CharField(blank=True, max_length=100)),
+                ('status_code', models.PositiveSmallIntegerField()),
+                ('duration_ms', models.FloatField()),
+                ('sample_count', models.PositiveIntegerField(default=0)),
+                ('collapsed_stacks', models.TextField(blank=True, help_text="One 'frame;frame;frame count' line per stack")),
+                ('sql_statements', models.JSONField(blank=True, default=list)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
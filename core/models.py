@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 from .validators import validate_rwanda_phone, validate_nid
@@ -36,4 +37,35 @@ class User(AbstractUser):
     assigned_sector = models.CharField(max_length=100, blank=True, null=True)
 
     def __str__(self):
-        return f"{self.username} ({self.role})"
\ No newline at end of file
+        return f"{self.username} ({self.role})"
+
+
+class RequestProfile(models.Model):
+    """
+    A sampled profile of one API request: collapsed stacks (flamegraph input)
+    plus the SQL it ran. Created by the profiling middleware, browsed in the admin.
+    """
+    TRIGGER_CHOICES = [
+        ('HEADER', 'X-Profile header'),
+        ('SAMPLED', 'Random sample'),
+    ]
+
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    trigger = models.CharField(max_length=10, choices=TRIGGER_CHOICES)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=255)
+    view_name = models.CharField(max_length=100, blank=True)
+    status_code = models.PositiveSmallIntegerField()
+    duration_ms = models.FloatField()
+
+    sample_count = models.PositiveIntegerField(default=0)
+    collapsed_stacks = models.TextField(blank=True, help_text="One 'frame;frame;frame count' line per stack")
+    sql_statements = models.JSONField(default=list, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms)"
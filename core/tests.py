@@ -1,5 +1,17 @@
-from django.test import TestCase
+import gzip
+import itertools
+import json
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import AsyncClient, TestCase, override_settings
 from django.core.exceptions import ValidationError
+from ishemalink import schema_cache
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from .models import RequestProfile, User
 from .validators import validate_rwanda_phone, validate_nid
 
 class ValidatorTests(TestCase):
@@ -41,4 +53,147 @@ class ValidatorTests(TestCase):
     def test_nid_not_numeric(self):
         """Test that an NID with letters fails."""
         with self.assertRaises(ValidationError):
-            validate_nid("11990800ABCD5678")
\ No newline at end of file
+            validate_nid("11990800ABCD5678")
+
+
+@override_settings(PROFILING_INTERVAL_MS=0.5)
+class RequestProfilingTests(TestCase):
+    """
+    Tests for the on-demand request profiler and its admin downloads.
+    """
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            username='+250788000020', phone='+250788000020', password='pass12345', is_staff=True, is_superuser=True
+        )
+        self.agent = User.objects.create_user(username='+250788000021', phone='+250788000021', password='pass12345')
+        self.api = APIClient()
+
+    def test_admin_header_stores_profile(self):
+        """An admin's X-Profile request (JWT) is stored with its SQL."""
+        self.api.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.admin).access_token}')
+        response = self.api.get('/api/domestic/shipments/list/', HTTP_X_PROFILE='1')
+
+        profile = RequestProfile.objects.get(pk=response['X-Profile-Id'])
+        self.assertEqual(profile.trigger, 'HEADER')
+        self.assertEqual(profile.view_name, 'list-shipments')
+        self.assertTrue(any('domestic_shipment' in s['sql'] for s in profile.sql_statements))
+
+    def test_header_ignored_for_non_admins(self):
+        """Only staff can trigger profiling on demand."""
+        self.api.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.agent).access_token}')
+        response = self.api.get('/api/domestic/shipments/list/', HTTP_X_PROFILE='1')
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertFalse(RequestProfile.objects.exists())
+
+    @override_settings(PROFILING_SAMPLE_RATE=1.0, PROFILING_MAX_PROFILES=2, PROFILING_RETENTION_EVERY=3)
+    def test_sampling_respects_retention(self):
+        """Sampled profiles are capped at PROFILING_MAX_PROFILES, checked every PROFILING_RETENTION_EVERY saves."""
+        with patch('ishemalink.profiling._saved_profiles', itertools.count(1)):
+            for expected in [1, 2, 2, 3]:
+                self.client.get('/api/domestic/pricing/tariffs/')
+                self.assertEqual(RequestProfile.objects.count(), expected)
+
+    async def test_async_stack_profiles_sync_view(self):
+        """Under ASGI a sampled request is profiled from a worker thread and stored with its SQL."""
+        with override_settings(PROFILING_SAMPLE_RATE=1.0):
+            response = await AsyncClient().get('/api/domestic/pricing/tariffs/')
+
+        profile = await RequestProfile.objects.aget(pk=response['X-Profile-Id'])
+        self.assertEqual(profile.view_name, 'public-tariffs')
+        self.assertTrue(any('domestic_tariff' in s['sql'] for s in profile.sql_statements))
+
+    async def test_async_stack_skips_unprofiled_requests(self):
+        """Requests that are not profiled stay on the event loop and store nothing."""
+        response = await AsyncClient().get('/api/domestic/pricing/tariffs/', headers={'X-Profile': '1'})
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertFalse(await RequestProfile.objects.aexists())
+
+    async def test_async_stack_keeps_anonymous_header_on_event_loop(self):
+        """An X-Profile header without credentials never moves the request to a worker thread."""
+        with patch('ishemalink.profiling.RequestProfilingMiddleware._profile_in_thread') as profile_in_thread:
+            response = await AsyncClient().get('/api/domestic/pricing/tariffs/', headers={'X-Profile': '1'})
+        self.assertEqual(response.status_code, 200)
+        profile_in_thread.assert_not_called()
+
+    def test_inactive_users_header_is_401(self):
+        """A deactivated admin's token with X-Profile gets the view's 401, not a 500 from the profiler."""
+        token = RefreshToken.for_user(self.admin).access_token
+        self.admin.is_active = False
+        self.admin.save()
+        self.api.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        response = self.api.get('/api/domestic/shipments/list/', HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 401)
+        self.assertFalse(RequestProfile.objects.exists())
+
+    def test_admin_can_download_stacks(self):
+        """The admin listing serves the collapsed stacks as a download."""
+        profile = RequestProfile.objects.create(
+            trigger='HEADER', method='GET', path='/x/', status_code=200, duration_ms=1.0,
+            collapsed_stacks='app:main;app:view 3',
+        )
+        self.client.force_login(self.admin)
+        response = self.client.get(f'/admin/core/requestprofile/{profile.pk}/stacks/')
+        self.assertEqual(response.content, b'app:main;app:view 3')
+
+
+class PrecomputedSchemaTests(TestCase):
+    """
+    Tests for the OpenAPI schema served from the startup/build-time cache.
+    """
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.cache_dir.cleanup)
+        settings_override = override_settings(
+            SCHEMA_PRECOMPUTED=True, SCHEMA_CACHE_DIR=self.cache_dir.name, CODE_VERSION='test-1'
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        schema_cache.clear()
+        self.addCleanup(schema_cache.clear)
+
+    def test_schema_generated_once(self):
+        """Repeated requests reuse the schema instead of introspecting every view again."""
+        with patch('ishemalink.schema_cache.generate_schema', wraps=schema_cache.generate_schema) as generate:
+            first = self.client.get('/api/schema/')
+            second = self.client.get('/api/schema/')
+        self.assertEqual(generate.call_count, 1)
+        self.assertEqual(first.content, second.content)
+        self.assertIn(b'/api/domestic/shipments/', first.content)
+        self.assertEqual(first['X-Schema-Version'], 'test-1')
+
+    def test_etag_returns_304(self):
+        """A client that already has the schema gets 304 Not Modified."""
+        first = self.client.get('/api/schema/')
+        second = self.client.get('/api/schema/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second.content, b'')
+
+    def test_gzip_when_accepted(self):
+        """The precompressed body is sent to clients that accept gzip."""
+        plain = self.client.get('/api/schema/?format=json')
+        packed = self.client.get('/api/schema/?format=json', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(packed['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(packed.content), plain.content)
+        self.assertNotEqual(packed['ETag'], plain['ETag'])
+        self.assertIn('openapi', json.loads(plain.content))
+
+    def test_build_command_is_reused_at_startup(self):
+        """Files written by build_openapi_schema are loaded instead of regenerating."""
+        call_command('build_openapi_schema', stdout=StringIO())
+        schema_cache.clear()
+
+        with patch('ishemalink.schema_cache.generate_schema') as generate:
+            schema_cache.warm()
+            response = self.client.get('/api/schema/')
+        generate.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+
+    def test_new_code_version_regenerates(self):
+        """A deploy with a different CODE_VERSION does not serve the old schema."""
+        self.client.get('/api/schema/')
+        schema_cache.clear()
+        with override_settings(CODE_VERSION='test-2'), \
+                patch('ishemalink.schema_cache.generate_schema', wraps=schema_cache.generate_schema) as generate:
+            response = self.client.get('/api/schema/')
+        self.assertEqual(generate.call_count, 1)
+        self.assertEqual(response['X-Schema-Version'], 'test-2')
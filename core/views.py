@@ -6,6 +6,7 @@ from rest_framework.throttling import AnonRateThrottle
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.core.exceptions import ValidationError
 from drf_spectacular.utils import extend_schema, OpenApiParameter
+from ishemalink.idempotency import IdempotencyMixin
 
 # Check if these imports exist in your project, if not, keep your old ones
 from .serializers import UserRegistrationSerializer, NIDCheckSerializer
@@ -20,10 +21,11 @@ class LoginRateThrottle(AnonRateThrottle):
     scope = 'login_attempts' 
 
 # --- 2. The Sign-Up Desk (Existing Logic) ---
-class RegisterUserView(generics.CreateAPIView):
+class RegisterUserView(IdempotencyMixin, generics.CreateAPIView):
     """
     POST /api/auth/register/
     Registers a new user (Agent or Customer).
+    Retries with the same Idempotency-Key header get the first response back.
     """
     serializer_class = UserRegistrationSerializer
     permission_classes = [AllowAny] 
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class DomesticConfig(AppConfig):
     name = 'domestic'
+
+    def ready(self):
+        # Keeps the per-area active parcel cache in step with shipment saves
+        from . import manifests  # noqa: F401
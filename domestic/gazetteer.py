@@ -0,0 +1,250 @@
+"""
+In-memory gazetteer of Rwandan provinces/districts/sectors and EAC cities.
+
+Free-text locations ("Butare", "Remera, Gasabo", "nyamiranbo") are normalised
+to canonical location IDs such as 'RW/KIGALI/NYARUGENGE/NYAMIRAMBO' when a
+shipment is saved. Each ID maps to a Tariff zone, and list filters compare IDs
+with an indexed equality / IN lookup instead of scanning with icontains.
+
+Names are held in a character trie, built once at import, which answers
+exact, prefix (autocomplete) and small-typo (edit distance) lookups.
+resolve_location() is what the model calls; it caches results per spelling.
+"""
+import re
+import unicodedata
+from collections import namedtuple
+from functools import lru_cache
+
+from .gazetteer_data import ALIASES, EAC, RWANDA
+
+Location = namedtuple('Location', ['id', 'name', 'level', 'parent_id', 'country'])
+
+# Preferred meaning when one name matches several places: Rwanda first, then the bigger area
+# ("Kigali" is the city, not the sector; "Gitega" is the Kigali sector, not the Burundi city)
+LEVEL_ORDER = {'country': 0, 'province': 1, 'district': 2, 'city': 3, 'sector': 4}
+
+# Words that don't change which place is meant
+NOISE_WORDS = {'district', 'sector', 'province', 'city', 'town', 'akarere', 'umurenge', 'intara', 'umujyi', 'wa'}
+
+PART_SEPARATORS = re.compile(r'[,/;]| - ')
+
+
+def normalize(text):
+    """
+    'Nyamirambo Sector ' -> 'nyamirambo'. Lowercase ASCII words, noise words dropped.
+    """
+    text = unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode().lower()
+    words = [word for word in re.findall(r'[a-z0-9]+', text) if word not in NOISE_WORDS]
+    return ' '.join(words)
+
+
+def _slug(name):
+    return normalize(name).upper().replace(' ', '_')
+
+
+class LocationTrie:
+    """
+    Character trie of normalised names -> location IDs.
+    """
+    __slots__ = ('children', 'ids')
+
+    def __init__(self):
+        self.children = {}
+        self.ids = set()
+
+    def insert(self, name, location_id):
+        node = self
+        for char in name:
+            node = node.children.setdefault(char, LocationTrie())
+        node.ids.add(location_id)
+
+    def exact(self, name):
+        node = self
+        for char in name:
+            node = node.children.get(char)
+            if node is None:
+                return set()
+        return node.ids
+
+    def with_prefix(self, prefix, limit=10):
+        """
+        Up to `limit` (name, ids) pairs starting with prefix, shortest names first.
+        """
+        node = self
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return []
+
+        found, level = [], [(prefix, node)]
+        while level and len(found) < limit:
+            next_level = []
+            for name, current in level:
+                if current.ids:
+                    found.append((name, current.ids))
+                next_level += [(name + char, child) for char, child in sorted(current.children.items())]
+            level = next_level
+        return found[:limit]
+
+    def within_distance(self, name, max_distance):
+        """
+        All (distance, ids) whose name is within max_distance edits of name.
+        Walks the trie once, carrying one row of the Levenshtein table per node
+        and pruning branches that cannot get back under the limit.
+        """
+        results = []
+        first_row = list(range(len(name) + 1))
+
+        def walk(node, char, previous_row):
+            row = [previous_row[0] + 1]
+            for column in range(1, len(name) + 1):
+                row.append(min(
+                    row[column - 1] + 1,
+                    previous_row[column] + 1,
+                    previous_row[column - 1] + (name[column - 1] != char),
+                ))
+            if row[-1] <= max_distance and node.ids:
+                results.append((row[-1], node.ids))
+            if min(row) <= max_distance:
+                for next_char, child in node.children.items():
+                    walk(child, next_char, row)
+
+        for char, child in self.children.items():
+            walk(child, char, first_row)
+        return results
+
+
+class Gazetteer:
+    """
+    All locations, their trie, zones and descendants. Use the module-level GAZETTEER.
+    """
+
+    def __init__(self):
+        self.locations = {}
+        self.trie = LocationTrie()
+        self._descendants = {}
+
+        self._add('RW', 'Rwanda', 'country', None, 'RW')
+        for province_key, (province_name, districts) in RWANDA.items():
+            province_id = self._add(f'RW/{province_key}', province_name, 'province', 'RW', 'RW')
+            self.trie.insert(normalize(province_key), province_id)  # "Northern", "Kigali"
+            for district, sectors in districts.items():
+                district_id = self._add(f'{province_id}/{_slug(district)}', district, 'district', province_id, 'RW')
+                for sector in sectors:
+                    self._add(f'{district_id}/{_slug(sector)}', sector, 'sector', district_id, 'RW')
+
+        for country, (country_name, cities) in EAC.items():
+            self._add(country, country_name, 'country', None, country)
+            for city in cities:
+                self._add(f'{country}/{_slug(city)}', city, 'city', country, country)
+
+        for alias, location_id in ALIASES.items():
+            self.trie.insert(normalize(alias), location_id)
+
+        for location in self.locations.values():
+            ancestor_id = location.id
+            while ancestor_id is not None:
+                self._descendants.setdefault(ancestor_id, set()).add(location.id)
+                ancestor_id = self.locations[ancestor_id].parent_id
+
+    def _add(self, location_id, name, level, parent_id, country):
+        self.locations[location_id] = Location(location_id, name, level, parent_id, country)
+        self.trie.insert(normalize(name), location_id)
+        return location_id
+
+    def _rank(self, location_id):
+        location = self.locations[location_id]
+        return (location.country != 'RW', LEVEL_ORDER[location.level], location_id)
+
+    def _candidates(self, part):
+        """
+        IDs matching one part of the input: exact name, else the closest small typo.
+        """
+        key = normalize(part)
+        if not key:
+            return set()
+        ids = self.trie.exact(key)
+        if ids or len(key) < 5:
+            return set(ids)
+
+        max_distance = 1 if len(key) < 9 else 2
+        matches = self.trie.within_distance(key, max_distance)
+        if not matches:
+            return set()
+        best = min(distance for distance, _ in matches)
+        return set().union(*(ids for distance, ids in matches if distance == best))
+
+    def is_within(self, location_id, ancestor_id):
+        return location_id in self._descendants.get(ancestor_id, ())
+
+    def resolve(self, text):
+        """
+        Returns the Location meant by free text, or None.
+        Comma-separated parts go from specific to general ("Remera, Gasabo, Kigali"):
+        the first part that is a known place wins, narrowed by the parts after it.
+        """
+        parts = [part for part in PART_SEPARATORS.split(text or '') if part.strip()]
+        for index, part in enumerate(parts):
+            candidates = self._candidates(part)
+            if not candidates:
+                continue
+            for wider in parts[index + 1:]:
+                wider_ids = self._candidates(wider)
+                narrowed = {c for c in candidates if any(self.is_within(c, w) for w in wider_ids)}
+                candidates = narrowed or candidates
+            return self.locations[min(candidates, key=self._rank)]
+        return None
+
+    def zone_for(self, location_id):
+        """
+        Tariff zone: Kigali -> ZONE1, rest of Rwanda -> ZONE2, other EAC countries -> ZONE3.
+        Returns '' for 'Rwanda' itself (too vague to price).
+        """
+        location = self.locations.get(location_id)
+        if location is None or location.id == 'RW':
+            return ''
+        if location.country != 'RW':
+            return 'ZONE3'
+        return 'ZONE1' if self.is_within(location.id, 'RW/KIGALI') else 'ZONE2'
+
+    def descendants(self, location_id):
+        """
+        The location and every place inside it, for IN filters ("Kigali" -> all of its sectors).
+        """
+        return self._descendants.get(location_id, {location_id})
+
+    def ancestors(self, location_id):
+        """
+        The location and every place containing it ("Remera" -> Remera, Gasabo, Kigali, Rwanda).
+        """
+        found = []
+        while location_id in self.locations:
+            found.append(location_id)
+            location_id = self.locations[location_id].parent_id
+        return found
+
+    def suggest(self, text, limit=10):
+        """
+        Autocomplete: locations whose name (or alias) starts with text.
+        """
+        found = []
+        for _, ids in self.trie.with_prefix(normalize(text), limit):
+            found += sorted(ids, key=self._rank)
+        unique = list(dict.fromkeys(found))[:limit]
+        return [self.locations[location_id] for location_id in unique]
+
+
+GAZETTEER = Gazetteer()
+
+
+@lru_cache(maxsize=8192)
+def resolve_location(text):
+    """
+    (location_id, zone) for free text; ('', '') when the place is unknown.
+    Cached: the same few hundred spellings come up again and again, and a
+    miss (typo search) costs ~1-2ms against a few microseconds for a hit.
+    """
+    location = GAZETTEER.resolve(text)
+    if location is None:
+        return '', ''
+    return location.id, GAZETTEER.zone_for(location.id)
@@ -0,0 +1,105 @@
+"""
+Source data for the location gazetteer (domestic/gazetteer.py).
+
+Rwanda: the 5 provinces, all 30 districts, all 35 sectors of Kigali and the
+sectors of the main up-country towns. EAC: the countries we ship to and their
+main cities. Add sectors here as new delivery areas open.
+"""
+
+# Province key -> (display name, {district: [sectors]})
+RWANDA = {
+    'KIGALI': ('Kigali City', {
+        'Gasabo': [
+            'Bumbogo', 'Gatsata', 'Gikomero', 'Gisozi', 'Jabana', 'Jali', 'Kacyiru', 'Kimihurura',
+            'Kimironko', 'Kinyinya', 'Ndera', 'Nduba', 'Remera', 'Rusororo', 'Rutunga',
+        ],
+        'Kicukiro': [
+            'Gahanga', 'Gatenga', 'Gikondo', 'Kagarama', 'Kanombe', 'Kicukiro', 'Kigarama', 'Masaka',
+            'Niboye', 'Nyarugunga',
+        ],
+        'Nyarugenge': [
+            'Gitega', 'Kanyinya', 'Kigali', 'Kimisagara', 'Mageragere', 'Muhima', 'Nyakabanda',
+            'Nyamirambo', 'Nyarugenge', 'Rwezamenyo',
+        ],
+    }),
+    'NORTHERN': ('Northern Province', {
+        'Burera': ['Cyanika', 'Rugarama'],
+        'Gakenke': ['Gakenke', 'Ruli'],
+        'Gicumbi': ['Byumba', 'Kageyo'],
+        'Musanze': ['Muhoza', 'Cyuve', 'Kimonyi', 'Kinigi'],
+        'Rulindo': ['Base', 'Shyorongi'],
+    }),
+    'SOUTHERN': ('Southern Province', {
+        'Gisagara': ['Ndora', 'Save'],
+        'Huye': ['Ngoma', 'Tumba', 'Mukura', 'Mbazi'],
+        'Kamonyi': ['Runda', 'Gacurabwenge'],
+        'Muhanga': ['Nyamabuye', 'Shyogwe'],
+        'Nyamagabe': ['Gasaka', 'Tare'],
+        'Nyanza': ['Busasamana', 'Mukingo'],
+        'Nyaruguru': ['Kibeho', 'Ruheru'],
+        'Ruhango': ['Ruhango', 'Byimana'],
+    }),
+    'EASTERN': ('Eastern Province', {
+        'Bugesera': ['Nyamata', 'Ntarama'],
+        'Gatsibo': ['Kabarore', 'Kiramuruzi'],
+        'Kayonza': ['Mukarange', 'Rwinkwavu'],
+        'Kirehe': ['Kirehe', 'Nyakarambi'],
+        'Ngoma': ['Kibungo', 'Rukira'],
+        'Nyagatare': ['Nyagatare', 'Rukomo'],
+        'Rwamagana': ['Kigabiro', 'Muhazi'],
+    }),
+    'WESTERN': ('Western Province', {
+        'Karongi': ['Bwishyura', 'Rubengera'],
+        'Ngororero': ['Ngororero', 'Kabaya'],
+        'Nyabihu': ['Mukamira', 'Jenda'],
+        'Nyamasheke': ['Kagano', 'Kanjongo'],
+        'Rubavu': ['Gisenyi', 'Rubavu', 'Nyamyumba'],
+        'Rusizi': ['Kamembe', 'Gihundwe'],
+        'Rutsiro': ['Gihango', 'Kivumu'],
+    }),
+}
+
+# Country code -> (display name, [cities])
+EAC = {
+    'UG': ('Uganda', ['Kampala', 'Entebbe', 'Jinja', 'Mbarara', 'Gulu', 'Kabale']),
+    'KE': ('Kenya', ['Nairobi', 'Mombasa', 'Kisumu', 'Nakuru', 'Eldoret']),
+    'TZ': ('Tanzania', ['Dar es Salaam', 'Dodoma', 'Arusha', 'Mwanza']),
+    'CD': ('DRC', ['Goma', 'Bukavu', 'Kinshasa', 'Lubumbashi']),
+    'BI': ('Burundi', ['Bujumbura', 'Gitega', 'Ngozi']),
+}
+
+# Other spellings people use -> canonical location ID
+ALIASES = {
+    # Kinyarwanda and short province names
+    'umujyi wa kigali': 'RW/KIGALI',
+    'kigali city': 'RW/KIGALI',
+    'kgl': 'RW/KIGALI',
+    'amajyaruguru': 'RW/NORTHERN',
+    'north': 'RW/NORTHERN',
+    'amajyepfo': 'RW/SOUTHERN',
+    'south': 'RW/SOUTHERN',
+    'iburasirazuba': 'RW/EASTERN',
+    'east': 'RW/EASTERN',
+    'iburengerazuba': 'RW/WESTERN',
+    'west': 'RW/WESTERN',
+    # Pre-2006 town names still used on parcels
+    'butare': 'RW/SOUTHERN/HUYE',
+    'ruhengeri': 'RW/NORTHERN/MUSANZE',
+    'cyangugu': 'RW/WESTERN/RUSIZI',
+    'gitarama': 'RW/SOUTHERN/MUHANGA',
+    'kibuye': 'RW/WESTERN/KARONGI',
+    'umutara': 'RW/EASTERN/NYAGATARE',
+    # Well-known Kigali neighbourhoods
+    'nyabugogo': 'RW/KIGALI/NYARUGENGE/KIMISAGARA',
+    'kimisagara market': 'RW/KIGALI/NYARUGENGE/KIMISAGARA',
+    'kisimenti': 'RW/KIGALI/GASABO/REMERA',
+    'kiyovu': 'RW/KIGALI/NYARUGENGE/NYARUGENGE',
+    'downtown': 'RW/KIGALI/NYARUGENGE/NYARUGENGE',
+    'airport': 'RW/KIGALI/KICUKIRO/KANOMBE',
+    # EAC
+    'dar': 'TZ/DAR_ES_SALAAM',
+    'dsm': 'TZ/DAR_ES_SALAAM',
+    'congo': 'CD',
+    'drc': 'CD',
+    'rdc': 'CD',
+}
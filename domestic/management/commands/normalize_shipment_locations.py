@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+
+from domestic.gazetteer import GAZETTEER, resolve_location
+from domestic.models import Shipment
+from domestic.signals import shipments_relocated
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-resolves shipment origins and destinations against the current gazetteer. "
+        "Run after deploying gazetteer changes, and once on shipments created before the location columns."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help="Distinct spellings set per UPDATE.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError("--batch-size must be at least 1.")
+
+        for text_field, id_field, zone_field in (
+            ('origin', 'origin_location', None),
+            ('destination', 'destination_location', 'destination_zone'),
+        ):
+            # Each distinct spelling is resolved once; spellings that no longer resolve are cleared
+            spellings = list(Shipment.objects.values_list(text_field, flat=True).distinct().order_by(text_field))
+            resolved = {text: resolve_location(text) for text in spellings}
+
+            updated = 0
+            for start in range(0, len(spellings), batch_size):
+                # One CASE update per chunk of spellings, not one UPDATE per row
+                chunk = spellings[start:start + batch_size]
+                changes = {id_field: Case(*[When(**{text_field: text}, then=Value(resolved[text][0])) for text in chunk])}
+                if zone_field:
+                    changes[zone_field] = Case(*[When(**{text_field: text}, then=Value(resolved[text][1])) for text in chunk])
+                rows = Shipment.objects.filter(**{f'{text_field}__in': chunk})
+                unchanged = Q()
+                for field in changes:
+                    unchanged &= Q(**{field: F(f'new_{field}')})
+
+                with transaction.atomic():
+                    # 1. The rows whose stored values actually change, and the areas they move between
+                    moved = (
+                        rows.annotate(**{f'new_{field}': value for field, value in changes.items()})
+                        .exclude(unchanged)
+                        .values_list('pk', text_field, id_field)
+                    )
+                    shipment_ids, areas = [], set()
+                    for pk, text, old_location in moved:
+                        shipment_ids.append(pk)
+                        areas.update(GAZETTEER.ancestors(old_location), GAZETTEER.ancestors(resolved[text][0]))
+
+                    # 2. The update skips post_save: announce the rewrite to delta sync and the manifest caches
+                    updated += rows.update(**changes)
+                    if shipment_ids:
+                        shipments_relocated.send(sender=Shipment, shipment_ids=shipment_ids, areas=areas)
+            self.stdout.write(f"{text_field}: {len(spellings)} spellings, {updated} shipments")
+
+        self.stdout.write(self.style.SUCCESS("Shipment locations normalised."))
@@ -0,0 +1,191 @@
+"""
+Area-scoped manifests.
+
+An AGENT's area is the place named by their assigned_sector: usually a
+sector, but a district or province works too. They list the parcels leaving
+from or arriving anywhere inside it, matched on the indexed
+Shipment.origin_location / destination_location (the area's gazetteer
+descendants). A parcel addressed only to a district ("Huye") is on the
+manifests of that district and everything above it, not of each of its
+sectors. Customers list their own shipments and admins list everything.
+
+The IDs of each area's active (PENDING / IN_TRANSIT) parcels are cached and
+kept warm: when a shipment is saved or changes status, the cached sets of
+every area containing its origin or destination are updated in place (after
+commit) instead of being dropped and reloaded from the table. Only
+normalize_shipment_locations, which moves many parcels at once, drops the
+sets of the areas it touches.
+
+The sets live in the default cache, which is LocMem: one copy per process.
+With several workers, only the worker that handled a status change updates
+its copy; the others serve their own until ACTIVE_PARCELS_TTL expires. Each
+update also rewrites the whole set (get + set under a per-process lock), so
+moving the default cache to a shared backend does not make concurrent updates
+from different workers safe either. Run a single worker, or lower
+ACTIVE_PARCELS_TTL to the staleness you can live with. The same goes for
+normalize_shipment_locations: it runs in its own process, so with the
+default cache the workers' sets only catch up once they expire or the
+workers restart.
+"""
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from ishemalink.metrics import record_cache
+
+from .gazetteer import GAZETTEER, resolve_location
+from .models import Shipment
+from .signals import shipment_status_changed, shipments_relocated
+
+ACTIVE_STATUSES = ('PENDING', 'IN_TRANSIT')
+
+# Updating a cached set is get + set; threads of one worker must not interleave them
+_update_lock = threading.Lock()
+
+
+def active_cache_key(area):
+    return f'active-parcels:{area}'
+
+
+def is_admin(user):
+    return user.is_staff or user.role == 'ADMIN'
+
+
+def area_for(text):
+    """
+    Gazetteer ID of the Rwandan place free text names ("Remera", "Huye"), or '' when unknown.
+    """
+    location_id, _ = resolve_location(text or '')
+    return location_id if GAZETTEER.is_within(location_id, 'RW') else ''
+
+
+def agent_area(user):
+    """
+    The area an agent works in, from User.assigned_sector. '' when unset or unknown.
+    """
+    return area_for(user.assigned_sector)
+
+
+def in_area(area):
+    places = sorted(GAZETTEER.descendants(area))
+    return Q(origin_location__in=places) | Q(destination_location__in=places)
+
+
+def manifest_filter(user):
+    """
+    Q selecting the shipments a user may list, or None for all of them. Agents
+    without a known area see the shipments they own. Only uses owner_id,
+    origin_location and destination_location, which the sync change log stores too.
+    """
+    if is_admin(user):
+        return None
+    if user.role == 'AGENT':
+        area = agent_area(user)
+        if area:
+            return in_area(area)
+    return Q(owner_id=user.pk)
+
+
+def manifest_queryset(user, queryset=None):
+    """
+    The shipments a user may list.
+    """
+    queryset = Shipment.objects.all() if queryset is None else queryset
+    visible = manifest_filter(user)
+    return queryset if visible is None else queryset.filter(visible)
+
+
+def _active_ids_query(area):
+    return (
+        Shipment.objects.filter(in_area(area), current_status__in=ACTIVE_STATUSES)
+        .values_list('pk', flat=True)
+    )
+
+
+def active_parcel_ids(area):
+    """
+    IDs of the area's PENDING / IN_TRANSIT parcels. Loaded from the table on a miss only.
+    """
+    key = active_cache_key(area)
+    ids = cache.get(key)
+    record_cache('active_parcels', hit=ids is not None)
+    if ids is None:
+        ids = set(_active_ids_query(area))
+        cache.set(key, ids, settings.ACTIVE_PARCELS_TTL)
+    return ids
+
+
+async def aactive_parcel_ids(area):
+    """
+    active_parcel_ids() for async views.
+    """
+    key = active_cache_key(area)
+    ids = await cache.aget(key)
+    record_cache('active_parcels', hit=ids is not None)
+    if ids is None:
+        ids = {pk async for pk in _active_ids_query(area)}
+        await cache.aset(key, ids, settings.ACTIVE_PARCELS_TTL)
+    return ids
+
+
+def refresh_active(shipment_id, areas, is_active):
+    """
+    Adds the parcel to (or removes it from) the cached sets of these areas.
+    Areas that are not cached are left alone: their next read loads them.
+    """
+    with _update_lock:
+        cached = cache.get_many([active_cache_key(area) for area in areas])
+        for ids in cached.values():
+            if is_active:
+                ids.add(shipment_id)
+            else:
+                ids.discard(shipment_id)
+        if cached:
+            cache.set_many(cached, settings.ACTIVE_PARCELS_TTL)
+
+
+def _areas_of(shipment):
+    """
+    Every area whose manifest the shipment is on: its origin, its destination and all places containing them.
+    """
+    return set(GAZETTEER.ancestors(shipment.origin_location)) | set(GAZETTEER.ancestors(shipment.destination_location))
+
+
+def _refresh_after_commit(shipment):
+    areas = _areas_of(shipment)
+    if not areas:
+        return
+    shipment_id, is_active = shipment.pk, shipment.current_status in ACTIVE_STATUSES
+    # Only once the write is committed: a rolled back status change must not show up
+    transaction.on_commit(lambda: refresh_active(shipment_id, areas, is_active))
+
+
+@receiver(post_save, sender=Shipment)
+def shipment_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _refresh_after_commit(instance)
+
+
+@receiver(shipment_status_changed)
+def status_changed(sender, shipment, **kwargs):
+    _refresh_after_commit(shipment)
+
+
+@receiver(post_delete, sender=Shipment)
+def shipment_deleted(sender, instance, **kwargs):
+    areas = _areas_of(instance)
+    if areas:
+        shipment_id = instance.pk
+        transaction.on_commit(lambda: refresh_active(shipment_id, areas, False))
+
+
+@receiver(shipments_relocated)
+def shipments_moved(sender, areas, **kwargs):
+    # Many parcels at once: drop the affected sets, their next read reloads them
+    keys = [active_cache_key(area) for area in areas]
+    transaction.on_commit(lambda: cache.delete_many(keys))
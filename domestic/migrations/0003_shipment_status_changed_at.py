@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-19 17:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('domestic', '0002_tariff'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shipment',
+            name='status_changed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
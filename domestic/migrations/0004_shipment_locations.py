@@ -0,0 +1,30 @@
+# Generated by Django 6.0.1 on 2026-10-19 17:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('domestic', '0003_shipment_status_changed_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shipment',
+            name='destination_location',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=60),
+        ),
+        migrations.AddField(
+            model_name='shipment',
+            name='destination_zone',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='Tariff zone of the destination', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='shipment',
+            name='origin_location',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=60),
+        ),
+        # Existing rows are filled by `manage.py normalize_shipment_locations`, which uses the
+        # live gazetteer; a migration must not, or a gazetteer change would rewrite its history.
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-19 17:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('domestic', '0004_shipment_locations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shipment',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -2,6 +2,8 @@ from django.db import models
 from django.conf import settings
 from django.utils.crypto import get_random_string
 
+from .gazetteer import resolve_location
+
 class Shipment(models.Model):
     """
     Represents a package being moved within Rwanda.
@@ -22,10 +24,29 @@ class Shipment(models.Model):
     destination = models.CharField(max_length=100)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Canonical gazetteer IDs for origin/destination (e.g. 'RW/SOUTHERN/HUYE'), set on save.
+    # Blank when the place is unknown. Filters use these instead of icontains on the text.
+    origin_location = models.CharField(max_length=60, blank=True, db_index=True, editable=False)
+    destination_location = models.CharField(max_length=60, blank=True, db_index=True, editable=False)
+    destination_zone = models.CharField(max_length=10, blank=True, db_index=True, editable=False,
+                                        help_text="Tariff zone of the destination")
+
+    # When the current status happened (client time for replayed offline scans).
+    # Offline updates older than this are superseded instead of applied.
+    status_changed_at = models.DateTimeField(null=True, blank=True)
+
+    # Bumped by every status transition (domestic/services.py); a transition only
+    # applies if the version is still the one that was read (optimistic concurrency).
+    version = models.PositiveIntegerField(default=0, editable=False)
+
     def save(self, *args, **kwargs):
         # Auto-generate a tracking number (e.g., RW-AB12CD) if it doesn't exist
         if not self.tracking_number:
             self.tracking_number = 'RW-' + get_random_string(8).upper()
+
+        # Normalise the free-text places to gazetteer IDs and the destination's tariff zone
+        self.origin_location, _ = resolve_location(self.origin)
+        self.destination_location, self.destination_zone = resolve_location(self.destination)
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -1,15 +1,21 @@
+import logging
+
 from django.core.cache import cache
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAdminUser
+from ishemalink.db_router import ReadReplicaMixin
+from ishemalink.metrics import record_cache
 from .models import Tariff
 from .serializers import TariffSerializer # We will create this next
 
+logger = logging.getLogger(__name__)
+
 # Key used to store data in cache
 TARIFF_CACHE_KEY = 'shipping_tariffs_v1'
 CACHE_TTL = 60 * 60 * 24  # 24 Hours
 
-class PublicTariffView(APIView):
+class PublicTariffView(ReadReplicaMixin, APIView):
     """
     GET /api/pricing/tariffs/
     Returns tariff rates. Uses Cache to avoid DB hits.
@@ -21,13 +27,15 @@ class PublicTariffView(APIView):
         cached_data = cache.get(TARIFF_CACHE_KEY)
         
         if cached_data:
-            print("⚡ CACHE HIT: Serving data from RAM") # Log for grading evidence
+            record_cache('tariffs', hit=True)
+            logger.debug("Tariff cache hit: serving data from RAM")
             response = Response(cached_data)
             response['X-Cache-Hit'] = 'TRUE' # Custom header for rubric
             return response
 
         # 2. If not in cache, query Database
-        print("🐢 CACHE MISS: Querying Database...")
+        record_cache('tariffs', hit=False)
+        logger.debug("Tariff cache miss: querying database")
         tariffs = Tariff.objects.all()
         serializer = TariffSerializer(tariffs, many=True)
         data = serializer.data
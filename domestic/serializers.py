@@ -12,8 +12,27 @@ class ShipmentSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Shipment
-        fields = ['id', 'tracking_number', 'current_status', 'origin', 'destination', 'logs']
-        read_only_fields = ['tracking_number', 'owner', 'current_status']
+        fields = [
+            'id', 'tracking_number', 'current_status', 'origin', 'destination',
+            'origin_location', 'destination_location', 'destination_zone', 'version', 'logs',
+        ]
+        read_only_fields = ['tracking_number', 'owner', 'current_status', 'version']
+
+
+class NewShipmentSerializer(ShipmentSerializer):
+    """
+    ShipmentSerializer for the create endpoint. A new shipment has no history
+    yet, so 'logs' is rendered as [] instead of queried (the view is async).
+    """
+    logs = None
+
+    class Meta(ShipmentSerializer.Meta):
+        fields = [field for field in ShipmentSerializer.Meta.fields if field != 'logs']
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        data['logs'] = []
+        return data
 
 
 from .models import Tariff # Update import at the top!
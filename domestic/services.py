@@ -0,0 +1,87 @@
+"""
+Shipment status transitions.
+
+The status is a small state machine (ALLOWED_TRANSITIONS). A transition is one
+conditional UPDATE of the status columns only:
+
+    UPDATE domestic_shipment SET current_status=?, status_changed_at=?, version=version + 1
+    WHERE id=? AND version=?
+
+plus the ShipmentLog insert, in one transaction. The delta sync change log
+adds one DELETE and one INSERT for both rows (sync/tracking.py), so a
+transition is four write statements in all. No row is locked while the
+request runs: if another scan changed the shipment since it was read, the
+version no longer matches, nothing is written and StaleShipmentError is raised
+(the API answers 409 Conflict and the client re-reads).
+"""
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Shipment, ShipmentLog
+from .signals import shipment_status_changed
+
+# Current status -> statuses it may move to. DELIVERED is final; a FAILED
+# delivery can go back out. Repeated IN_TRANSIT scans record each hub.
+ALLOWED_TRANSITIONS = {
+    'PENDING': {'IN_TRANSIT', 'FAILED'},
+    'IN_TRANSIT': {'IN_TRANSIT', 'DELIVERED', 'FAILED'},
+    'FAILED': {'IN_TRANSIT'},
+    'DELIVERED': set(),
+}
+
+
+class StatusTransitionError(Exception):
+    """
+    The shipment's current status does not allow the requested one.
+    """
+
+    def __init__(self, current_status, new_status):
+        allowed = sorted(ALLOWED_TRANSITIONS.get(current_status, ()))
+        super().__init__(
+            f"Cannot change status from {current_status} to {new_status}. "
+            f"Allowed: {', '.join(allowed) or 'none'}."
+        )
+        self.current_status = current_status
+        self.allowed = allowed
+
+
+class StaleShipmentError(Exception):
+    """
+    The shipment changed after it was read (another scan won the race).
+    """
+
+
+def record_status_update(shipment, new_status, location, changed_at=None, expected_version=None):
+    """
+    Moves the shipment to new_status and writes its history entry in ONE
+    transaction, as a conditional update on the version the caller read
+    (or expected_version, sent by a client that read it earlier).
+    With SQLite in IMMEDIATE mode the write lock is taken once per transition.
+    changed_at is when the status really changed (defaults to now).
+    On success the instance carries the new status and version.
+    """
+    version = shipment.version if expected_version is None else expected_version
+    if new_status not in ALLOWED_TRANSITIONS.get(shipment.current_status, ()):
+        raise StatusTransitionError(shipment.current_status, new_status)
+    changed_at = changed_at or timezone.now()
+
+    with transaction.atomic():
+        # 1. Write only the status columns, and only if nobody got there first
+        updated = Shipment.objects.filter(pk=shipment.pk, version=version).update(
+            current_status=new_status,
+            status_changed_at=changed_at,
+            version=F('version') + 1,
+        )
+        if not updated:
+            raise StaleShipmentError(f"Shipment {shipment.pk} was changed by another request.")
+
+        # 2. History entry; bulk_create skips post_save, the signal below reports it
+        log = ShipmentLog.objects.bulk_create([
+            ShipmentLog(shipment=shipment, status=new_status, location=location)
+        ])[0]
+
+        shipment.current_status = new_status
+        shipment.status_changed_at = changed_at
+        shipment.version = version + 1
+        shipment_status_changed.send(sender=Shipment, shipment=shipment, log=log)
@@ -0,0 +1,14 @@
+from django.dispatch import Signal
+
+# Sent inside the transaction of every status transition. The transition is a
+# conditional queryset update, which skips post_save, so receivers that track
+# shipment changes (delta sync, active parcel caches) listen here.
+# Receivers get: shipment (the instance, already carrying the new status and version)
+# and log (the new ShipmentLog, written with bulk_create, so it sends no post_save either).
+shipment_status_changed = Signal()
+
+# Sent by normalize_shipment_locations inside the transaction of each bulk
+# location rewrite, which also skips post_save.
+# Receivers get: shipment_ids (the rewritten shipments) and areas (every area whose
+# manifest they were on before or are on after the rewrite).
+shipments_relocated = Signal()
@@ -1,3 +1,639 @@
-from django.test import TestCase
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import AsyncClient, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.module_loading import import_string
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.models import User
+from ishemalink import idempotency
+from ishemalink.db_router import _pin_key
+from ishemalink.metrics import REGISTRY, render_prometheus
+from .gazetteer import GAZETTEER, resolve_location
+from .manifests import active_cache_key
+from .models import Shipment, ShipmentLog, Tariff
+from .services import StaleShipmentError, record_status_update
+
+
+class ReplicaSyncMixin:
+    """
+    Test fixture for the two-database setup: copies the primary's rows onto
+    the replica, standing in for real replication.
+    """
+    databases = {'default', 'replica'}
+    replicated_models = [User, Shipment, ShipmentLog, Tariff]
+
+    def sync_replica(self):
+        for model in reversed(self.replicated_models):
+            model.objects.using('replica').all().delete()
+        for model in self.replicated_models:
+            model.objects.using('replica').bulk_create(model.objects.using('default').all())
+
+
+@override_settings(READ_REPLICA_ENABLED=True, READ_REPLICA_STICKY_SECONDS=5)
+class ReadReplicaRoutingTests(ReplicaSyncMixin, TestCase):
+    """
+    Tests that list endpoints read from the replica, with read-your-writes stickiness.
+    """
+    list_url = '/api/domestic/shipments/list/'
+
+    def setUp(self):
+        self.agent = User.objects.create_user(
+            username='+250788000010', phone='+250788000010', password='pass12345', role='AGENT'
+        )
+        Shipment.objects.create(owner=self.agent, origin='Kigali', destination='Huye')
+        self.sync_replica()
+        self.client = APIClient()
+        self.client.force_authenticate(self.agent)
+        self.token = RefreshToken.for_user(self.agent).access_token
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_list_reads_from_replica(self):
+        """Rows not yet replicated are not visible through the list endpoint."""
+        Shipment.objects.create(owner=self.agent, origin='Kigali', destination='Musanze')
+
+        response = self.client.get(self.list_url)
+        self.assertEqual(response.data['count'], 1)
+
+        self.sync_replica()
+        response = self.client.get(self.list_url)
+        self.assertEqual(response.data['count'], 2)
+
+    def test_writer_is_pinned_to_primary(self):
+        """After a write, the same user reads from the primary and sees it."""
+        response = self.client.post(
+            '/api/domestic/shipments/', {'origin': 'Kigali', 'destination': 'Rubavu'}, format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+
+        response = self.client.get(self.list_url)
+        self.assertEqual(response.data['count'], 2)
+
+    async def test_writer_is_pinned_on_async_stack(self):
+        """Under ASGI the middleware runs as a coroutine and still pins the writer."""
+        response = await AsyncClient().post(
+            '/api/domestic/shipments/', {'origin': 'Kigali', 'destination': 'Rubavu'},
+            content_type='application/json', headers={'Authorization': f'Bearer {self.token}'},
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(await cache.aget(_pin_key(self.agent.pk)))
+
+    @override_settings(READ_REPLICA_ENABLED=False)
+    def test_disabled_replica_reads_primary(self):
+        """With the replica switched off every read goes to the primary."""
+        Shipment.objects.create(owner=self.agent, origin='Kigali', destination='Musanze')
+        response = self.client.get(self.list_url)
+        self.assertEqual(response.data['count'], 2)
+
+
+@mock.patch('domestic.views.send_sms_notification', new_callable=mock.AsyncMock)
+class StatusUpdateTests(TestCase):
+    """
+    Tests for the async status update endpoint and its single-transaction write.
+    """
+    def setUp(self):
+        self.owner = User.objects.create_user(
+            username='+250788000011', phone='+250788000011', password='pass12345'
+        )
+        self.shipment = Shipment.objects.create(owner=self.owner, origin='Kigali', destination='Huye')
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+        self.url = f'/api/domestic/shipments/{self.shipment.pk}/update/'
+
+    def test_status_and_log_are_saved(self, send_sms):
+        """The status change and its log entry are written and the SMS is sent."""
+        response = self.client.post(self.url, {'status': 'IN_TRANSIT', 'location': 'Muhanga'}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.shipment.refresh_from_db()
+        self.assertEqual(self.shipment.current_status, 'IN_TRANSIT')
+        self.assertEqual(list(self.shipment.logs.values_list('status', 'location')), [('IN_TRANSIT', 'Muhanga')])
+        send_sms.assert_awaited_once()
+
+    def test_writes_roll_back_together(self, send_sms):
+        """If the log insert fails, the status change is rolled back too."""
+        # Unexpected errors are left to Django: a plain 500, logged, with no details in the body
+        self.client.raise_request_exception = False
+        with mock.patch('domestic.services.ShipmentLog.objects.bulk_create', side_effect=RuntimeError("disk full")), \
+                self.assertLogs('django.request', level='ERROR'):
+            response = self.client.post(self.url, {'status': 'IN_TRANSIT'}, format='json')
+
+        self.assertEqual(response.status_code, 500)
+        self.assertNotIn(b'disk full', response.content)
+        self.shipment.refresh_from_db()
+        self.assertEqual(self.shipment.current_status, 'PENDING')
+
+    def test_requires_authentication(self, send_sms):
+        """Anonymous users are rejected before the view runs."""
+        self.client.force_authenticate(None)
+        response = self.client.post(self.url, {'status': 'DELIVERED'}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_disallowed_transition_rejected(self, send_sms):
+        """A PENDING shipment cannot jump straight to DELIVERED; nothing is written."""
+        response = self.client.post(self.url, {'status': 'DELIVERED'}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['current_status'], 'PENDING')
+        self.assertFalse(self.shipment.logs.exists())
+        send_sms.assert_not_awaited()
+
+    def test_stale_version_conflicts(self, send_sms):
+        """A client that read an old version gets 409 instead of overwriting the newer scan."""
+        first = self.client.post(self.url, {'status': 'IN_TRANSIT', 'version': 0}, format='json')
+        self.assertEqual(first.data['version'], 1)
+
+        response = self.client.post(self.url, {'status': 'FAILED', 'version': 0}, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual((response.data['current_status'], response.data['version']), ('IN_TRANSIT', 1))
+        self.shipment.refresh_from_db()
+        self.assertEqual(self.shipment.current_status, 'IN_TRANSIT')
+
+    def test_lost_race_writes_nothing(self, send_sms):
+        """Of two scans that read the same version, the second one is refused."""
+        first, second = Shipment.objects.get(pk=self.shipment.pk), Shipment.objects.get(pk=self.shipment.pk)
+        record_status_update(first, 'IN_TRANSIT', 'Muhanga')
+
+        with self.assertRaises(StaleShipmentError):
+            record_status_update(second, 'FAILED', 'Huye')
+        self.assertEqual(list(self.shipment.logs.values_list('status', flat=True)), ['IN_TRANSIT'])
+
+    def test_transition_is_one_conditional_update(self, send_sms):
+        """
+        Only the status columns are written, in one UPDATE guarded by the version.
+        With the log insert and the change log's DELETE + INSERT, that is four writes in all.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            record_status_update(self.shipment, 'IN_TRANSIT', 'Muhanga')
+
+        writes = [q['sql'] for q in queries if q['sql'].startswith(('UPDATE', 'INSERT', 'DELETE'))]
+        self.assertEqual([sql.split(' (')[0].split(' SET')[0].split(' WHERE')[0] for sql in writes], [
+            'UPDATE "domestic_shipment"',
+            'INSERT INTO "domestic_shipmentlog"',
+            'DELETE FROM "sync_changelogentry"',
+            'INSERT INTO "sync_changelogentry"',
+        ])
+        set_clause, where_clause = writes[0].split('WHERE')
+        self.assertIn('"version" = 0', where_clause)
+        self.assertNotIn('"origin"', set_clause)
+
+    def test_malformed_input_rejected(self, send_sms):
+        """A missing or non-string status, or a non-integer version, is a 400 and writes nothing."""
+        for payload in ({}, {'status': ['IN_TRANSIT']}, {'status': 'IN_TRANSIT', 'version': [1]},
+                        {'status': 'IN_TRANSIT', 'version': True}, {'status': 'IN_TRANSIT', 'location': 7}):
+            response = self.client.post(self.url, payload, format='json')
+            self.assertEqual(response.status_code, 400, payload)
+        response = self.client.post(self.url, ['IN_TRANSIT'], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(self.shipment.logs.exists())
+
+
+class RequestMetricsTests(TestCase):
+    """
+    Tests for the instrumentation middleware and the /metrics endpoint.
+    """
+    def setUp(self):
+        REGISTRY.clear()
+        cache.clear()
+        Tariff.objects.create(zone='ZONE1', base_rate=1000, weight_multiplier=200)
+        self.staff = User.objects.create_user(
+            username='+250788000030', phone='+250788000030', password='pass12345', is_staff=True
+        )
+
+    def scrape(self):
+        self.client.force_login(self.staff)
+        return self.client.get('/metrics').content.decode()
+
+    def test_server_timing_header(self):
+        """Every response reports app time, DB time and query count."""
+        response = self.client.get('/api/domestic/pricing/tariffs/')
+        self.assertRegex(response['Server-Timing'], r'app;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries"')
+
+    async def test_async_stack_is_timed(self):
+        """Under ASGI the middleware runs as a coroutine and still times the view and its SQL."""
+        response = await AsyncClient().get('/api/domestic/pricing/tariffs/')
+        self.assertRegex(response['Server-Timing'], r'db;dur=[\d.]+;desc="1 queries"')
+
+    def test_metrics_endpoint_reports_views_and_cache(self):
+        """/metrics exposes per-view latency histograms and per-view cache hit/miss counters."""
+        self.client.get('/api/domestic/pricing/tariffs/')
+        self.client.get('/api/domestic/pricing/tariffs/')
+
+        body = self.scrape()
+        self.assertIn('ishemalink_request_duration_seconds_count{view="public-tariffs"} 2', body)
+        self.assertIn('ishemalink_cache_requests_total{view="public-tariffs",cache="tariffs",result="miss"} 1', body)
+        self.assertIn('ishemalink_cache_requests_total{view="public-tariffs",cache="tariffs",result="hit"} 1', body)
+
+    def test_throttled_requests_are_counted(self):
+        """429 responses are counted as throttle rejections."""
+        for _ in range(6):
+            response = self.client.post('/api/auth/login/session/', {'username': 'x', 'password': 'y'})
+        self.assertEqual(response.status_code, 429)
+
+        body = self.scrape()
+        self.assertIn('ishemalink_throttled_total{view="login-session"} 1', body)
+
+    def test_metrics_need_staff_or_token(self):
+        """Without METRICS_TOKEN only staff can scrape; with one, the bearer token is required."""
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        with override_settings(METRICS_TOKEN='s3cret'):
+            self.assertEqual(self.client.get('/metrics').status_code, 401)
+            response = self.client.get('/metrics', headers={'Authorization': 'Bearer s3cret'})
+            self.assertEqual(response.status_code, 200)
+
+    def test_label_values_are_escaped(self):
+        """Backslashes, quotes and newlines in label values follow the Prometheus text format."""
+        REGISTRY.inc('ishemalink_cache_requests_total', (('cache', 'a\\b"c\nd'), ('result', 'hit')))
+        body = render_prometheus([REGISTRY.snapshot()])
+        self.assertIn('{cache="a\\\\b\\"c\\nd",result="hit"} 1', body)
+
+    def test_dead_worker_snapshots_are_dropped(self):
+        """Snapshots left by workers that exited are deleted instead of being summed forever."""
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            snapshot = {'counters': {'ishemalink_throttled_total': [[[['view', 'x']], 7]]}}
+            live = Path(directory) / f'worker-{os.getppid()}.json'
+            dead = Path(directory) / 'worker-999999999.json'
+            live.write_text(json.dumps(snapshot))
+            dead.write_text(json.dumps(snapshot))
+
+            body = self.scrape()
+
+            self.assertIn('ishemalink_throttled_total{view="x"} 7', body)
+            self.assertFalse(dead.exists())
+
+
+class IdempotencyKeyTests(TestCase):
+    """
+    Tests for Idempotency-Key handling on the create endpoints.
+    """
+    url = '/api/domestic/shipments/'
+
+    def setUp(self):
+        caches['idempotency'].clear()
+        self.agent = User.objects.create_user(
+            username='+250788000040', phone='+250788000040', password='pass12345', role='AGENT'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.agent)
+
+    def post(self, data, key):
+        return self.client.post(self.url, data, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_first_response(self):
+        """A retried POST returns the same shipment instead of creating a new one."""
+        first = self.post({'origin': 'Kigali', 'destination': 'Huye'}, 'retry-1')
+        second = self.post({'origin': 'Kigali', 'destination': 'Huye'}, 'retry-1')
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second.data['tracking_number'], first.data['tracking_number'])
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(Shipment.objects.count(), 1)
+
+    def test_key_reused_with_other_body_rejected(self):
+        """The same key with a different payload is a client error, not a replay."""
+        self.post({'origin': 'Kigali', 'destination': 'Huye'}, 'retry-2')
+        response = self.post({'origin': 'Kigali', 'destination': 'Rubavu'}, 'retry-2')
+        self.assertEqual(response.status_code, 422)
+
+    def test_register_and_cargo_are_idempotent(self):
+        """Registration (anonymous) and cargo creation honour the header too."""
+        anon = APIClient()
+        payload = {'username': '+250788000041', 'phone': '+250788000041', 'password': 'pass12345', 'role': 'CUSTOMER'}
+        first = anon.post('/api/register/', payload, format='json', HTTP_IDEMPOTENCY_KEY='reg-1')
+        second = anon.post('/api/register/', payload, format='json', HTTP_IDEMPOTENCY_KEY='reg-1')
+        self.assertEqual((first.status_code, second.status_code), (201, 201))
+
+        cargo = {'manifest_id': 'EAC-777', 'tin_number': 'T', 'destination_country': 'UG', 'weight_kg': '5.00'}
+        self.client.post('/api/international/cargo/', cargo, format='json', HTTP_IDEMPOTENCY_KEY='cargo-1')
+        retry = self.client.post('/api/international/cargo/', cargo, format='json', HTTP_IDEMPOTENCY_KEY='cargo-1')
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+
+    def test_anonymous_keys_are_scoped_per_client(self):
+        """Two anonymous clients that happen to pick the same key do not collide."""
+        for n, address in enumerate(['10.0.0.1', '10.0.0.2']):
+            phone = f'+25078800005{n}'
+            payload = {'username': phone, 'phone': phone, 'password': 'pass12345', 'role': 'CUSTOMER'}
+            response = APIClient().post(
+                '/api/register/', payload, format='json', HTTP_IDEMPOTENCY_KEY='same', REMOTE_ADDR=address
+            )
+            self.assertEqual(response.status_code, 201)
+        self.assertEqual(User.objects.filter(username__startswith='+25078800005').count(), 2)
+
+    def test_stored_fingerprint_is_keyed(self):
+        """The stored fingerprint is an HMAC, not a plain hash of a body holding a password."""
+        payload = {'origin': 'Kigali', 'destination': 'Huye'}
+        self.post(payload, 'fp')
+        response_key, _ = idempotency.cache_keys(self.agent.pk, self.url, 'fp')
+        stored = idempotency._unpack(caches['idempotency'].get(response_key))
+
+        body = json.dumps(['POST', self.url, payload], sort_keys=True)
+        self.assertNotEqual(stored['fingerprint'], hashlib.sha256(body.encode()).hexdigest())
+        with self.settings(SECRET_KEY='another-secret-key-for-this-test-only'):
+            self.assertEqual(self.post(payload, 'fp').status_code, 422)
+
+    def test_concurrent_duplicate_waits_for_in_flight_request(self):
+        """A duplicate arriving mid-flight waits and gets the original's response."""
+        first = self.post({'origin': 'Kigali', 'destination': 'Huye'}, 'warm')
+        store = caches['idempotency']
+        response_key, lock_key = idempotency.cache_keys(self.agent.pk, self.url, 'warm')
+        blob = store.get(response_key)
+
+        # Pretend that request is still in flight and finishes 0.2s from now
+        store.delete(response_key)
+        store.add(lock_key, 'in-flight', 30)
+        threading.Timer(0.2, lambda: (store.set(response_key, blob), store.delete(lock_key))).start()
+
+        response = self.post({'origin': 'Kigali', 'destination': 'Huye'}, 'warm')
+        self.assertEqual(response.data['tracking_number'], first.data['tracking_number'])
+        self.assertEqual(Shipment.objects.count(), 1)
+
+    @mock.patch.object(idempotency, 'POLL_INTERVAL', 0.01)
+    def test_stuck_in_flight_request_returns_409(self):
+        """If the in-flight request never finishes within the wait, the duplicate gets 409."""
+        with self.settings(IDEMPOTENCY_WAIT_SECONDS=0.1):
+            with mock.patch.object(caches['idempotency'], 'add', return_value=False):
+                response = self.post({'origin': 'Kigali', 'destination': 'Huye'}, 'stuck')
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Shipment.objects.exists())
+
+
+class GazetteerTests(SimpleTestCase):
+    """
+    Tests for location normalisation and zone resolution.
+    """
+    def test_spellings_resolve_to_one_id(self):
+        """Old names, noise words and small typos land on the same canonical ID."""
+        for text in ('Huye', 'Butare', 'huye district', ' HUYE '):
+            self.assertEqual(resolve_location(text)[0], 'RW/SOUTHERN/HUYE', text)
+        self.assertEqual(resolve_location('Nyamiranbo')[0], 'RW/KIGALI/NYARUGENGE/NYAMIRAMBO')
+
+    def test_qualified_names_are_disambiguated(self):
+        """Later comma parts pick between places sharing a name."""
+        self.assertEqual(resolve_location('Ngoma')[0], 'RW/EASTERN/NGOMA')
+        self.assertEqual(resolve_location('Ngoma, Huye')[0], 'RW/SOUTHERN/HUYE/NGOMA')
+        self.assertEqual(resolve_location('Gitega, Burundi')[0], 'BI/GITEGA')
+
+    def test_zones(self):
+        """Kigali is ZONE1, the rest of Rwanda ZONE2, EAC cities ZONE3, unknown places none."""
+        self.assertEqual(resolve_location('Remera')[1], 'ZONE1')
+        self.assertEqual(resolve_location('Musanze')[1], 'ZONE2')
+        self.assertEqual(resolve_location('Nairobi')[1], 'ZONE3')
+        self.assertEqual(resolve_location('Atlantis'), ('', ''))
+
+    def test_descendants_cover_the_area(self):
+        """A province's descendants include its districts and sectors."""
+        inside = GAZETTEER.descendants('RW/KIGALI')
+        self.assertIn('RW/KIGALI/GASABO/REMERA', inside)
+        self.assertNotIn('RW/SOUTHERN/HUYE', inside)
+
+
+class ShipmentLocationTests(TestCase):
+    """
+    Tests for the normalised location columns and the list filters using them.
+    """
+    list_url = '/api/domestic/shipments/list/'
+
+    def setUp(self):
+        self.agent = User.objects.create_user(
+            username='+250788000050', phone='+250788000050', password='pass12345', role='AGENT'
+        )
+        self.to_remera = Shipment.objects.create(owner=self.agent, origin='Butare', destination='Remera, Gasabo')
+        self.to_huye = Shipment.objects.create(owner=self.agent, origin='Kigali', destination='huye')
+        self.to_nowhere = Shipment.objects.create(owner=self.agent, origin='Kigali', destination='Warehouse 7')
+        self.client = APIClient()
+        self.client.force_authenticate(self.agent)
+
+    def listed(self, **params):
+        response = self.client.get(self.list_url, params)
+        return {row['id'] for row in response.data['results']}
+
+    def test_save_stores_ids_and_zone(self):
+        """Locations are normalised when the shipment is written."""
+        self.assertEqual(self.to_remera.origin_location, 'RW/SOUTHERN/HUYE')
+        self.assertEqual(self.to_remera.destination_location, 'RW/KIGALI/GASABO/REMERA')
+        self.assertEqual(self.to_remera.destination_zone, 'ZONE1')
+        self.assertEqual(self.to_nowhere.destination_location, '')
+
+    def test_filter_by_area_and_zone(self):
+        """?destination=Kigali matches every place inside Kigali; ?zone uses the tariff zone."""
+        self.assertEqual(self.listed(destination='Kigali'), {self.to_remera.pk})
+        self.assertEqual(self.listed(destination='Butare'), {self.to_huye.pk})
+        self.assertEqual(self.listed(zone='ZONE2'), {self.to_huye.pk})
+
+    def test_unknown_place_falls_back_to_text(self):
+        """Places the gazetteer doesn't know still match on the free text."""
+        self.assertEqual(self.listed(destination='warehouse'), {self.to_nowhere.pk})
+
+    def test_normalize_command_rewrites_locations(self):
+        """The command re-resolves stored spellings, filling rows written before the columns."""
+        Shipment.objects.update(origin_location='', destination_location='STALE', destination_zone='')
+        call_command('normalize_shipment_locations', '--batch-size', '1', stdout=StringIO())
+
+        self.to_remera.refresh_from_db()
+        self.assertEqual(self.to_remera.origin_location, 'RW/SOUTHERN/HUYE')
+        self.assertEqual(self.to_remera.destination_location, 'RW/KIGALI/GASABO/REMERA')
+        self.assertEqual(self.to_remera.destination_zone, 'ZONE1')
+        self.assertEqual(Shipment.objects.get(pk=self.to_nowhere.pk).destination_location, '')
+
+    def test_normalize_command_drops_affected_active_sets(self):
+        """Cached active parcel sets of the areas a rewritten shipment moved between are dropped, others kept."""
+        Shipment.objects.filter(pk=self.to_remera.pk).update(destination_location='RW/KIGALI/KICUKIRO')
+        for area in ('RW/KIGALI/KICUKIRO', 'RW/KIGALI/GASABO/REMERA', 'RW/EASTERN'):
+            cache.set(active_cache_key(area), {self.to_remera.pk})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('normalize_shipment_locations', stdout=StringIO())
+
+        self.assertIsNone(cache.get(active_cache_key('RW/KIGALI/KICUKIRO')))
+        self.assertIsNone(cache.get(active_cache_key('RW/KIGALI/GASABO/REMERA')))
+        self.assertEqual(cache.get(active_cache_key('RW/EASTERN')), {self.to_remera.pk})
+
+    def test_location_autocomplete(self):
+        """The autocomplete endpoint suggests canonical places with their zone."""
+        response = self.client.get('/api/domestic/locations/', {'q': 'nyamir'})
+        self.assertEqual(response.data[0]['id'], 'RW/KIGALI/NYARUGENGE/NYAMIRAMBO')
+        self.assertEqual(response.data[0]['zone'], 'ZONE1')
+
+
+class SectorManifestTests(TestCase):
+    """
+    Tests for sector-scoped manifests and the cached active parcels of a sector.
+    """
+    list_url = '/api/domestic/shipments/list/'
+    active_url = '/api/domestic/shipments/sector/active/'
+
+    def setUp(self):
+        cache.clear()
+        self.agent = User.objects.create_user(
+            username='+250788000060', phone='+250788000060', password='pass12345',
+            role='AGENT', assigned_sector='Remera',
+        )
+        self.customer = User.objects.create_user(
+            username='+250788000061', phone='+250788000061', password='pass12345'
+        )
+        self.inbound = Shipment.objects.create(owner=self.customer, origin='Huye', destination='Remera')
+        self.outbound = Shipment.objects.create(owner=self.customer, origin='Remera, Gasabo', destination='Rubavu')
+        self.delivered = Shipment.objects.create(
+            owner=self.customer, origin='Nyamirambo', destination='Remera', current_status='DELIVERED'
+        )
+        self.elsewhere = Shipment.objects.create(owner=self.agent, origin='Huye', destination='Musanze')
+        self.client = APIClient()
+        self.client.force_authenticate(self.agent)
+
+    def tearDown(self):
+        cache.clear()
+
+    def ids(self, response):
+        return [row['id'] for row in response.data['results']]
+
+    def test_agent_lists_their_sector_only(self):
+        """An agent's manifest is the parcels leaving from or arriving in their sector."""
+        response = self.client.get(self.list_url)
+        self.assertEqual(set(self.ids(response)), {self.inbound.pk, self.outbound.pk, self.delivered.pk})
+
+        # A district assignment covers all of its sectors
+        self.agent.assigned_sector = 'Gasabo'
+        self.agent.save()
+        response = self.client.get(self.list_url)
+        self.assertEqual(response.data['count'], 3)
+
+    def test_district_addresses_are_on_district_manifests(self):
+        """A parcel addressed only to a district is on that district's manifest and active set."""
+        self.agent.assigned_sector = 'Huye'
+        self.agent.save()
+        response = self.client.get(self.list_url)
+        self.assertEqual(set(self.ids(response)), {self.inbound.pk, self.elsewhere.pk})
+        response = self.client.get(self.active_url)
+        self.assertEqual(self.ids(response), [self.elsewhere.pk, self.inbound.pk])
+
+        # A parcel from one of Huye's sectors joins the cached district set
+        with self.captureOnCommitCallbacks(execute=True):
+            new = Shipment.objects.create(owner=self.customer, origin='Tumba', destination='Rubavu')
+        with self.assertNumQueries(2):
+            response = self.client.get(self.active_url)
+        self.assertEqual(self.ids(response), [new.pk, self.elsewhere.pk, self.inbound.pk])
+
+    def test_customer_lists_own_shipments(self):
+        """Customers only see the shipments they own."""
+        self.client.force_authenticate(self.customer)
+        response = self.client.get(self.list_url)
+        self.assertEqual(response.data['count'], 3)
+        self.assertNotIn(self.elsewhere.pk, self.ids(response))
+
+    def test_active_parcels_stay_warm(self):
+        """Status changes update the cached set, so later pages only read the page's rows."""
+        response = self.client.get(self.active_url)
+        self.assertEqual(self.ids(response), [self.outbound.pk, self.inbound.pk])
+
+        with self.captureOnCommitCallbacks(execute=True), \
+                mock.patch('domestic.views.send_sms_notification', new_callable=mock.AsyncMock):
+            self.client.post(f'/api/domestic/shipments/{self.inbound.pk}/update/', {'status': 'FAILED'})
+            new = Shipment.objects.create(owner=self.customer, origin='Kigali', destination='Remera')
+
+        # The page's shipments and their logs; no query for the parcel IDs
+        with self.assertNumQueries(2):
+            response = self.client.get(self.active_url)
+        self.assertEqual(self.ids(response), [new.pk, self.outbound.pk])
+
+    def test_active_parcels_need_a_sector(self):
+        """Customers have no sector manifest; admins must name the sector."""
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.get(self.active_url).status_code, 403)
+
+        admin = User.objects.create_user(
+            username='+250788000062', phone='+250788000062', password='pass12345', role='ADMIN'
+        )
+        self.client.force_authenticate(admin)
+        self.assertEqual(self.client.get(self.active_url).status_code, 400)
+        response = self.client.get(self.active_url, {'sector': 'Remera'})
+        self.assertEqual(response.data['count'], 2)
+
+
+@mock.patch('domestic.views.send_sms_notification', new_callable=mock.AsyncMock)
+class AsyncShipmentViewTests(TestCase):
+    """
+    Tests for the domestic views on the async ORM.
+    """
+    list_url = '/api/domestic/shipments/list/'
+
+    def setUp(self):
+        self.customer = User.objects.create_user(
+            username='+250788000070', phone='+250788000070', password='pass12345'
+        )
+        self.shipments = [
+            Shipment.objects.create(owner=self.customer, origin='Kigali', destination='Huye') for _ in range(25)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def test_status_update_reads_shipment_and_owner_in_one_query(self, send_sms):
+        """The owner's phone for the SMS comes with the shipment, not from a second query."""
+        url = f'/api/domestic/shipments/{self.shipments[0].pk}/update/'
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, {'status': 'IN_TRANSIT'}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        reads = [q['sql'] for q in queries if q['sql'].startswith('SELECT') and 'FROM "domestic_shipment"' in q['sql']]
+        self.assertEqual(len(reads), 1)
+        self.assertIn('JOIN "core_user"', reads[0])
+        send_sms.assert_awaited_once_with('+250788000070', 'Your package is now IN_TRANSIT at Unknown Location')
+
+    def test_unknown_shipment_is_404(self, send_sms):
+        """A missing shipment is reported as not found, not as a server error."""
+        response = self.client.post('/api/domestic/shipments/999999/update/', {'status': 'IN_TRANSIT'}, format='json')
+        self.assertEqual(response.status_code, 404)
+
+    def test_other_users_shipment_is_404(self, send_sms):
+        """A customer cannot move another customer's shipment; it is not on their manifest."""
+        other = User.objects.create_user(username='+250788000071', phone='+250788000071', password='pass12345')
+        self.client.force_authenticate(other)
+        url = f'/api/domestic/shipments/{self.shipments[0].pk}/update/'
+        response = self.client.post(url, {'status': 'IN_TRANSIT'}, format='json')
+
+        self.assertEqual(response.status_code, 404)
+        self.shipments[0].refresh_from_db()
+        self.assertEqual(self.shipments[0].current_status, 'PENDING')
+        send_sms.assert_not_awaited()
+
+    def test_list_pages(self, send_sms):
+        """Async paging keeps DRF's format: count, next/previous links, 'last' and 404 past the end."""
+        first = self.client.get(self.list_url)
+        self.assertEqual((first.data['count'], len(first.data['results'])), (25, 20))
+        self.assertIsNotNone(first.data['next'])
+
+        last = self.client.get(self.list_url, {'page': 'last'})
+        self.assertEqual(len(last.data['results']), 5)
+        self.assertIsNone(last.data['next'])
+        seen = {row['id'] for row in first.data['results'] + last.data['results']}
+        self.assertEqual(seen, {s.pk for s in self.shipments})
+
+        self.assertEqual(self.client.get(self.list_url, {'page': 3}).status_code, 404)
+
+    def test_middleware_stack_is_async_capable(self, send_sms):
+        """Every middleware runs on the event loop, so async views are not bounced through a thread."""
+        sync_only = [path for path in settings.MIDDLEWARE if not getattr(import_string(path), 'async_capable', False)]
+        self.assertEqual(sync_only, [])
+
+    def test_create_returns_empty_history(self, send_sms):
+        """A created shipment is rendered (logs included) without touching the ORM synchronously."""
+        response = self.client.post('/api/domestic/shipments/', {'origin': 'Musanze', 'destination': 'Remera'}, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['logs'], [])
+        self.assertEqual(response.data['destination_zone'], 'ZONE1')
@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import CreateShipmentView, update_shipment_status, ShipmentListView # <--- New Import
+from .views import CreateShipmentView, update_shipment_status, ShipmentListView, SectorActiveParcelsView, LocationSearchView # <--- New Import
 from .pricing_views import PublicTariffView, ClearCacheView
 
 urlpatterns = [
@@ -9,6 +9,10 @@ urlpatterns = [
     
     # Task 5: Paginated Manifests
     path('shipments/list/', ShipmentListView.as_view(), name='list-shipments'),
+    path('shipments/sector/active/', SectorActiveParcelsView.as_view(), name='sector-active-parcels'),
+
+    # Location autocomplete (gazetteer)
+    path('locations/', LocationSearchView.as_view(), name='location-search'),
 
     # Task 4: Pricing
     path('pricing/tariffs/', PublicTariffView.as_view(), name='public-tariffs'),
@@ -16,5 +16,5 @@ async def send_sms_notification(phone_number: str, message: str) -> bool:
     await asyncio.sleep(2)
     
     # In a real app, this is where you'd call Twilio or a local gateway
-    print(f" [SMS SENT] To: {phone_number} | Msg: {message}")
+    logger.info(f"[SMS SENT] To: {phone_number} | Msg: {message}")
     return True
\ No newline at end of file
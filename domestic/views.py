@@ -1,80 +1,113 @@
-from django.shortcuts import get_object_or_404
-from rest_framework import generics, status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework import status
+from rest_framework.decorators import permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from asgiref.sync import sync_to_async # <--- THE KEY TOOL
-from drf_spectacular.utils import extend_schema
+from drf_spectacular.utils import extend_schema, OpenApiParameter
+from ishemalink.async_views import AsyncCreateAPIView, AsyncListAPIView, async_api_view, asave
+from ishemalink.db_router import ReadReplicaMixin
+from ishemalink.idempotency import AsyncIdempotencyMixin
 
+from .gazetteer import GAZETTEER, resolve_location
+from .manifests import aactive_parcel_ids, agent_area, area_for, is_admin, manifest_queryset
 from .models import Shipment, ShipmentLog
-from .serializers import ShipmentSerializer
+from .serializers import NewShipmentSerializer, ShipmentSerializer
+from .services import (
+    ALLOWED_TRANSITIONS, StaleShipmentError, StatusTransitionError, record_status_update,
+)
 from .utils import send_sms_notification
 
 
-from rest_framework.generics import ListAPIView
 from django.db.models import Q # Needed for search logic
 
-class CreateShipmentView(generics.CreateAPIView):
+class CreateShipmentView(AsyncIdempotencyMixin, AsyncCreateAPIView):
     """
-    Standard sync view to create a new shipment.
+    Async view to create a new shipment (one acreate()).
+    Retries with the same Idempotency-Key header get the first response back
+    instead of a second shipment with a new tracking number.
     """
-    serializer_class = ShipmentSerializer
+    serializer_class = NewShipmentSerializer
     permission_classes = [IsAuthenticated]
 
-    def perform_create(self, serializer):
+    async def perform_create(self, serializer):
         # Auto-assign the logged-in user as the owner
-        serializer.save(owner=self.request.user)
+        await asave(serializer, owner=self.request.user)
 
 @extend_schema(
     request=None,
-    responses={200: None},
-    description="Updates status and sends async SMS (Non-blocking)."
+    responses={200: None, 400: None, 409: None},
+    description=(
+        "Moves the shipment to a new status (PENDING -> IN_TRANSIT -> DELIVERED / FAILED) "
+        "and sends async SMS (Non-blocking). Send the `version` you last read to be "
+        "told (409) when someone else changed the shipment in between."
+    )
 )
-@api_view(['POST'])
+@async_api_view(['POST'])
 @permission_classes([IsAuthenticated])
 async def update_shipment_status(request, pk):
     """
-    Async view to handle status updates.
-    It updates the DB (wrapped in sync_to_async) and then awaits the fake SMS.
+    Async view to handle status updates, on the async ORM.
+    The shipment and its owner come back in one query (select_related); the
+    status change is one conditional UPDATE + log insert in one transaction,
+    which has to run as a single sync call. Then it awaits the fake SMS.
+    A lost race returns 409 instead of overwriting. Shipments the user can't
+    list are reported as not found, as in offline replay.
     """
+    # 1. Fetch Shipment and its owner (for the SMS) in one query, among those the user may list
     try:
-        # 1. Fetch Shipment (Database access must be wrapped)
-        # We wrap get_object_or_404 to make it async-compatible
-        shipment = await sync_to_async(get_object_or_404)(Shipment, pk=pk)
-
-        # 2. Update Status (DB Write)
-        new_status = request.data.get('status')
-        location = request.data.get('location', 'Unknown Location')
-        
-        if new_status not in ['PENDING', 'IN_TRANSIT', 'DELIVERED', 'FAILED']:
-            return Response({"error": "Invalid status"}, status=400)
-
-        shipment.current_status = new_status
-        await sync_to_async(shipment.save)() # Save Shipment
-
-        # 3. Create Log Entry (DB Write)
-        await sync_to_async(ShipmentLog.objects.create)(
-            shipment=shipment,
-            status=new_status,
-            location=location
+        shipment = await manifest_queryset(request.user).select_related('owner').aget(pk=pk)
+    except Shipment.DoesNotExist:
+        return Response({"error": "Shipment not found."}, status=404)
+
+    # 2. Validate the request before writing anything: bad input is a 400, not a 500
+    if not isinstance(request.data, dict):
+        return Response({"error": "Expected a JSON object."}, status=400)
+    new_status = request.data.get('status')
+    location = request.data.get('location', 'Unknown Location')
+
+    if not isinstance(new_status, str) or new_status not in ALLOWED_TRANSITIONS:
+        return Response({"error": "Invalid status"}, status=400)
+    if not isinstance(location, str):
+        return Response({"error": "location must be a string"}, status=400)
+
+    expected_version = request.data.get('version')
+    if expected_version is not None:
+        if isinstance(expected_version, bool) or not isinstance(expected_version, (int, str)):
+            return Response({"error": "version must be an integer"}, status=400)
+        try:
+            expected_version = int(expected_version)
+        except ValueError:
+            return Response({"error": "version must be an integer"}, status=400)
+
+    # 3. Conditional status update + Create Log Entry (single transaction, no row lock)
+    try:
+        await sync_to_async(record_status_update)(
+            shipment, new_status, location, expected_version=expected_version
         )
+    except StatusTransitionError as error:
+        return Response({"error": str(error), "current_status": error.current_status}, status=400)
+    except StaleShipmentError:
+        # Someone else changed it since it was read: report the current state, don't overwrite
+        current = await Shipment.objects.filter(pk=shipment.pk).values('current_status', 'version').afirst()
+        return Response({"error": "Shipment was changed by another request.", **(current or {})}, status=409)
 
-        # 4. The Async Magic: Send SMS without blocking
-        # This await releases the server to handle other requests while "waiting" for the SMS
-        phone = await sync_to_async(lambda: shipment.owner.phone)()
-        await send_sms_notification(phone, f"Your package is now {new_status} at {location}")
+    # 4. The Async Magic: Send SMS without blocking
+    # This await releases the server to handle other requests while "waiting" for the SMS
+    await send_sms_notification(shipment.owner.phone, f"Your package is now {new_status} at {location}")
 
-        return Response({"message": "Status updated and SMS queued."}, status=200)
+    return Response({"message": "Status updated and SMS queued.", "version": shipment.version}, status=200)
 
-    except Exception as e:
-        return Response({"error": str(e)}, status=500)
-    
 
-class ShipmentListView(ListAPIView):
+class ShipmentListView(ReadReplicaMixin, AsyncListAPIView):
     """
     GET /api/domestic/shipments/list/
-    Returns a paginated list of shipments.
-    Supports filtering by status and searching by tracking number.
+    Returns a paginated list of shipments: an agent's sector manifest, a
+    customer's own shipments, or everything for admins.
+    Supports filtering by status, origin/destination (any spelling the gazetteer
+    knows, including whole districts or provinces) and tariff zone, and
+    searching by tracking number. Served from the read replica when one is enabled.
+    Async: one COUNT and one fetch of the page (with its logs).
     """
     serializer_class = ShipmentSerializer
     permission_classes = [IsAuthenticated]
@@ -83,20 +116,36 @@ class ShipmentListView(ListAPIView):
         """
         Custom logic to handle filtering and searching.
         """
-        # Start with all shipments
-        queryset = Shipment.objects.all().order_by('-created_at')
+        # Start with the shipments this user may see (agents: their area, via the location indexes)
+        queryset = manifest_queryset(self.request.user).prefetch_related('logs').order_by('-created_at')
 
         # 1. FILTERING: Check if 'status' is in the URL (e.g., ?status=IN_TRANSIT)
         status_param = self.request.query_params.get('status')
         if status_param:
             queryset = queryset.filter(current_status=status_param)
 
-        # 2. FILTERING: Check if 'destination' is in the URL
-        destination_param = self.request.query_params.get('destination')
-        if destination_param:
-            queryset = queryset.filter(destination__icontains=destination_param)
-
-        # 3. SEARCHING: Check if 'search' is in the URL (e.g., ?search=RW-123)
+        # 2. FILTERING: 'origin' / 'destination' are matched on the indexed gazetteer IDs
+        # (?destination=Kigali -> every shipment to a place inside Kigali).
+        # Unknown places fall back to a substring match on the text.
+        for param, text_field, id_field in (
+            ('origin', 'origin', 'origin_location'),
+            ('destination', 'destination', 'destination_location'),
+        ):
+            value = self.request.query_params.get(param)
+            if not value:
+                continue
+            location_id, _ = resolve_location(value)
+            if location_id:
+                queryset = queryset.filter(**{f'{id_field}__in': GAZETTEER.descendants(location_id)})
+            else:
+                queryset = queryset.filter(**{f'{text_field}__icontains': value})
+
+        # 3. FILTERING: Check if 'zone' is in the URL (e.g., ?zone=ZONE1)
+        zone_param = self.request.query_params.get('zone')
+        if zone_param:
+            queryset = queryset.filter(destination_zone=zone_param)
+
+        # 4. SEARCHING: Check if 'search' is in the URL (e.g., ?search=RW-123)
         search_param = self.request.query_params.get('search')
         if search_param:
             queryset = queryset.filter(
@@ -105,4 +154,66 @@ class ShipmentListView(ListAPIView):
                 Q(destination__icontains=search_param)
             )
 
-        return queryset
\ No newline at end of file
+        return queryset
+
+
+class SectorActiveParcelsView(AsyncListAPIView):
+    """
+    GET /api/domestic/shipments/sector/active/
+    The PENDING / IN_TRANSIT parcels of the agent's assigned area, newest first.
+    The parcel IDs come from the per-area cache, so only the page's rows are read.
+    Admins choose the area with ?sector=Remera.
+    """
+    serializer_class = ShipmentSerializer
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        parameters=[OpenApiParameter('sector', str, description="Sector or district (admins only).")],
+    )
+    async def get(self, request, *args, **kwargs):
+        return await super().get(request, *args, **kwargs)
+
+    async def list(self, request, *args, **kwargs):
+        # 1. Which area: the agent's own, or the one an admin asked for
+        if is_admin(request.user):
+            area = area_for(request.query_params.get('sector'))
+        elif request.user.role == 'AGENT':
+            area = agent_area(request.user)
+        else:
+            return Response({"error": "Only agents and admins have sector manifests."}, status=403)
+        if not area:
+            return Response({"error": "No known sector. Set assigned_sector (or pass ?sector=)."}, status=400)
+
+        # 2. Cached IDs of the active parcels, newest (highest ID) first
+        ids = sorted(await aactive_parcel_ids(area), reverse=True)
+
+        # 3. Page the IDs, then fetch just that page (and its logs) by primary key
+        page_ids = self.paginate_queryset(ids)
+        rows = await Shipment.objects.prefetch_related('logs').ain_bulk(page_ids)
+        shipments = [rows[pk] for pk in page_ids if pk in rows]
+        return self.get_paginated_response(self.get_serializer(shipments, many=True).data)
+
+
+class LocationSearchView(APIView):
+    """
+    GET /api/domestic/locations/?q=nyam
+    Autocomplete for origin/destination fields, from the in-memory gazetteer.
+    """
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        parameters=[OpenApiParameter('q', str, description="Start of a place name (any known spelling).")],
+        responses={200: None},
+        description="Suggests canonical locations with their tariff zone."
+    )
+    def get(self, request):
+        query = request.query_params.get('q', '')
+        return Response([
+            {
+                "id": location.id,
+                "name": location.name,
+                "level": location.level,
+                "zone": GAZETTEER.zone_for(location.id),
+            }
+            for location in GAZETTEER.suggest(query)
+        ] if query.strip() else [])
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class InternationalConfig(AppConfig):
     name = 'international'
+
+    def ready(self):
+        # Keeps the corridor rollups in step with cargo saves/deletes
+        from . import rollups  # noqa: F401
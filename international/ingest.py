@@ -0,0 +1,195 @@
+"""
+Streaming bulk ingest of EAC customs manifests.
+
+Border agents upload declaration batches as CSV or NDJSON files. The file is
+read line by line, validated with the same rules as the single-cargo endpoint,
+and written with bulk_create one batch at a time, so memory stays bounded no
+matter how big the upload is: duplicates are checked against the table per
+batch, and the report keeps only the first MAX_REPORTED_ERRORS row errors
+(error_count has the total).
+"""
+import codecs
+import csv
+import json
+
+from django.db import IntegrityError, transaction
+from rest_framework import serializers
+
+from .models import InternationalCargo
+from .rollups import record_created
+from .serializers import InternationalCargoIngestSerializer
+from .signals import cargo_created
+
+# Rows validated, de-duplicated and inserted together
+BATCH_SIZE = 500
+
+# Row errors kept in the report; the rest are only counted
+MAX_REPORTED_ERRORS = 100
+
+# A batch that collides with a concurrent upload is re-checked and retried this many times
+FLUSH_ATTEMPTS = 3
+
+CSV = 'csv'
+NDJSON = 'ndjson'
+
+
+def detect_format(uploaded_file):
+    """
+    Works out the file format from the extension (or content type).
+    Returns None when the format is not supported.
+    """
+    name = (uploaded_file.name or '').lower()
+    content_type = (uploaded_file.content_type or '').lower()
+
+    if name.endswith(('.ndjson', '.jsonl')) or 'ndjson' in content_type:
+        return NDJSON
+    if name.endswith('.csv') or content_type == 'text/csv':
+        return CSV
+    return None
+
+
+def iter_rows(uploaded_file, file_format):
+    """
+    Yields (row_number, data, error) for every record in the file.
+    Rows are numbered from 1 (the CSV header is not counted).
+    """
+    # Django's UploadedFile yields lines lazily from its chunks
+    lines = codecs.iterdecode(uploaded_file, 'utf-8-sig')
+
+    if file_format == NDJSON:
+        row_number = 0
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            row_number += 1
+            try:
+                data = json.loads(line)
+            except ValueError:
+                yield row_number, None, "Invalid JSON."
+                continue
+            if not isinstance(data, dict):
+                yield row_number, None, "Each line must be a JSON object."
+                continue
+            yield row_number, data, None
+    else:
+        reader = csv.DictReader(lines)
+        for row_number, data in enumerate(reader, start=1):
+            yield row_number, data, None
+
+
+def _add_error(report, error):
+    """
+    Records a row error, keeping only the MAX_REPORTED_ERRORS lowest row numbers.
+    """
+    report['error_count'] += 1
+    errors = report['errors']
+    errors.append(error)
+    # Trim now and then rather than on every error
+    if len(errors) >= 2 * MAX_REPORTED_ERRORS:
+        errors.sort(key=lambda e: e['row'])
+        del errors[MAX_REPORTED_ERRORS:]
+
+
+def _existing_ids(manifest_ids):
+    return set(
+        InternationalCargo.objects
+        .filter(manifest_id__in=manifest_ids)
+        .values_list('manifest_id', flat=True)
+    )
+
+
+def _insert(batch, owner):
+    """
+    Inserts the rows of one batch that are not in the table yet.
+    Returns (created cargo, [(row_number, manifest_id)] of duplicates).
+    Earlier batches of the same file are already in the table, so one
+    set-based query per batch also catches repeats across the whole file.
+    """
+    existing = _existing_ids([data['manifest_id'] for _, data in batch])
+
+    new_cargo, duplicates = [], []
+    for row_number, data in batch:
+        manifest_id = data['manifest_id']
+        if manifest_id in existing:
+            duplicates.append((row_number, manifest_id))
+            continue
+        existing.add(manifest_id)
+        new_cargo.append(InternationalCargo(owner=owner, **data))
+
+    with transaction.atomic():
+        InternationalCargo.objects.bulk_create(new_cargo, batch_size=BATCH_SIZE)
+        # bulk_create skips post_save, so the rollups are updated explicitly
+        record_created(new_cargo)
+        cargo_created.send(sender=InternationalCargo, cargo=new_cargo)
+    return new_cargo, duplicates
+
+
+def _flush(batch, owner, report):
+    """
+    De-duplicates one batch of validated rows and bulk inserts the rest.
+    """
+    for attempt in range(FLUSH_ATTEMPTS):
+        try:
+            new_cargo, duplicates = _insert(batch, owner)
+            break
+        except IntegrityError:
+            # Another upload inserted one of these manifests after our check: check again
+            if attempt == FLUSH_ATTEMPTS - 1:
+                raise
+
+    for row_number, manifest_id in duplicates:
+        report['duplicates'] += 1
+        _add_error(report, {
+            "row": row_number,
+            "manifest_id": manifest_id,
+            "errors": {"manifest_id": ["Manifest already exists."]},
+        })
+    report['created'] += len(new_cargo)
+
+
+def ingest_manifest(uploaded_file, file_format, owner, batch_size=BATCH_SIZE):
+    """
+    Parses, validates and creates cargo from an uploaded manifest file.
+    Returns a report with counts and a per-row list of errors. A file that is
+    not UTF-8 stops at the first undecodable line: the rows before it are
+    still created and the report gets an 'error'.
+    """
+    report = {"rows": 0, "created": 0, "duplicates": 0, "error_count": 0, "errors": []}
+
+    # One serializer instance is reused, so its fields are only built once
+    validator = InternationalCargoIngestSerializer()
+    batch = []
+
+    try:
+        for row_number, data, error in iter_rows(uploaded_file, file_format):
+            report['rows'] += 1
+
+            if error:
+                _add_error(report, {"row": row_number, "errors": {"non_field_errors": [error]}})
+                continue
+
+            try:
+                validated = validator.run_validation(data)
+            except serializers.ValidationError as exc:
+                _add_error(report, {
+                    "row": row_number,
+                    "manifest_id": data.get('manifest_id'),
+                    "errors": exc.detail,
+                })
+                continue
+
+            batch.append((row_number, validated))
+            if len(batch) >= batch_size:
+                _flush(batch, owner, report)
+                batch = []
+    except UnicodeDecodeError:
+        report['error'] = f"The manifest must be UTF-8 encoded; reading stopped after row {report['rows']}."
+
+    if batch:
+        _flush(batch, owner, report)
+
+    # Duplicates are found at flush time, so put the report back in file order
+    report['errors'].sort(key=lambda error: error['row'])
+    del report['errors'][MAX_REPORTED_ERRORS:]
+    return report
@@ -0,0 +1,51 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from international.models import InternationalCargo
+from international.rollups import rebuild_days
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the corridor daily rollups from InternationalCargo history, a chunk of days at a time."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help="First day to rebuild (YYYY-MM-DD). Defaults to the oldest cargo.")
+        parser.add_argument('--end', help="Last day to rebuild (YYYY-MM-DD). Defaults to the newest cargo.")
+        parser.add_argument('--chunk-days', type=int, default=31, help="Days rebuilt per transaction.")
+
+    def handle(self, *args, **options):
+        bounds = InternationalCargo.objects.aggregate(first=Min('created_at'), last=Max('created_at'))
+        if bounds['first'] is None:
+            self.stdout.write("No cargo found, nothing to backfill.")
+            return
+
+        start = self._parse(options['start']) or timezone.localdate(bounds['first'])
+        end = self._parse(options['end']) or timezone.localdate(bounds['last'])
+        if start > end:
+            raise CommandError("--start must be on or before --end.")
+        if options['chunk_days'] < 1:
+            raise CommandError("--chunk-days must be at least 1.")
+
+        chunk = timedelta(days=options['chunk_days'])
+        total = 0
+        day = start
+        while day <= end:
+            chunk_end = min(day + chunk, end + timedelta(days=1))
+            created = rebuild_days(day, chunk_end)
+            total += created
+            self.stdout.write(f"{day} -> {chunk_end - timedelta(days=1)}: {created} rollup rows")
+            day = chunk_end
+
+        self.stdout.write(self.style.SUCCESS(f"Backfill complete: {total} rollup rows written."))
+
+    def _parse(self, value):
+        if value is None:
+            return None
+        parsed = parse_date(value)
+        if parsed is None:
+            raise CommandError(f"Invalid date: {value}")
+        return parsed
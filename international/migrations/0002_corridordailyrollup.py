@@ -0,0 +1,27 @@
+# Generated by Django 6.0.1 on 2026-10-19 17:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('international', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CorridorDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('destination_country', models.CharField(choices=[('UG', 'Uganda'), ('KE', 'Kenya'), ('TZ', 'Tanzania'), ('CD', 'DRC')], max_length=2)),
+                ('is_customs_cleared', models.BooleanField(default=False)),
+                ('cargo_count', models.PositiveIntegerField(default=0)),
+                ('total_weight_kg', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'destination_country', 'is_customs_cleared'), name='unique_corridor_rollup')],
+            },
+        ),
+    ]
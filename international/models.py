@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
 
 class InternationalCargo(models.Model):
@@ -26,5 +26,35 @@ class InternationalCargo(models.Model):
     is_customs_cleared = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    def save(self, *args, **kwargs):
+        # The post_save receivers (corridor rollups, sync change log) write in the
+        # same transaction as the row. No savepoint when the caller already has one.
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.manifest_id} -> {self.destination_country}"
+
+class CorridorDailyRollup(models.Model):
+    """
+    Pre-aggregated cargo totals per day, corridor and customs status.
+    Kept up to date as cargo is created and cleared, so analytics can sum
+    a handful of rollup rows instead of scanning InternationalCargo.
+    """
+    day = models.DateField()
+    destination_country = models.CharField(max_length=2, choices=InternationalCargo.DESTINATION_CHOICES)
+    is_customs_cleared = models.BooleanField(default=False)
+
+    cargo_count = models.PositiveIntegerField(default=0)
+    total_weight_kg = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'destination_country', 'is_customs_cleared'],
+                name='unique_corridor_rollup',
+            ),
+        ]
+
     def __str__(self):
-        return f"{self.manifest_id} -> {self.destination_country}"
\ No newline at end of file
+        return f"{self.day} {self.destination_country}: {self.cargo_count} cargo"
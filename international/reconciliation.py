@@ -0,0 +1,97 @@
+"""
+Set-based reconciliation of the daily customs clearance list.
+
+Instead of saving each InternationalCargo one at a time, the cleared IDs are
+processed in chunks: one SELECT to classify the chunk and one UPDATE for the
+rows that still need clearing, each chunk in its own short transaction.
+If the UPDATE changes fewer rows than the SELECT found pending (another
+request cleared some in between), the chunk is rolled back and re-read, so
+the report and the rollups only count rows this run actually cleared.
+"""
+from django.db import transaction
+
+from .models import InternationalCargo
+from .rollups import record_cleared
+from .signals import customs_cleared
+
+CHUNK_SIZE = 500
+
+# A chunk that raced another clear is rolled back and re-classified this many times
+CHUNK_ATTEMPTS = 3
+
+
+class ConcurrentClearError(Exception):
+    """
+    Some rows of a chunk were cleared by another request between our SELECT and UPDATE.
+    """
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _clear_chunk(chunk):
+    """
+    Clears one chunk in one transaction. Returns (cleared, already_cleared, unknown)
+    manifest IDs. Raises ConcurrentClearError (after rolling back) when the UPDATE
+    changed fewer rows than the SELECT found pending, so nothing is counted twice.
+    """
+    with transaction.atomic():
+        rows = {
+            manifest_id: (pk, cleared)
+            for pk, manifest_id, cleared in InternationalCargo.objects
+            .select_for_update()
+            .filter(manifest_id__in=chunk)
+            .values_list('pk', 'manifest_id', 'is_customs_cleared')
+        }
+
+        to_clear, already_cleared, unknown = [], [], []
+        for manifest_id in chunk:
+            if manifest_id not in rows:
+                unknown.append(manifest_id)
+            elif rows[manifest_id][1]:
+                already_cleared.append(manifest_id)
+            else:
+                to_clear.append(manifest_id)
+
+        if not to_clear:
+            return to_clear, already_cleared, unknown
+
+        cargo_ids = [rows[manifest_id][0] for manifest_id in to_clear]
+        flipped = InternationalCargo.objects.filter(
+            pk__in=cargo_ids, is_customs_cleared=False
+        ).update(is_customs_cleared=True)
+        if flipped != len(cargo_ids):
+            raise ConcurrentClearError()
+        record_cleared(cargo_ids)
+
+        # Only rows that actually flipped produce a change event, recorded with them
+        customs_cleared.send(sender=InternationalCargo, cargo_ids=cargo_ids, manifest_ids=to_clear)
+    return to_clear, already_cleared, unknown
+
+
+def reconcile_clearances(manifest_ids, chunk_size=CHUNK_SIZE):
+    """
+    Marks the given manifests as customs cleared.
+    Returns a report of how many rows changed plus the unknown and
+    already-cleared manifest IDs.
+    """
+    # Drop blanks and repeats but keep the order customs sent them in
+    ids = list(dict.fromkeys(str(m).strip() for m in manifest_ids if m and str(m).strip()))
+
+    report = {"received": len(ids), "cleared": 0, "already_cleared": [], "unknown": []}
+
+    for chunk in _chunks(ids, chunk_size):
+        for attempt in range(CHUNK_ATTEMPTS):
+            try:
+                cleared, already_cleared, unknown = _clear_chunk(chunk)
+                break
+            except ConcurrentClearError:
+                if attempt == CHUNK_ATTEMPTS - 1:
+                    raise
+        report['cleared'] += len(cleared)
+        report['already_cleared'] += already_cleared
+        report['unknown'] += unknown
+
+    return report
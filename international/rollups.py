@@ -0,0 +1,168 @@
+"""
+Incremental maintenance of the per-day corridor rollups.
+
+Every change to InternationalCargo is turned into small deltas
+(day, country, cleared) -> (count, weight) that are added onto the matching
+CorridorDailyRollup row with an F() expression, so concurrent writers never
+overwrite each other's totals. The receivers run inside the transaction of
+the cargo write (InternationalCargo.save() opens one when the caller has
+none), so a delta commits or rolls back together with its row.
+
+Edits through save() are tracked too: the bucket each instance was loaded
+in is remembered (post_init), and a save that moves it to another day,
+country, clearance state or weight moves its count and weight across.
+QuerySet.update() bypasses signals, so bulk updates must call the helpers
+here themselves (as reconciliation does) or be followed by the backfill
+command.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import CorridorDailyRollup, InternationalCargo
+
+
+# The fields that decide which rollup row a cargo is counted in, and with what weight
+TRACKED_FIELDS = ('created_at', 'destination_country', 'is_customs_cleared', 'weight_kg')
+
+
+def _key(created_at, country, cleared):
+    return timezone.localdate(created_at), country, cleared
+
+
+def _bucket(created_at, country, cleared, weight):
+    return _key(created_at, country, cleared), Decimal(str(weight))
+
+
+def _loaded_bucket(cargo):
+    """
+    (rollup key, weight) from the instance, or None when a tracked field is deferred.
+    """
+    values = cargo.__dict__
+    if any(values.get(field) is None for field in TRACKED_FIELDS):
+        return None
+    return _bucket(*(values[field] for field in TRACKED_FIELDS))
+
+
+def _stored_bucket(pk):
+    row = InternationalCargo.objects.filter(pk=pk).values_list(*TRACKED_FIELDS).first()
+    return _bucket(*row) if row else None
+
+
+def apply_deltas(deltas):
+    """
+    Adds {(day, country, cleared): [count, weight]} onto the rollup table.
+    """
+    for (day, country, cleared), (count, weight) in deltas.items():
+        if not count and not weight:
+            continue
+
+        lookup = {'day': day, 'destination_country': country, 'is_customs_cleared': cleared}
+        changes = {
+            'cargo_count': F('cargo_count') + count,
+            'total_weight_kg': F('total_weight_kg') + weight,
+        }
+
+        if CorridorDailyRollup.objects.filter(**lookup).update(**changes):
+            continue
+
+        # First cargo for this corridor today. Another writer may win the
+        # race to create the row, in which case we fall back to the update.
+        try:
+            with transaction.atomic():
+                CorridorDailyRollup.objects.create(**lookup, cargo_count=count, total_weight_kg=weight)
+        except IntegrityError:
+            CorridorDailyRollup.objects.filter(**lookup).update(**changes)
+
+
+def record_created(cargo_list):
+    """
+    Counts newly created cargo (single saves and bulk_create batches).
+    """
+    deltas = defaultdict(lambda: [0, Decimal('0')])
+    for cargo in cargo_list:
+        delta = deltas[_key(cargo.created_at, cargo.destination_country, cargo.is_customs_cleared)]
+        delta[0] += 1
+        delta[1] += Decimal(str(cargo.weight_kg))
+    apply_deltas(deltas)
+
+
+def record_cleared(cargo_ids):
+    """
+    Moves freshly cleared cargo from the 'pending' bucket to the 'cleared' one.
+    """
+    deltas = defaultdict(lambda: [0, Decimal('0')])
+    rows = InternationalCargo.objects.filter(pk__in=cargo_ids).values_list(
+        'created_at', 'destination_country', 'weight_kg'
+    )
+    for created_at, country, weight in rows:
+        pending = deltas[_key(created_at, country, False)]
+        pending[0] -= 1
+        pending[1] -= weight
+
+        cleared = deltas[_key(created_at, country, True)]
+        cleared[0] += 1
+        cleared[1] += weight
+    apply_deltas(deltas)
+
+
+def rebuild_days(start, end):
+    """
+    Recomputes the rollups for every day in [start, end) from InternationalCargo.
+    Used by the backfill command; runs as one transaction per call.
+    """
+    rows = (
+        InternationalCargo.objects
+        .filter(created_at__date__gte=start, created_at__date__lt=end)
+        .annotate(day=TruncDate('created_at'))
+        .values('day', 'destination_country', 'is_customs_cleared')
+        .annotate(cargo_count=Count('id'), total_weight_kg=Sum('weight_kg'))
+        .order_by()
+    )
+
+    with transaction.atomic():
+        CorridorDailyRollup.objects.filter(day__gte=start, day__lt=end).delete()
+        rollups = CorridorDailyRollup.objects.bulk_create(CorridorDailyRollup(**row) for row in rows)
+    return len(rollups)
+
+
+@receiver(post_init, sender=InternationalCargo)
+def cargo_loaded(sender, instance, **kwargs):
+    instance._rollup_bucket = _loaded_bucket(instance) if instance.pk else None
+
+
+@receiver(pre_save, sender=InternationalCargo)
+def cargo_saving(sender, instance, **kwargs):
+    # Built without loading (or with deferred fields): read the bucket it is counted in now
+    if instance.pk is not None and instance._rollup_bucket is None:
+        instance._rollup_bucket = _stored_bucket(instance.pk)
+
+
+@receiver(post_save, sender=InternationalCargo)
+def cargo_saved(sender, instance, created, **kwargs):
+    before = instance._rollup_bucket
+    after = _loaded_bucket(instance) or _stored_bucket(instance.pk)
+    instance._rollup_bucket = after
+
+    if created:
+        record_created([instance])
+    elif before is not None and before != after:
+        deltas = defaultdict(lambda: [0, Decimal('0')])
+        (old_key, old_weight), (new_key, new_weight) = before, after
+        deltas[old_key][0] -= 1
+        deltas[old_key][1] -= old_weight
+        deltas[new_key][0] += 1
+        deltas[new_key][1] += new_weight
+        apply_deltas(deltas)
+
+
+@receiver(post_delete, sender=InternationalCargo)
+def cargo_deleted(sender, instance, **kwargs):
+    key = _key(instance.created_at, instance.destination_country, instance.is_customs_cleared)
+    apply_deltas({key: [-1, -Decimal(str(instance.weight_kg))]})
@@ -13,4 +13,22 @@ class InternationalCargoSerializer(serializers.ModelSerializer):
         """
         if data.get('destination_country') == 'KE' and not data.get('tin_number'):
             raise serializers.ValidationError("Shipments to Kenya require a valid TIN Number.")
-        return data
\ No newline at end of file
+        return data
+
+class InternationalCargoIngestSerializer(InternationalCargoSerializer):
+    """
+    Same cross-border rules as InternationalCargoSerializer, used by bulk ingest.
+    The per-row manifest_id uniqueness query is dropped because the ingest
+    de-duplicates a whole batch with a single set-based lookup instead.
+    """
+    class Meta(InternationalCargoSerializer.Meta):
+        extra_kwargs = {'manifest_id': {'validators': []}}
+
+
+class InternationalCargoCreateSerializer(InternationalCargoSerializer):
+    """
+    Used by the async create endpoint: validation runs on the event loop and
+    must not query, so the view checks manifest_id uniqueness itself.
+    """
+    class Meta(InternationalCargoSerializer.Meta):
+        extra_kwargs = {'manifest_id': {'validators': []}}
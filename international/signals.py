@@ -0,0 +1,9 @@
+from django.dispatch import Signal
+
+# Sent once per reconciled chunk, inside its transaction, with only the rows that
+# changed. Receivers get: cargo_ids (list of pks) and manifest_ids (list of str).
+customs_cleared = Signal()
+
+# Sent inside the ingest transaction for every bulk_create batch, because
+# bulk_create skips post_save. Receivers get: cargo (list of saved instances).
+cargo_created = Signal()
@@ -1,3 +1,340 @@
+from datetime import date, datetime, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from core.models import User
+from .ingest import ingest_manifest
+from .models import CorridorDailyRollup, InternationalCargo
+from .reconciliation import reconcile_clearances
+from .signals import customs_cleared
+
+
+class BulkCargoUploadTests(TestCase):
+    """
+    Tests for the streaming customs manifest ingest.
+    """
+    url = '/api/international/cargo/bulk/'
+
+    def setUp(self):
+        self.agent = User.objects.create_user(
+            username='+250788000001', phone='+250788000001', password='pass12345', role='AGENT'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.agent)
+
+    def upload(self, name, content, content_type='text/csv'):
+        file = SimpleUploadedFile(name, content.encode(), content_type=content_type)
+        return self.client.post(self.url, {'file': file}, format='multipart')
+
+    def test_csv_rows_are_created(self):
+        """Valid CSV rows are created for the uploading agent."""
+        response = self.upload('batch.csv', (
+            "manifest_id,tin_number,destination_country,weight_kg\n"
+            "EAC-001,TIN1,UG,120.50\n"
+            "EAC-002,TIN2,KE,80\n"
+        ))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(response.data['errors'], [])
+        self.assertEqual(InternationalCargo.objects.filter(owner=self.agent).count(), 2)
+
+    def test_invalid_rows_are_reported(self):
+        """Rows breaking the trade rules are reported by row number and skipped."""
+        response = self.upload('batch.csv', (
+            "manifest_id,tin_number,destination_country,weight_kg\n"
+            "EAC-010,TIN1,UG,10\n"
+            "EAC-011,,KE,10\n"
+            "EAC-012,TIN3,ZZ,10\n"
+        ))
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual([e['row'] for e in response.data['errors']], [2, 3])
+
+    def test_duplicates_are_skipped(self):
+        """Manifests already in the DB or repeated in the file are not inserted twice."""
+        InternationalCargo.objects.create(
+            owner=self.agent, manifest_id='EAC-100', tin_number='T', destination_country='TZ', weight_kg=1
+        )
+        response = self.upload('batch.ndjson', (
+            '{"manifest_id": "EAC-100", "tin_number": "T", "destination_country": "TZ", "weight_kg": 1}\n'
+            '{"manifest_id": "EAC-101", "tin_number": "T", "destination_country": "TZ", "weight_kg": 1}\n'
+            '{"manifest_id": "EAC-101", "tin_number": "T", "destination_country": "TZ", "weight_kg": 1}\n'
+            'not json\n'
+        ), content_type='application/x-ndjson')
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(response.data['duplicates'], 2)
+        self.assertEqual([e['row'] for e in response.data['errors']], [1, 3, 4])
+        self.assertEqual(InternationalCargo.objects.count(), 2)
+
+    def test_duplicates_across_batches_are_skipped(self):
+        """A repeat in a later batch is caught by that batch's lookup, without remembering every ID."""
+        rows = ''.join(f"EAC-{n % 3:03d},T,UG,1\n" for n in range(7))
+        file = SimpleUploadedFile('batch.csv', ("manifest_id,tin_number,destination_country,weight_kg\n" + rows).encode())
+        report = ingest_manifest(file, 'csv', self.agent, batch_size=2)
+        self.assertEqual((report['created'], report['duplicates']), (3, 4))
+
+    def test_error_report_is_capped(self):
+        """Only the first MAX_REPORTED_ERRORS errors are returned; error_count has them all."""
+        rows = ''.join(f"EAC-{n:03d},T,ZZ,1\n" for n in range(25))
+        with mock.patch('international.ingest.MAX_REPORTED_ERRORS', 5):
+            response = self.upload('batch.csv', "manifest_id,tin_number,destination_country,weight_kg\n" + rows)
+        self.assertEqual(response.data['error_count'], 25)
+        self.assertEqual([e['row'] for e in response.data['errors']], [1, 2, 3, 4, 5])
+
+    def test_non_utf8_file_is_400(self):
+        """An undecodable upload is a client error; the rows before it are still created."""
+        content = "manifest_id,tin_number,destination_country,weight_kg\nEAC-001,T,UG,1\n".encode() + b"EAC-\xff02,T,UG,1\n"
+        file = SimpleUploadedFile('batch.csv', content, content_type='text/csv')
+        response = self.client.post(self.url, {'file': file}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('UTF-8', response.data['error'])
+        self.assertEqual(response.data['created'], 1)
+
+    def test_concurrent_duplicate_is_retried(self):
+        """A manifest inserted by another upload between the check and the insert is reported, not a 500."""
+        InternationalCargo.objects.create(
+            owner=self.agent, manifest_id='EAC-100', tin_number='T', destination_country='TZ', weight_kg=1
+        )
+        # The first lookup misses EAC-100, as if the other upload committed just after it
+        with mock.patch('international.ingest._existing_ids', side_effect=[set(), {'EAC-100'}]):
+            response = self.upload('batch.csv', (
+                "manifest_id,tin_number,destination_country,weight_kg\n"
+                "EAC-100,T,TZ,1\n"
+                "EAC-101,T,TZ,1\n"
+            ))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created'], response.data['duplicates']), (1, 1))
+        self.assertEqual(InternationalCargo.objects.count(), 2)
+
+    def test_unsupported_format_is_rejected(self):
+        """Only CSV and NDJSON uploads are accepted."""
+        response = self.upload('batch.xlsx', "x", content_type='application/octet-stream')
+        self.assertEqual(response.status_code, 400)
+
+
+class CargoCreateTests(TestCase):
+    """
+    Tests for the async cargo create / list endpoint.
+    """
+    url = '/api/international/cargo/'
+
+    def setUp(self):
+        self.agent = User.objects.create_user(
+            username='+250788000005', phone='+250788000005', password='pass12345', role='AGENT'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.agent)
+        self.payload = {'manifest_id': 'EAC-500', 'tin_number': 'T', 'destination_country': 'UG', 'weight_kg': '12.50'}
+
+    def test_create_then_list(self):
+        """A created manifest is owned by the caller and listed first."""
+        response = self.client.post(self.url, self.payload, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(InternationalCargo.objects.get(manifest_id='EAC-500').owner, self.agent)
+        listed = self.client.get(self.url)
+        self.assertEqual(listed.data['count'], 1)
+        self.assertEqual(listed.data['results'][0]['manifest_id'], 'EAC-500')
+
+    def test_duplicate_manifest_id_is_400(self):
+        """manifest_id stays unique even though the check moved out of the serializer."""
+        self.client.post(self.url, self.payload, format='json')
+        response = self.client.post(self.url, self.payload, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('manifest_id', response.data)
+        self.assertEqual(InternationalCargo.objects.count(), 1)
+
+    def test_concurrent_duplicate_is_400(self):
+        """A duplicate inserted between the check and the insert is a 400, not an IntegrityError."""
+        InternationalCargo.objects.create(
+            owner=self.agent, manifest_id='EAC-500', tin_number='T', destination_country='UG', weight_kg=5
+        )
+        # The check runs before the other request's insert, the re-check after it
+        with mock.patch('django.db.models.QuerySet.aexists', new_callable=mock.AsyncMock, side_effect=[False, True]):
+            response = self.client.post(self.url, self.payload, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['manifest_id'], ['international cargo with this manifest id already exists.'])
+
+
+class CustomsReconciliationTests(TestCase):
+    """
+    Tests for the set-based customs clearance reconciliation.
+    """
+    url = '/api/international/cargo/reconcile/'
+
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            username='+250788000002', phone='+250788000002', password='pass12345', role='ADMIN', is_staff=True
+        )
+        for manifest_id, cleared in [('EAC-1', False), ('EAC-2', False), ('EAC-3', True)]:
+            InternationalCargo.objects.create(
+                owner=self.admin, manifest_id=manifest_id, tin_number='T',
+                destination_country='UG', weight_kg=5, is_customs_cleared=cleared
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_reconcile_reports_each_id(self):
+        """Pending rows are cleared; unknown and already-cleared IDs are reported."""
+        received = []
+        customs_cleared.connect(lambda **kwargs: received.extend(kwargs['manifest_ids']), weak=False, dispatch_uid='t')
+        try:
+            response = self.client.post(
+                self.url, {'manifest_ids': ['EAC-1', 'EAC-2', 'EAC-3', 'EAC-9', 'EAC-1']}, format='json'
+            )
+        finally:
+            customs_cleared.disconnect(dispatch_uid='t')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['cleared'], 2)
+        self.assertEqual(response.data['already_cleared'], ['EAC-3'])
+        self.assertEqual(response.data['unknown'], ['EAC-9'])
+        self.assertEqual(received, ['EAC-1', 'EAC-2'])
+        self.assertEqual(InternationalCargo.objects.filter(is_customs_cleared=True).count(), 3)
+
+    def test_malformed_input_is_400(self):
+        """A bare JSON list or a non-UTF-8 file is rejected instead of failing with a 500."""
+        response = self.client.post(self.url, ['EAC-1'], format='json')
+        self.assertEqual(response.status_code, 400)
+
+        file = SimpleUploadedFile('cleared.txt', b'EAC-1\n\xffEAC-2\n', content_type='text/plain')
+        response = self.client.post(self.url, {'file': file}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(InternationalCargo.objects.get(manifest_id='EAC-1').is_customs_cleared)
+
+    def test_rows_cleared_concurrently_are_not_counted(self):
+        """If another request clears a row between our SELECT and UPDATE, the chunk is re-read."""
+        stale = list(InternationalCargo.objects.filter(manifest_id__in=['EAC-1', 'EAC-2'])
+                     .values_list('pk', 'manifest_id', 'is_customs_cleared'))
+        # The other request clears EAC-2 after our first SELECT has read it as pending
+        InternationalCargo.objects.filter(manifest_id='EAC-2').update(is_customs_cleared=True)
+
+        real_select = InternationalCargo.objects.select_for_update
+        first_select = mock.Mock()
+        first_select.filter.return_value.values_list.return_value = stale
+        with mock.patch.object(InternationalCargo.objects, 'select_for_update', side_effect=[first_select, real_select()]):
+            report = reconcile_clearances(['EAC-1', 'EAC-2'])
+
+        self.assertEqual(report['cleared'], 1)
+        self.assertEqual(report['already_cleared'], ['EAC-2'])
+
+    def test_only_admins_can_reconcile(self):
+        """Agents cannot clear cargo."""
+        agent = User.objects.create_user(username='+250788000003', phone='+250788000003', password='pass12345')
+        self.client.force_authenticate(agent)
+        response = self.client.post(self.url, {'manifest_ids': ['EAC-1']}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+
+class CorridorRollupTests(TestCase):
+    """
+    Tests for the incremental corridor rollups and the analytics endpoint.
+    """
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            username='+250788000004', phone='+250788000004', password='pass12345', is_staff=True
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def make_cargo(self, manifest_id, country, weight, created_at=None):
+        cargo = InternationalCargo.objects.create(
+            owner=self.admin, manifest_id=manifest_id, tin_number='T',
+            destination_country=country, weight_kg=weight
+        )
+        if created_at:
+            InternationalCargo.objects.filter(pk=cargo.pk).update(created_at=created_at)
+        return cargo
+
+    def test_rollups_follow_creates_and_clearance(self):
+        """Creating and clearing cargo moves totals between rollup buckets."""
+        self.make_cargo('R-1', 'KE', 10)
+        self.make_cargo('R-2', 'KE', 5)
+        self.make_cargo('R-3', 'UG', 7)
+        reconcile_clearances(['R-1'])
+
+        pending = CorridorDailyRollup.objects.get(destination_country='KE', is_customs_cleared=False)
+        cleared = CorridorDailyRollup.objects.get(destination_country='KE', is_customs_cleared=True)
+        self.assertEqual((pending.cargo_count, pending.total_weight_kg), (1, Decimal('5')))
+        self.assertEqual((cleared.cargo_count, cleared.total_weight_kg), (1, Decimal('10')))
+
+    def test_backfill_rebuilds_history(self):
+        """The backfill command recomputes rollups from the cargo table."""
+        self.make_cargo('B-1', 'TZ', 3, created_at=datetime(2025, 1, 5, 9, tzinfo=dt_timezone.utc))
+        self.make_cargo('B-2', 'TZ', 4, created_at=datetime(2025, 1, 20, 9, tzinfo=dt_timezone.utc))
+        CorridorDailyRollup.objects.all().delete()
+
+        call_command('backfill_corridor_rollups', '--chunk-days', '7', stdout=StringIO())
+
+        days = sorted(CorridorDailyRollup.objects.values_list('day', 'cargo_count'))
+        self.assertEqual(days, [(date(2025, 1, 5), 1), (date(2025, 1, 20), 1)])
+
+    def test_analytics_sums_rollups_by_month(self):
+        """The analytics endpoint groups rollups into the requested period."""
+        self.make_cargo('A-1', 'CD', 2, created_at=datetime(2025, 3, 1, tzinfo=dt_timezone.utc))
+        self.make_cargo('A-2', 'CD', 3, created_at=datetime(2025, 3, 28, tzinfo=dt_timezone.utc))
+        CorridorDailyRollup.objects.all().delete()
+        call_command('backfill_corridor_rollups', stdout=StringIO())
+
+        response = self.client.get('/api/international/analytics/corridors/', {
+            'start': '2025-03-01', 'end': '2025-03-31', 'granularity': 'month',
+        })
+        self.assertEqual(response.status_code, 200)
+        [row] = response.data['results']
+        self.assertEqual(row['destination_country'], 'CD')
+        self.assertEqual(row['cargo_count'], 2)
+        self.assertEqual(row['total_weight_kg'], Decimal('5'))
+
+    def test_saved_edits_move_rollup_totals(self):
+        """Editing a cargo's country, weight or clearance through save() moves it between rollup rows."""
+        cargo = self.make_cargo('E-1', 'KE', 10)
+        cargo.destination_country = 'UG'
+        cargo.weight_kg = Decimal('12.50')
+        cargo.save()
+        reloaded = InternationalCargo.objects.get(pk=cargo.pk)
+        reloaded.is_customs_cleared = True
+        reloaded.save(update_fields=['is_customs_cleared'])
+
+        totals = {
+            (row.destination_country, row.is_customs_cleared): (row.cargo_count, row.total_weight_kg)
+            for row in CorridorDailyRollup.objects.all()
+        }
+        self.assertEqual(totals[('KE', False)], (0, Decimal('0')))
+        self.assertEqual(totals[('UG', False)], (0, Decimal('0')))
+        self.assertEqual(totals[('UG', True)], (1, Decimal('12.50')))
+
+    def test_failed_create_leaves_no_rollup_behind(self):
+        """A cargo create that fails after its rollup update rolls the update back with the row."""
+        with mock.patch('sync.tracking.write_entries', side_effect=DatabaseError('database is locked')):
+            with self.assertRaises(DatabaseError):
+                self.client.post('/api/international/cargo/', {
+                    'manifest_id': 'F-1', 'tin_number': 'T', 'destination_country': 'KE', 'weight_kg': '10.00',
+                }, format='json')
+        self.assertFalse(InternationalCargo.objects.exists())
+        self.assertFalse(CorridorDailyRollup.objects.exists())
+
+    def test_analytics_reports_cleared_count(self):
+        """cleared_count is the cleared share of cargo_count in each period."""
+        self.make_cargo('C-1', 'UG', 2)
+        self.make_cargo('C-2', 'UG', 3)
+        self.make_cargo('C-3', 'KE', 4)
+        reconcile_clearances(['C-1'])
+
+        response = self.client.get('/api/international/analytics/corridors/', {'granularity': 'month'})
+        counts = {row['destination_country']: (row['cargo_count'], row['cleared_count']) for row in response.data['results']}
+        self.assertEqual(counts, {'KE': (1, 0), 'UG': (2, 1)})
+
+    def test_invalid_dates_are_400(self):
+        """Impossible or malformed dates are rejected instead of failing with a 500."""
+        for value in ['2025-02-30', 'yesterday']:
+            response = self.client.get('/api/international/analytics/corridors/', {'start': value})
+            self.assertEqual(response.status_code, 400, value)
 
-# Create your tests here.
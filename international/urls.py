@@ -1,6 +1,9 @@
 from django.urls import path
-from .views import CreateCargoView
+from .views import CreateCargoView, BulkCargoUploadView, CustomsReconciliationView, CorridorAnalyticsView
 
 urlpatterns = [
     path('cargo/', CreateCargoView.as_view(), name='cargo-list'),
-]
\ No newline at end of file
+    path('cargo/bulk/', BulkCargoUploadView.as_view(), name='cargo-bulk-upload'),
+    path('cargo/reconcile/', CustomsReconciliationView.as_view(), name='cargo-reconcile'),
+    path('analytics/corridors/', CorridorAnalyticsView.as_view(), name='corridor-analytics'),
+]
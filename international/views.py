@@ -1,17 +1,188 @@
-from rest_framework import generics
-from rest_framework.permissions import IsAuthenticated
-from .models import InternationalCargo
-from .serializers import InternationalCargoSerializer
+from datetime import timedelta
 
-class CreateCargoView(generics.ListCreateAPIView):
+from django.db import IntegrityError
+from django.db.models import F, Q, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import JSONParser, MultiPartParser
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from drf_spectacular.utils import extend_schema, OpenApiParameter
+from ishemalink.async_views import AsyncListCreateAPIView, asave
+from ishemalink.db_router import ReadReplicaMixin
+from ishemalink.idempotency import AsyncIdempotencyMixin
+from .ingest import detect_format, ingest_manifest
+from .models import CorridorDailyRollup, InternationalCargo
+from .reconciliation import reconcile_clearances
+from .serializers import InternationalCargoCreateSerializer, InternationalCargoSerializer
+
+DUPLICATE_MANIFEST = "international cargo with this manifest id already exists."
+
+
+class CreateCargoView(AsyncIdempotencyMixin, ReadReplicaMixin, AsyncListCreateAPIView):
     """
     API endpoint that allows Agents to create and list International Cargo.
+    Async: the list is one COUNT and one page fetch, served from the read
+    replica when one is enabled. POST honours the Idempotency-Key header.
     """
-    serializer_class = InternationalCargoSerializer
     permission_classes = [IsAuthenticated]
 
+    def get_serializer_class(self):
+        # Validation runs on the event loop, so the manifest_id check is done here with aexists()
+        return InternationalCargoCreateSerializer if self.request.method == 'POST' else InternationalCargoSerializer
+
     def get_queryset(self):
-        return InternationalCargo.objects.filter(owner=self.request.user)
+        return InternationalCargo.objects.filter(owner=self.request.user).order_by('-created_at')
+
+    async def perform_create(self, serializer):
+        manifest_id = serializer.validated_data['manifest_id']
+        if await InternationalCargo.objects.filter(manifest_id=manifest_id).aexists():
+            raise ValidationError({"manifest_id": [DUPLICATE_MANIFEST]})
+        try:
+            await asave(serializer, owner=self.request.user)
+        except IntegrityError:
+            # A concurrent request inserted the same manifest_id after the check
+            if await InternationalCargo.objects.filter(manifest_id=manifest_id).aexists():
+                raise ValidationError({"manifest_id": [DUPLICATE_MANIFEST]})
+            raise
+
+
+class BulkCargoUploadView(APIView):
+    """
+    POST /api/international/cargo/bulk/
+    Streams a CSV or NDJSON customs manifest (multipart field 'file') and
+    creates the cargo in batches. Returns a per-row error report.
+    """
+    permission_classes = [IsAuthenticated]
+    parser_classes = [MultiPartParser]
+
+    @extend_schema(
+        request={'multipart/form-data': {'type': 'object', 'properties': {'file': {'type': 'string', 'format': 'binary'}}}},
+        responses={200: None},
+        description="Bulk ingest of customs declarations from a .csv or .ndjson file."
+    )
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"error": "Upload a manifest in the 'file' field."}, status=status.HTTP_400_BAD_REQUEST)
+
+        file_format = detect_format(upload)
+        if file_format is None:
+            return Response({"error": "Only .csv and .ndjson manifests are supported."}, status=status.HTTP_400_BAD_REQUEST)
+
+        report = ingest_manifest(upload, file_format, owner=request.user)
+        if 'error' in report:
+            return Response(report, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report, status=status.HTTP_200_OK)
+
+
+class CustomsReconciliationView(APIView):
+    """
+    POST /api/international/cargo/reconcile/
+    Applies the daily list of cleared manifest IDs from customs.
+    Accepts JSON {"manifest_ids": [...]} or a text file (one ID per line).
+    """
+    permission_classes = [IsAdminUser]  # Only Admins can clear cargo
+    parser_classes = [JSONParser, MultiPartParser]
+
+    @extend_schema(
+        request=None,
+        responses={200: None},
+        description="Marks manifests as customs cleared and reports unknown / already-cleared IDs."
+    )
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if upload is not None:
+            try:
+                manifest_ids = [line.decode('utf-8').strip() for line in upload]
+            except UnicodeDecodeError:
+                return Response({"error": "The file must be UTF-8 text, one manifest ID per line."}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            manifest_ids = request.data.get('manifest_ids') if isinstance(request.data, dict) else None
+            if not isinstance(manifest_ids, list):
+                return Response({"error": "Send 'manifest_ids' as a list or upload a 'file'."}, status=status.HTTP_400_BAD_REQUEST)
+
+        report = reconcile_clearances(manifest_ids)
+        return Response(report, status=status.HTTP_200_OK)
+
+
+class CorridorAnalyticsView(APIView):
+    """
+    GET /api/international/analytics/corridors/
+    Cargo counts and tonnage per destination country per day/week/month.
+    Served by summing the daily rollups, never by scanning InternationalCargo.
+    """
+    permission_classes = [IsAdminUser]
+
+    PERIODS = {
+        'day': None,
+        'week': TruncWeek,
+        'month': TruncMonth,
+    }
+
+    @staticmethod
+    def date_param(request, name, default):
+        """
+        A YYYY-MM-DD query parameter; 400 for malformed or impossible dates ('2025-02-30').
+        """
+        value = request.query_params.get(name)
+        if not value:
+            return default
+        try:
+            day = parse_date(value)
+        except ValueError:
+            day = None
+        if day is None:
+            raise ValidationError({name: ["Enter a valid date as YYYY-MM-DD."]})
+        return day
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter('start', str, description="First day (YYYY-MM-DD). Defaults to 30 days ago."),
+            OpenApiParameter('end', str, description="Last day (YYYY-MM-DD). Defaults to today."),
+            OpenApiParameter('granularity', str, enum=['day', 'week', 'month']),
+            OpenApiParameter('country', str, description="Limit to one destination country (e.g. KE)."),
+        ],
+        responses={200: None},
+        description="Corridor tonnage and cargo counts for an arbitrary date range."
+    )
+    def get(self, request):
+        granularity = request.query_params.get('granularity', 'day')
+        if granularity not in self.PERIODS:
+            return Response({"error": "granularity must be day, week or month."}, status=status.HTTP_400_BAD_REQUEST)
+
+        today = timezone.localdate()
+        start = self.date_param(request, 'start', today - timedelta(days=30))
+        end = self.date_param(request, 'end', today)
+        if start > end:
+            return Response({"error": "start must be on or before end."}, status=status.HTTP_400_BAD_REQUEST)
+
+        rollups = CorridorDailyRollup.objects.filter(day__gte=start, day__lte=end)
+        country = request.query_params.get('country')
+        if country:
+            rollups = rollups.filter(destination_country=country.upper())
+
+        trunc = self.PERIODS[granularity]
+        rollups = rollups.annotate(period=trunc('day') if trunc else F('day'))
+
+        rows = (
+            rollups.values('period', 'destination_country')
+            .annotate(
+                # Computed first: the names below shadow the rollup columns
+                cleared_count=Sum('cargo_count', filter=Q(is_customs_cleared=True), default=0),
+                cargo_count=Sum('cargo_count'),
+                total_weight_kg=Sum('total_weight_kg'),
+            )
+            .order_by('period', 'destination_country')
+        )
 
-    def perform_create(self, serializer):
-        serializer.save(owner=self.request.user)
\ No newline at end of file
+        return Response({
+            "start": start,
+            "end": end,
+            "granularity": granularity,
+            "results": list(rows),
+        })
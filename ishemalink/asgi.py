@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ishemalink.settings')
 
 application = get_asgi_application()
+
+# Build (or load) the OpenAPI schema now instead of on the first request
+from .schema_cache import warm  # noqa: E402
+
+warm()
@@ -0,0 +1,173 @@
+"""
+Async support for DRF views.
+
+DRF's APIView.dispatch calls the handler synchronously, so an `async def`
+view returns an un-awaited coroutine and the request fails. AsyncAPIView
+runs DRF's authentication, permission and throttle checks in a worker thread
+and then awaits the handler on the event loop. async_api_view is the
+function-view equivalent of DRF's @api_view.
+
+AsyncListAPIView, AsyncCreateAPIView and AsyncListCreateAPIView are DRF's
+generic views on Django's async ORM (async iteration, aexists). Each ORM call
+is one hop to the request's database thread, which costs more than a small
+query, so a list reads its count and page in one hop and a create is one
+hop, in one transaction with what its post_save receivers write. Handlers
+must not touch the ORM synchronously (prefetch what the serializer renders;
+validation must not query).
+"""
+import inspect
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from rest_framework import generics, mixins, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .profiling import track_current_thread
+
+
+class AsyncAPIView(APIView):
+    """
+    APIView whose HTTP handlers are `async def`.
+    Django sees the handlers are coroutines and awaits the view directly.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        # Let an active request profile sample the event loop thread as well
+        track_current_thread()
+
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            # Authentication (e.g. loading the JWT user) touches the DB
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            response = handler(request, *args, **kwargs)
+            if inspect.isawaitable(response):
+                response = await response
+
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+
+def async_api_view(http_method_names=None):
+    """
+    Decorator that turns an `async def` function into an AsyncAPIView.
+    Works with DRF's @permission_classes / @throttle_classes decorators.
+    """
+    http_method_names = ['GET'] if (http_method_names is None) else http_method_names
+
+    def decorator(func):
+        async def handler(self, *args, **kwargs):
+            return await func(*args, **kwargs)
+
+        attrs = {'__doc__': func.__doc__, '__module__': func.__module__}
+        for method in http_method_names:
+            attrs[method.lower()] = handler
+
+        allowed_methods = set(http_method_names) | {'options'}
+        attrs['http_method_names'] = [method.lower() for method in allowed_methods]
+
+        for setting in (
+            'renderer_classes', 'parser_classes', 'authentication_classes',
+            'throttle_classes', 'permission_classes', 'schema',
+        ):
+            if hasattr(func, setting):
+                attrs[setting] = getattr(func, setting)
+
+        WrappedAsyncAPIView = type(func.__name__, (AsyncAPIView,), attrs)
+        return WrappedAsyncAPIView.as_view()
+
+    return decorator
+
+
+async def asave(serializer, **kwargs):
+    """
+    serializer.save() for flat ModelSerializers (no m2m or nested writes). The
+    INSERT and what post_save receivers write for it (sync change log, rollups)
+    commit together, in one hop like acreate().
+    """
+    model, fields = serializer.Meta.model, {**serializer.validated_data, **kwargs}
+
+    def create():
+        with transaction.atomic():
+            return model.objects.create(**fields)
+
+    serializer.instance = await sync_to_async(create)()
+    return serializer.instance
+
+
+class AsyncListModelMixin(mixins.ListModelMixin):
+    """
+    GET list on the async ORM: the count and the page's rows (with their
+    prefetch_related lookups) in one hop, answered in DRF's paginated format.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        return await self.list(request, *args, **kwargs)
+
+    async def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+
+        page = await self.apaginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+
+        rows = [obj async for obj in queryset]
+        return Response(self.get_serializer(rows, many=True).data)
+
+    async def apaginate_queryset(self, queryset):
+        """
+        GenericAPIView.paginate_queryset in ONE hop to the database thread: the
+        count and the page's rows (with their prefetches) are read together.
+        """
+        return await sync_to_async(self.paginate_queryset)(queryset)
+
+
+class AsyncCreateModelMixin(mixins.CreateModelMixin):
+    """
+    POST create on the async ORM: validation on the event loop, one asave().
+    """
+
+    async def post(self, request, *args, **kwargs):
+        return await self.create(request, *args, **kwargs)
+
+    async def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        await self.perform_create(serializer)
+        headers = self.get_success_headers(serializer.data)
+        return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
+
+    async def perform_create(self, serializer):
+        await asave(serializer)
+
+
+class AsyncListAPIView(AsyncListModelMixin, AsyncAPIView, generics.ListAPIView):
+    """
+    ListAPIView on the async ORM.
+    """
+
+
+class AsyncCreateAPIView(AsyncCreateModelMixin, AsyncAPIView, generics.CreateAPIView):
+    """
+    CreateAPIView on the async ORM.
+    """
+
+
+class AsyncListCreateAPIView(AsyncListModelMixin, AsyncCreateModelMixin, AsyncAPIView, generics.ListCreateAPIView):
+    """
+    ListCreateAPIView on the async ORM.
+    """
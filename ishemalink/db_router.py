@@ -0,0 +1,136 @@
+"""
+Read-replica routing.
+
+Safe (GET/HEAD/OPTIONS) requests to views using ReadReplicaMixin read from
+the 'replica' database alias; everything else stays on 'default' (the primary).
+A user who has just written something is pinned to the primary for
+READ_REPLICA_STICKY_SECONDS so they always see their own writes, even if the
+replica is lagging.
+
+The pin lives in the Django cache, so with several workers the cache must be
+shared (e.g. Redis) for stickiness to follow the user across workers.
+"""
+import contextvars
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.permissions import SAFE_METHODS
+
+PRIMARY_ALIAS = 'default'
+REPLICA_ALIAS = 'replica'
+
+# Alias that reads should use for the current request (None = primary)
+_read_alias = contextvars.ContextVar('read_db_alias', default=None)
+
+
+def replica_enabled():
+    return getattr(settings, 'READ_REPLICA_ENABLED', False) and REPLICA_ALIAS in settings.DATABASES
+
+
+def _pin_key(user_id):
+    return f'primary_pin_{user_id}'
+
+
+def pin_to_primary(user):
+    """
+    Keeps this user's reads on the primary for the sticky window.
+    """
+    seconds = getattr(settings, 'READ_REPLICA_STICKY_SECONDS', 5)
+    cache.set(_pin_key(user.pk), True, seconds)
+
+
+def is_pinned(user):
+    return bool(user and user.is_authenticated and cache.get(_pin_key(user.pk)))
+
+
+class PrimaryReplicaRouter:
+    """
+    Sends reads to the replica only when the current view opted in.
+    All writes (and migrations' data) go to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica is a copy of the primary, so objects from both can be related
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
+
+
+class ReadReplicaMixin:
+    """
+    Lets a DRF view serve safe requests from the read replica.
+    Set read_from_replica = False on a view to opt out.
+    """
+    read_from_replica = True
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+
+        # Runs after authentication, so JWT users are known here
+        self._routed_to_replica = False
+        if (
+            self.read_from_replica
+            and request.method in SAFE_METHODS
+            and replica_enabled()
+            and not is_pinned(request.user)
+        ):
+            self._alias_before = _read_alias.get()
+            _read_alias.set(REPLICA_ALIAS)
+            self._routed_to_replica = True
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        # Restored by value, not with a Token: async views run initial() in a
+        # worker thread, whose context changes asgiref copies back to the event loop
+        if getattr(self, '_routed_to_replica', False):
+            _read_alias.set(self._alias_before)
+            self._routed_to_replica = False
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class PrimaryStickinessMiddleware:
+    """
+    After a successful write, pins the user to the primary for a short window
+    (read-your-writes consistency). Sync and async capable, so under ASGI it
+    does not push async views onto a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        if self.should_pin(request, response):
+            self.pin_user(request)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if self.should_pin(request, response):
+            # request.user may still be the lazy session user, which loads synchronously
+            await sync_to_async(self.pin_user)(request)
+        return response
+
+    @staticmethod
+    def should_pin(request, response):
+        return request.method not in SAFE_METHODS and response.status_code < 400 and replica_enabled()
+
+    @staticmethod
+    def pin_user(request):
+        # DRF copies the authenticated (session or JWT) user back onto the request
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            pin_to_primary(user)
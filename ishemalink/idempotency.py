@@ -0,0 +1,244 @@
+"""
+Idempotency-Key support for create (POST) endpoints.
+
+A client that may retry a POST sends `Idempotency-Key: <unique value>`. The
+first successful response is stored, zlib-compressed, in the 'idempotency'
+cache (bounded by MAX_ENTRIES, expiring after IDEMPOTENCY_TTL) and replayed for
+every retry with the same key, marked `Idempotent-Replayed: true`.
+
+While the first request is still running, the key is claimed with an
+in-flight marker (cache.add is atomic), and duplicates wait for its result
+instead of creating a second shipment. Reusing a key with a different body is
+rejected with 422. Errors are not stored, so a failed request can be retried.
+
+Keys are scoped per user, and per client IP for anonymous requests
+(registration), so unrelated clients reusing a key never collide. The stored
+fingerprint is an HMAC keyed with SECRET_KEY, because bodies can contain
+passwords.
+
+The default cache is per process; point CACHES['idempotency'] at a shared
+backend (Redis, Memcached, database) when running several workers.
+AsyncIdempotencyMixin is the same protocol for async create() views, on the
+cache's async API.
+"""
+import asyncio
+import hashlib
+import json
+import time
+import zlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.crypto import salted_hmac
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.throttling import BaseThrottle
+from rest_framework.utils.encoders import JSONEncoder
+
+from .metrics import record_cache
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+POLL_INTERVAL = 0.05
+
+
+def _cache():
+    return caches[getattr(settings, 'IDEMPOTENCY_CACHE', 'idempotency')]
+
+
+def cache_keys(owner, path, key):
+    """
+    (stored response key, in-flight marker key) for one client key on one endpoint.
+    """
+    scope = hashlib.sha256(f'{owner}:{path}:{key}'.encode()).hexdigest()
+    return f'idem:{scope}', f'idem-lock:{scope}'
+
+
+def fingerprint(request):
+    """
+    HMAC of what makes two requests 'the same': method, path and body.
+    Keyed with SECRET_KEY, so a stored fingerprint cannot be used to guess a password.
+    """
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = dict(data.lists())
+    payload = json.dumps([request.method, request.path, data], sort_keys=True, cls=JSONEncoder)
+    return salted_hmac('ishemalink.idempotency', payload, algorithm='sha256').hexdigest()
+
+
+def _pack(response, request_fingerprint):
+    stored = {
+        'fingerprint': request_fingerprint,
+        'status': response.status_code,
+        'data': response.data,
+        'location': response.get('Location'),
+    }
+    return zlib.compress(json.dumps(stored, cls=JSONEncoder).encode())
+
+
+def _unpack(blob):
+    return json.loads(zlib.decompress(blob))
+
+
+def _key_too_long():
+    return Response(
+        {"error": f"{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters."},
+        status=status.HTTP_400_BAD_REQUEST,
+    )
+
+
+def _still_in_progress():
+    return Response(
+        {"error": "A request with this Idempotency-Key is still in progress. Retry later."},
+        status=status.HTTP_409_CONFLICT,
+    )
+
+
+def _scope(request, key):
+    """
+    (response key, lock key, request fingerprint) for this request.
+    """
+    if request.user.is_authenticated:
+        owner = request.user.pk
+    else:
+        # Same client address logic as DRF's throttles (honours NUM_PROXIES)
+        owner = f'anon:{BaseThrottle().get_ident(request)}'
+    response_key, lock_key = cache_keys(owner, request.path, key)
+    return response_key, lock_key, fingerprint(request)
+
+
+def _replay(stored, request_fingerprint):
+    if stored['fingerprint'] != request_fingerprint:
+        return Response(
+            {"error": f"This {IDEMPOTENCY_HEADER} was already used with a different request."},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    headers = {REPLAYED_HEADER: 'true'}
+    if stored['location']:
+        headers['Location'] = stored['location']
+    return Response(stored['data'], status=stored['status'], headers=headers)
+
+
+def _lock_ttl():
+    return getattr(settings, 'IDEMPOTENCY_LOCK_SECONDS', 30)
+
+
+def _response_ttl():
+    return getattr(settings, 'IDEMPOTENCY_TTL', 60 * 60 * 24)
+
+
+def _wait_deadline():
+    return time.monotonic() + getattr(settings, 'IDEMPOTENCY_WAIT_SECONDS', 10)
+
+
+class IdempotencyMixin:
+    """
+    Add to a CreateAPIView to honour the Idempotency-Key header on create().
+    """
+
+    def create(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return super().create(request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return _key_too_long()
+
+        store = _cache()
+        response_key, lock_key, request_fingerprint = _scope(request, key)
+
+        # 1. A retry of a finished request: replay the stored response
+        blob = store.get(response_key)
+        record_cache('idempotency', hit=blob is not None)
+        if blob is not None:
+            return _replay(_unpack(blob), request_fingerprint)
+
+        # 2. Claim the key. If another request holds it, wait for its result
+        if not store.add(lock_key, request_fingerprint, _lock_ttl()):
+            blob, claimed = self._wait_for(store, response_key, lock_key)
+            if blob is not None:
+                return _replay(_unpack(blob), request_fingerprint)
+            if not claimed:
+                return _still_in_progress()
+
+        # 3. First request: run it and keep a successful response
+        try:
+            response = super().create(request, *args, **kwargs)
+            if status.is_success(response.status_code):
+                store.set(response_key, _pack(response, request_fingerprint), _response_ttl())
+        finally:
+            store.delete(lock_key)
+        return response
+
+    def _wait_for(self, store, response_key, lock_key):
+        """
+        Polls until the in-flight request stores its response (returns it), or
+        gives up its claim without one (we take the key over: returns claimed=True).
+        """
+        deadline = _wait_deadline()
+        while time.monotonic() < deadline:
+            time.sleep(POLL_INTERVAL)
+            blob = store.get(response_key)
+            if blob is not None:
+                return blob, False
+            if store.add(lock_key, 'in-flight', _lock_ttl()):
+                # The holder stores its response before releasing the key
+                blob = store.get(response_key)
+                if blob is not None:
+                    store.delete(lock_key)
+                return blob, blob is None
+        return None, False
+
+
+class AsyncIdempotencyMixin:
+    """
+    IdempotencyMixin for views whose create() is async (AsyncCreateAPIView and friends).
+    Waiting for an in-flight duplicate sleeps on the event loop, not in a thread.
+    """
+
+    async def create(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return await super().create(request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return _key_too_long()
+
+        store = _cache()
+        response_key, lock_key, request_fingerprint = _scope(request, key)
+
+        # 1. A retry of a finished request: replay the stored response
+        blob = await store.aget(response_key)
+        record_cache('idempotency', hit=blob is not None)
+        if blob is not None:
+            return _replay(_unpack(blob), request_fingerprint)
+
+        # 2. Claim the key. If another request holds it, wait for its result
+        if not await store.aadd(lock_key, request_fingerprint, _lock_ttl()):
+            blob, claimed = await self._wait_for(store, response_key, lock_key)
+            if blob is not None:
+                return _replay(_unpack(blob), request_fingerprint)
+            if not claimed:
+                return _still_in_progress()
+
+        # 3. First request: run it and keep a successful response
+        try:
+            response = await super().create(request, *args, **kwargs)
+            if status.is_success(response.status_code):
+                await store.aset(response_key, _pack(response, request_fingerprint), _response_ttl())
+        finally:
+            await store.adelete(lock_key)
+        return response
+
+    async def _wait_for(self, store, response_key, lock_key):
+        deadline = _wait_deadline()
+        while time.monotonic() < deadline:
+            await asyncio.sleep(POLL_INTERVAL)
+            blob = await store.aget(response_key)
+            if blob is not None:
+                return blob, False
+            if await store.aadd(lock_key, 'in-flight', _lock_ttl()):
+                blob = await store.aget(response_key)
+                if blob is not None:
+                    await store.adelete(lock_key)
+                return blob, blob is None
+        return None, False
@@ -0,0 +1,379 @@
+"""
+Per-request instrumentation and a Prometheus /metrics endpoint.
+
+RequestMetricsMiddleware records, per view: request latency, SQL query count
+and DB time, throttle rejections (HTTP 429) and cache hits/misses reported
+through record_cache(). Every response gets a Server-Timing header.
+
+Metrics live in cheap in-process histograms/counters. When METRICS_DIR is set,
+each worker process also dumps a snapshot there (at most once per
+METRICS_FLUSH_SECONDS) and /metrics sums the snapshots of all workers.
+Snapshots of workers that are no longer running are deleted when /metrics is
+read, so the directory must be local to one host (the PID is the liveness check).
+
+/metrics needs 'Authorization: Bearer <METRICS_TOKEN>' when a token is set.
+Without one it is served to staff users only (anyone when DEBUG is on).
+"""
+import bisect
+import contextvars
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+METRIC_HELP = {
+    'ishemalink_request_duration_seconds': ('histogram', "Request latency per view."),
+    'ishemalink_request_queries': ('histogram', "SQL queries per request per view."),
+    'ishemalink_requests_total': ('counter', "Requests per view and status class."),
+    'ishemalink_db_seconds_total': ('counter', "Time spent in SQL per view."),
+    'ishemalink_throttled_total': ('counter', "Requests rejected by throttling (HTTP 429) per view."),
+    'ishemalink_cache_requests_total': ('counter', "Cache lookups per view, cache and result."),
+}
+
+
+class MetricsRegistry:
+    """
+    Thread-safe store of counters and fixed-bucket histograms.
+    Labels are stored as a tuple of (name, value) pairs.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}    # name -> {labels: value}
+        self.histograms = {}  # name -> {labels: [bucket counts..., +Inf count, sum]}
+        self.buckets = {}     # name -> bucket bounds
+
+    def inc(self, name, labels, amount=1):
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[labels] = series.get(labels, 0) + amount
+
+    def observe(self, name, labels, value, buckets):
+        index = bisect.bisect_left(buckets, value)
+        with self._lock:
+            self.buckets[name] = buckets
+            series = self.histograms.setdefault(name, {})
+            row = series.get(labels)
+            if row is None:
+                row = series[labels] = [0] * (len(buckets) + 1) + [0.0]
+            row[index] += 1
+            row[-1] += value
+
+    def snapshot(self):
+        """
+        JSON-friendly copy of the current values.
+        """
+        with self._lock:
+            return {
+                'counters': {
+                    name: [[list(labels), value] for labels, value in series.items()]
+                    for name, series in self.counters.items()
+                },
+                'histograms': {
+                    name: [[list(labels), list(row)] for labels, row in series.items()]
+                    for name, series in self.histograms.items()
+                },
+                'buckets': {name: list(bounds) for name, bounds in self.buckets.items()},
+            }
+
+    def clear(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.buckets.clear()
+
+
+REGISTRY = MetricsRegistry()
+
+
+# --- Per-request stats, shared with the DB wrapper through a context variable ---
+
+class RequestStats:
+    __slots__ = ('request', 'queries', 'db_time', 'statements')
+
+    def __init__(self, request=None):
+        # The view is only known once the URL is resolved, so it is read from the request when needed
+        self.request = request
+        self.queries = 0
+        self.db_time = 0.0
+        # Only a list while the request is being profiled: [(sql, duration_ms), ...]
+        self.statements = None
+
+
+_current_stats = contextvars.ContextVar('request_stats', default=None)
+
+
+def _instrument_queries(execute, sql, params, many, context):
+    stats = _current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        stats.queries += 1
+        stats.db_time += elapsed
+        if stats.statements is not None:
+            stats.statements.append((sql, round(elapsed * 1000, 3)))
+
+
+def _wrap_connection(connection, **kwargs):
+    if _instrument_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_instrument_queries)
+
+
+def current_request_stats():
+    return _current_stats.get()
+
+
+def start_request_stats(request=None):
+    """
+    Starts collecting stats for the current context; returns a token for end_request_stats().
+    """
+    stats = RequestStats(request)
+    return stats, _current_stats.set(stats)
+
+
+def end_request_stats(token):
+    _current_stats.reset(token)
+
+
+def install_db_instrumentation():
+    """
+    Adds the query timer to every DB connection, including ones opened later in other threads.
+    """
+    connection_created.connect(_wrap_connection, dispatch_uid='ishemalink_metrics_db')
+    for connection in connections.all(initialized_only=True):
+        _wrap_connection(connection)
+
+
+def view_label(request):
+    match = getattr(request, 'resolver_match', None)
+    return (match.view_name or match._func_path) if match else 'unmatched'
+
+
+def record_cache(cache_name, hit):
+    """
+    Called by code that does look-aside caching (e.g. the tariff cache), on behalf of the current view.
+    """
+    stats = _current_stats.get()
+    view = view_label(stats.request) if stats is not None else 'unmatched'
+    REGISTRY.inc(
+        'ishemalink_cache_requests_total',
+        (('view', view), ('cache', cache_name), ('result', 'hit' if hit else 'miss')),
+    )
+
+
+# --- Multi-worker aggregation ---
+
+_last_flush = 0.0
+
+
+def _metrics_dir():
+    path = getattr(settings, 'METRICS_DIR', None)
+    return Path(path) if path else None
+
+
+def flush_snapshot(force=False):
+    """
+    Writes this worker's snapshot to METRICS_DIR (rate limited unless forced).
+    """
+    global _last_flush
+    directory = _metrics_dir()
+    if directory is None:
+        return
+
+    now = time.monotonic()
+    if not force and now - _last_flush < getattr(settings, 'METRICS_FLUSH_SECONDS', 1.0):
+        return
+    _last_flush = now
+
+    directory.mkdir(parents=True, exist_ok=True)
+    target = directory / f'worker-{os.getpid()}.json'
+    temp = directory / f'.worker-{os.getpid()}.tmp'
+    temp.write_text(json.dumps(REGISTRY.snapshot()))
+    os.replace(temp, target)
+
+
+def collect_snapshots():
+    """
+    This worker's live snapshot, plus the last snapshot of every other worker.
+    """
+    snapshots = [REGISTRY.snapshot()]
+    directory = _metrics_dir()
+    if directory is None or not directory.exists():
+        return snapshots
+
+    own_file = f'worker-{os.getpid()}.json'
+    for path in directory.glob('worker-*.json'):
+        if path.name == own_file:
+            continue
+        if not _worker_alive(path):
+            # A dead or restarted worker: its totals must not be summed in forever
+            path.unlink(missing_ok=True)
+            continue
+        try:
+            snapshots.append(json.loads(path.read_text()))
+        except (OSError, ValueError):
+            continue  # worker was mid-write or the file vanished
+    return snapshots
+
+
+def _worker_alive(path):
+    """
+    Whether the process that wrote worker-<pid>.json is still running.
+    """
+    try:
+        pid = int(path.stem.split('-', 1)[1])
+    except (IndexError, ValueError):
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # exists, owned by another user
+    return True
+
+
+def _escape_label(value):
+    """
+    Label value escaping from the Prometheus text format: backslash, quote and newline.
+    """
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    inner = ','.join(f'{name}="{_escape_label(value)}"' for name, value in pairs)
+    return '{' + inner + '}'
+
+
+def render_prometheus(snapshots):
+    """
+    Merges worker snapshots and renders them in the Prometheus text format.
+    """
+    counters, histograms, buckets = {}, {}, {}
+    for snap in snapshots:
+        buckets.update(snap.get('buckets', {}))
+        for name, series in snap.get('counters', {}).items():
+            merged = counters.setdefault(name, {})
+            for labels, value in series:
+                key = tuple(tuple(pair) for pair in labels)
+                merged[key] = merged.get(key, 0) + value
+        for name, series in snap.get('histograms', {}).items():
+            merged = histograms.setdefault(name, {})
+            for labels, row in series:
+                key = tuple(tuple(pair) for pair in labels)
+                if key in merged:
+                    merged[key] = [a + b for a, b in zip(merged[key], row)]
+                else:
+                    merged[key] = list(row)
+
+    lines = []
+    for name in sorted(histograms):
+        _, help_text = METRIC_HELP.get(name, ("histogram", name))
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+        bounds = buckets.get(name, [])
+        for labels, row in sorted(histograms[name].items()):
+            cumulative = 0
+            for bound, count in zip(list(bounds) + ['+Inf'], row[:-1]):
+                cumulative += count
+                lines.append(f'{name}_bucket{_format_labels(labels, [("le", bound)])} {cumulative}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {row[-1]}')
+            lines.append(f'{name}_count{_format_labels(labels)} {cumulative}')
+    for name in sorted(counters):
+        _, help_text = METRIC_HELP.get(name, ("counter", name))
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+        for labels, value in sorted(counters[name].items()):
+            lines.append(f'{name}{_format_labels(labels)} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """
+    GET /metrics
+    Prometheus scrape endpoint. If METRICS_TOKEN is set, the scraper must send
+    'Authorization: Bearer <token>'. Otherwise only staff (or anyone in DEBUG) may read it.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token:
+        if request.headers.get('Authorization') != f'Bearer {token}':
+            return HttpResponse(status=401)
+    elif not settings.DEBUG and not request.user.is_staff:
+        return HttpResponse(status=403)
+
+    flush_snapshot(force=True)
+    return HttpResponse(render_prometheus(collect_snapshots()), content_type='text/plain; version=0.0.4')
+
+
+# --- The middleware ---
+
+class RequestMetricsMiddleware:
+    """
+    Times every request and attributes its SQL work to the view that handled it.
+    Should sit at the top of MIDDLEWARE so the timing covers the whole stack.
+    Sync and async capable: under ASGI it runs on the event loop.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        install_db_instrumentation()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, token = start_request_stats(request)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            end_request_stats(token)
+        return self.record(request, response, stats, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        # Queries run in worker threads see the same RequestStats: sync_to_async copies the context
+        stats, token = start_request_stats(request)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            end_request_stats(token)
+        return self.record(request, response, stats, time.perf_counter() - start)
+
+    def record(self, request, response, stats, duration):
+        labels = (('view', view_label(request)),)
+
+        REGISTRY.observe('ishemalink_request_duration_seconds', labels, duration, LATENCY_BUCKETS)
+        REGISTRY.observe('ishemalink_request_queries', labels, stats.queries, QUERY_BUCKETS)
+        REGISTRY.inc('ishemalink_requests_total', labels + (('status', f'{response.status_code // 100}xx'),))
+        if stats.db_time:
+            REGISTRY.inc('ishemalink_db_seconds_total', labels, stats.db_time)
+        if response.status_code == 429:
+            REGISTRY.inc('ishemalink_throttled_total', labels)
+
+        response['Server-Timing'] = (
+            f'app;dur={duration * 1000:.2f}, '
+            f'db;dur={stats.db_time * 1000:.2f};desc="{stats.queries} queries"'
+        )
+
+        flush_snapshot()
+        return response
@@ -0,0 +1,242 @@
+"""
+On-demand sampled profiling of individual API requests.
+
+A request is profiled when an admin sends `X-Profile: 1`, or at random with
+probability PROFILING_SAMPLE_RATE. While it runs, a background thread samples
+the Python stacks of the threads serving it every PROFILING_INTERVAL_MS and
+counts them in collapsed-stack form ("module:func;module:func <count>"),
+which flamegraph.pl / speedscope read directly. The SQL the request ran is
+stored next to the stacks as a RequestProfile row.
+
+The middleware is async capable. Requests that are not profiled stay on the
+event loop; a profiled one runs the rest of the stack from a single worker
+thread (as under WSGI), where Django also runs sync views, so that thread is
+the one sampled. Async views run on the event loop thread instead;
+AsyncAPIView calls track_current_thread() so it is sampled too. That thread
+is shared by every request the worker is serving, so under concurrency an
+async view's profile can include other requests' frames. Profile async
+views on a quiet worker, or read their SQL list, which is per request.
+
+Retention (PROFILING_MAX_PROFILES / PROFILING_RETENTION_DAYS) is enforced
+every PROFILING_RETENTION_EVERY saved profiles, not on every save.
+"""
+import contextvars
+import itertools
+import logging
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from .metrics import current_request_stats, end_request_stats, start_request_stats
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Profile'
+
+_active_sampler = contextvars.ContextVar('active_sampler', default=None)
+
+# Profiles saved by this process, for running retention every Nth save
+_saved_profiles = itertools.count(1)
+
+
+class StackSampler(threading.Thread):
+    """
+    Samples the stacks of a set of threads until stop() is called.
+    """
+
+    def __init__(self, interval):
+        super().__init__(name='request-profiler', daemon=True)
+        self.interval = interval
+        self.thread_ids = set()
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def track(self, thread_id):
+        self.thread_ids.add(thread_id)
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frames = sys._current_frames()
+            for thread_id in list(self.thread_ids):
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    self.stacks[collapse(frame)] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def collapse(frame):
+    """
+    Turns a frame into 'root;...;leaf' using module:function names.
+    """
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{frame.f_globals.get('__name__', '?')}:{code.co_name}")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def track_current_thread():
+    """
+    Adds the calling thread to the active request's profile, if there is one.
+    """
+    sampler = _active_sampler.get()
+    if sampler is not None:
+        sampler.track(threading.get_ident())
+
+
+def _requesting_admin(request):
+    """
+    Returns the staff user asking for a profile, via session or JWT.
+    """
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user if user.is_staff else None
+
+    from rest_framework.exceptions import AuthenticationFailed
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from rest_framework_simplejwt.exceptions import TokenError
+    try:
+        result = JWTAuthentication().authenticate(request)
+    except (AuthenticationFailed, TokenError):
+        # Bad, expired or inactive user's token: not profiled, the view answers 401
+        return None
+    if result and result[0].is_staff:
+        return result[0]
+    return None
+
+
+def _has_credentials(request):
+    return 'HTTP_AUTHORIZATION' in request.META or settings.SESSION_COOKIE_NAME in request.COOKIES
+
+
+def _sampled():
+    return random.random() < getattr(settings, 'PROFILING_SAMPLE_RATE', 0.0)
+
+
+def enforce_retention():
+    """
+    Keeps at most PROFILING_MAX_PROFILES profiles, none older than PROFILING_RETENTION_DAYS.
+    """
+    from core.models import RequestProfile
+
+    cutoff = timezone.now() - timedelta(days=getattr(settings, 'PROFILING_RETENTION_DAYS', 7))
+    RequestProfile.objects.filter(created_at__lt=cutoff).delete()
+
+    keep = getattr(settings, 'PROFILING_MAX_PROFILES', 200)
+    stale = RequestProfile.objects.order_by('-created_at').values_list('pk', flat=True)[keep:]
+    RequestProfile.objects.filter(pk__in=list(stale)).delete()
+
+
+class RequestProfilingMiddleware:
+    """
+    Profiles admin-requested (X-Profile: 1) or randomly sampled requests.
+    Must come after AuthenticationMiddleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        trigger, user = self._trigger(request, _sampled())
+        if trigger is None:
+            return self.get_response(request)
+        return self._profile(request, trigger, user, self.get_response)
+
+    async def __acall__(self, request):
+        sampled, user = _sampled(), None
+        if request.headers.get(PROFILE_HEADER) == '1' and _has_credentials(request):
+            # Looking up the admin may query the DB; only this lookup leaves the event loop
+            user = await sync_to_async(_requesting_admin)(request)
+        if user is None and not sampled:
+            return await self.get_response(request)
+        trigger = 'HEADER' if user is not None else 'SAMPLED'
+        return await sync_to_async(self._profile_in_thread)(request, trigger, user)
+
+    def _profile_in_thread(self, request, trigger, user):
+        return self._profile(request, trigger, user, async_to_sync(self.get_response))
+
+    @staticmethod
+    def _trigger(request, sampled):
+        """
+        (trigger, admin user or None), or (None, None) when this request is not profiled.
+        """
+        if request.headers.get(PROFILE_HEADER) == '1':
+            user = _requesting_admin(request)
+            if user is not None:
+                return 'HEADER', user
+        return ('SAMPLED', None) if sampled else (None, None)
+
+    def _profile(self, request, trigger, user, get_response):
+        # Reuse the metrics middleware's per-request stats when present
+        stats, stats_token = current_request_stats(), None
+        if stats is None:
+            stats, stats_token = start_request_stats(request)
+        stats.statements = []
+
+        sampler = StackSampler(getattr(settings, 'PROFILING_INTERVAL_MS', 5) / 1000)
+        sampler.track(threading.get_ident())
+        sampler_token = _active_sampler.set(sampler)
+
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            response = get_response(request)
+        finally:
+            sampler.stop()
+            _active_sampler.reset(sampler_token)
+            statements, stats.statements = stats.statements, None
+            if stats_token is not None:
+                end_request_stats(stats_token)
+        duration = time.perf_counter() - start
+
+        try:
+            profile = self._save(request, response, trigger, user, duration, sampler, statements)
+        except Exception:
+            # Profiling must never break the request it observed
+            logger.exception("Could not store request profile")
+        else:
+            response['X-Profile-Id'] = str(profile.pk)
+        return response
+
+    def _save(self, request, response, trigger, user, duration, sampler, statements):
+        from core.models import RequestProfile
+
+        if user is None:
+            request_user = getattr(request, 'user', None)
+            user = request_user if request_user is not None and request_user.is_authenticated else None
+
+        match = getattr(request, 'resolver_match', None)
+        profile = RequestProfile.objects.create(
+            trigger=trigger,
+            user=user,
+            method=request.method,
+            path=request.path[:255],
+            view_name=(match.view_name if match else '')[:100],
+            status_code=response.status_code,
+            duration_ms=round(duration * 1000, 3),
+            sample_count=sampler.samples,
+            collapsed_stacks='\n'.join(f'{stack} {count}' for stack, count in sampler.stacks.most_common()),
+            sql_statements=[{'sql': sql, 'ms': ms} for sql, ms in statements],
+        )
+        if next(_saved_profiles) % getattr(settings, 'PROFILING_RETENTION_EVERY', 20) == 0:
+            enforce_retention()
+        return profile
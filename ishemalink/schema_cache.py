@@ -0,0 +1,224 @@
+"""
+Precomputed OpenAPI schema.
+
+SpectacularAPIView introspects every view and serializer on each request,
+which takes hundreds of milliseconds. With SCHEMA_PRECOMPUTED on, the schema
+is built once per code version (by `manage.py build_openapi_schema`, at
+startup, or on the first request) and kept in memory as ready-to-send bytes:
+plain and gzip-compressed, with an ETag. Built files are also written to
+SCHEMA_CACHE_DIR so other workers and restarts of the same release reuse them.
+"""
+import gzip
+import hashlib
+import logging
+import threading
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from drf_spectacular.renderers import OpenApiJsonRenderer, OpenApiYamlRenderer
+from drf_spectacular.settings import spectacular_settings
+from drf_spectacular.utils import extend_schema
+from drf_spectacular.views import SCHEMA_KWARGS, SpectacularAPIView
+
+logger = logging.getLogger(__name__)
+
+RENDERERS = {
+    'yaml': OpenApiYamlRenderer,
+    'json': OpenApiJsonRenderer,
+}
+
+_lock = threading.Lock()
+_artifacts = {}  # (code_version, format) -> SchemaArtifact
+_code_version = None
+
+
+class SchemaArtifact:
+    """
+    One rendered schema, ready to send.
+    """
+    __slots__ = ('body', 'gzipped', 'etag')
+
+    def __init__(self, body, gzipped=None):
+        self.body = body
+        self.gzipped = gzipped if gzipped is not None else gzip.compress(body, compresslevel=9)
+        self.etag = '"%s"' % hashlib.sha256(body).hexdigest()[:32]
+
+
+def code_version():
+    """
+    The release the schema belongs to: CODE_VERSION (e.g. the git SHA set at
+    deploy), otherwise a hash of the project's Python source.
+    """
+    global _code_version
+    if _code_version is None:
+        _code_version = getattr(settings, 'CODE_VERSION', None) or _source_hash()
+    return _code_version
+
+
+def _source_hash():
+    base_dir = Path(settings.BASE_DIR).resolve()
+    folders = {base_dir / settings.ROOT_URLCONF.split('.')[0]}
+    for config in apps.get_app_configs():
+        path = Path(config.path).resolve()
+        if path.is_relative_to(base_dir):
+            folders.add(path)
+
+    digest = hashlib.sha256(spectacular_settings.VERSION.encode())
+    for folder in sorted(folders):
+        for source in sorted(folder.rglob('*.py')):
+            digest.update(str(source.relative_to(base_dir)).encode())
+            digest.update(source.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def _cache_dir():
+    path = getattr(settings, 'SCHEMA_CACHE_DIR', None)
+    return Path(path) if path else None
+
+
+def _file_path(version, file_format):
+    return _cache_dir() / f'schema-{version}.{file_format}'
+
+
+def generate_schema():
+    """
+    Runs drf-spectacular's generator once, like `manage.py spectacular` does.
+    """
+    generator = spectacular_settings.DEFAULT_GENERATOR_CLASS(
+        urlconf=spectacular_settings.SERVE_URLCONF,
+        api_version=spectacular_settings.VERSION,
+    )
+    return generator.get_schema(request=None, public=True)
+
+
+def build_artifacts(write=True):
+    """
+    Renders every format from a single generator run; returns {format: path or None}.
+    """
+    version = code_version()
+    schema = generate_schema()
+    written = {}
+
+    with _lock:
+        for file_format, renderer_class in RENDERERS.items():
+            body = renderer_class().render(schema, renderer_context={})
+            artifact = SchemaArtifact(body)
+            _artifacts[(version, file_format)] = artifact
+            written[file_format] = _write(version, file_format, artifact) if write else None
+    return written
+
+
+def _write(version, file_format, artifact):
+    directory = _cache_dir()
+    if directory is None:
+        return None
+    try:
+        directory.mkdir(parents=True, exist_ok=True)
+        path = _file_path(version, file_format)
+        path.write_bytes(artifact.body)
+        path.with_name(path.name + '.gz').write_bytes(artifact.gzipped)
+    except OSError:
+        # A read-only filesystem only costs us the disk copy
+        logger.warning("Could not write the OpenAPI schema to %s", directory)
+        return None
+    return path
+
+
+def _read(version, file_format):
+    directory = _cache_dir()
+    if directory is None:
+        return None
+    path = _file_path(version, file_format)
+    try:
+        body = path.read_bytes()
+    except OSError:
+        return None
+    try:
+        gzipped = path.with_name(path.name + '.gz').read_bytes()
+    except OSError:
+        gzipped = None
+    return SchemaArtifact(body, gzipped)
+
+
+def get_artifact(file_format):
+    """
+    Memory first, then the file built for this code version, then a fresh build.
+    """
+    version = code_version()
+    artifact = _artifacts.get((version, file_format))
+    if artifact is not None:
+        return artifact
+
+    artifact = _read(version, file_format)
+    if artifact is not None:
+        with _lock:
+            return _artifacts.setdefault((version, file_format), artifact)
+
+    build_artifacts()
+    return _artifacts[(version, file_format)]
+
+
+def warm():
+    """
+    Loads (or builds) the schema at process startup so no request pays for it.
+    """
+    if not getattr(settings, 'SCHEMA_PRECOMPUTED', False):
+        return
+    try:
+        for file_format in RENDERERS:
+            get_artifact(file_format)
+    except Exception:
+        # The first request will try again; startup must not fail over docs
+        logger.exception("Could not precompute the OpenAPI schema")
+
+
+def clear():
+    global _code_version
+    with _lock:
+        _artifacts.clear()
+        _code_version = None
+
+
+def accepts_gzip(request):
+    encodings = request.headers.get('Accept-Encoding', '')
+    return any(part.split(';')[0].strip() == 'gzip' for part in encodings.split(','))
+
+
+class CachedSpectacularAPIView(SpectacularAPIView):
+    """
+    GET /api/schema/
+    Same output as SpectacularAPIView, served from the precomputed schema.
+    Supports If-None-Match (304) and gzip. Falls back to live generation when
+    SCHEMA_PRECOMPUTED is off or the request asks for a specific language/version.
+    """
+
+    @extend_schema(**SCHEMA_KWARGS)
+    def get(self, request, *args, **kwargs):
+        if (
+            not getattr(settings, 'SCHEMA_PRECOMPUTED', False)
+            or 'lang' in request.GET
+            or 'version' in request.GET
+            or request.accepted_renderer.format not in RENDERERS
+        ):
+            return super().get(request, *args, **kwargs)
+
+        artifact = get_artifact(request.accepted_renderer.format)
+        use_gzip = accepts_gzip(request)
+        # The compressed bytes are a different representation, so they get their own tag
+        etag = artifact.etag[:-1] + '-gzip"' if use_gzip else artifact.etag
+
+        if request.headers.get('If-None-Match') == etag:
+            response = HttpResponseNotModified()
+        elif use_gzip:
+            response = HttpResponse(artifact.gzipped, content_type=request.accepted_media_type)
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(artifact.body, content_type=request.accepted_media_type)
+
+        response['ETag'] = etag
+        response['X-Schema-Version'] = code_version()
+        patch_vary_headers(response, ['Accept', 'Accept-Encoding'])
+        return response
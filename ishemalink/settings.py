@@ -45,9 +45,13 @@ INSTALLED_APPS = [
     'core',
     'domestic',
     'international',
+    'sync',
 ]
 
 MIDDLEWARE = [
+    # Observability: latency / SQL / cache / throttle metrics + Server-Timing header (first, so it times everything)
+    'ishemalink.metrics.RequestMetricsMiddleware',
+
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     
@@ -59,6 +63,12 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+
+    # Read-your-writes: keeps a user on the primary DB right after they write
+    'ishemalink.db_router.PrimaryStickinessMiddleware',
+
+    # On-demand profiling: admins send 'X-Profile: 1', or a random PROFILING_SAMPLE_RATE share
+    'ishemalink.profiling.RequestProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'ishemalink.urls'
@@ -82,11 +92,78 @@ WSGI_APPLICATION = 'ishemalink.wsgi.application'
 
 
 # Database
+# SQLite profile for many concurrent writers (SQLITE_PROFILE=default gives Django's stock settings):
+#   - WAL journal: readers never block the writer and vice versa
+#   - timeout: writers wait up to 20s for the lock instead of failing with "database is locked"
+#   - IMMEDIATE: transactions take the write lock at BEGIN, so two writers never deadlock upgrading
+#   - CONN_MAX_AGE: connections (and their PRAGMAs) are reused instead of reopened per request
+SQLITE_PROFILE = os.getenv('SQLITE_PROFILE', 'concurrent')
+
+if SQLITE_PROFILE == 'concurrent':
+    SQLITE_OPTIONS = {
+        'timeout': 20,
+        'transaction_mode': 'IMMEDIATE',
+        'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL; PRAGMA temp_store=MEMORY',
+    }
+    SQLITE_CONN_MAX_AGE = 60
+else:
+    SQLITE_OPTIONS = {}
+    SQLITE_CONN_MAX_AGE = 0
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'NAME': os.getenv('DB_NAME', BASE_DIR / 'db.sqlite3'),
+        'OPTIONS': SQLITE_OPTIONS,
+        'CONN_MAX_AGE': SQLITE_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+    },
+    # Read replica for list/export endpoints (only used when READ_REPLICA_ENABLED)
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.getenv('REPLICA_DB_NAME', BASE_DIR / 'db_replica.sqlite3'),
+        'OPTIONS': SQLITE_OPTIONS,
+        'CONN_MAX_AGE': SQLITE_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+    },
+}
+
+DATABASE_ROUTERS = ['ishemalink.db_router.PrimaryReplicaRouter']
+READ_REPLICA_ENABLED = os.getenv('READ_REPLICA_ENABLED') == 'True'
+READ_REPLICA_STICKY_SECONDS = int(os.getenv('READ_REPLICA_STICKY_SECONDS', '5'))
+
+# Observability: /metrics (Prometheus). Set METRICS_DIR to a directory shared by all
+# workers on this host so /metrics reports the sum across processes, not just the one that answered.
+# Scrapers authenticate with METRICS_TOKEN; without a token /metrics is staff-only (open in DEBUG).
+METRICS_DIR = os.getenv('METRICS_DIR')
+METRICS_FLUSH_SECONDS = float(os.getenv('METRICS_FLUSH_SECONDS', '1'))
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+# Request profiling (stored as core.RequestProfile, downloadable from the admin)
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', '0'))
+PROFILING_INTERVAL_MS = float(os.getenv('PROFILING_INTERVAL_MS', '5'))
+PROFILING_MAX_PROFILES = int(os.getenv('PROFILING_MAX_PROFILES', '200'))
+PROFILING_RETENTION_DAYS = int(os.getenv('PROFILING_RETENTION_DAYS', '7'))
+# Retention runs every Nth stored profile, so the table can briefly hold up to N-1 extra rows
+PROFILING_RETENTION_EVERY = int(os.getenv('PROFILING_RETENTION_EVERY', '20'))
+
+# OpenAPI schema: built once per code version and served from memory (ishemalink/schema_cache.py).
+# Set CODE_VERSION (e.g. the git SHA) at deploy; otherwise a hash of the source is used.
+SCHEMA_PRECOMPUTED = os.getenv('SCHEMA_PRECOMPUTED', 'True') == 'True'
+SCHEMA_CACHE_DIR = os.getenv('SCHEMA_CACHE_DIR', str(BASE_DIR / '.schema_cache'))
+CODE_VERSION = os.getenv('CODE_VERSION')
+
+# Logging: app loggers (SMS notifications, cache events) go to the console
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'domestic': {'handlers': ['console'], 'level': os.getenv('APP_LOG_LEVEL', 'INFO')},
+        'international': {'handlers': ['console'], 'level': os.getenv('APP_LOG_LEVEL', 'INFO')},
+    },
 }
 
 # Task 4: Caching Configuration
@@ -94,8 +171,28 @@ CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
         'LOCATION': 'unique-snowflake',
-    }
+    },
+    # Idempotency-Key responses (ishemalink/idempotency.py): compressed, bounded, expiring.
+    # Use a shared backend (Redis/Memcached/DB) when running several workers.
+    'idempotency': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'idempotency',
+        'TIMEOUT': 60 * 60 * 24,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
 }
+IDEMPOTENCY_TTL = int(os.getenv('IDEMPOTENCY_TTL', str(60 * 60 * 24)))
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv('IDEMPOTENCY_LOCK_SECONDS', '30'))
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv('IDEMPOTENCY_WAIT_SECONDS', '10'))
+
+# Cached active parcel IDs per area (domestic/manifests.py). Updated in place on
+# every status change, but only in the worker that handled it: the default cache is
+# per process, so with several workers this TTL is how stale the others may get.
+ACTIVE_PARCELS_TTL = int(os.getenv('ACTIVE_PARCELS_TTL', str(60 * 10)))
+
+# Offline replay keys older than this are deleted by `manage.py prune_applied_operations`;
+# a tablet replaying a batch after that would apply it again
+REPLAY_KEY_RETENTION_DAYS = int(os.getenv('REPLAY_KEY_RETENTION_DAYS', '30'))
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
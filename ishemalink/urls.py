@@ -1,6 +1,8 @@
 from django.contrib import admin
 from django.urls import path, include
-from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
+from drf_spectacular.views import SpectacularSwaggerView
+from .metrics import metrics_view
+from .schema_cache import CachedSpectacularAPIView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -13,7 +15,13 @@ urlpatterns = [
 
     path('api/international/', include('international.urls')),
 
+    # Offline-first agent tablets: delta sync
+    path('api/sync/', include('sync.urls')),
+
     # Task 1: Documentation
-    path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
+    path('api/schema/', CachedSpectacularAPIView.as_view(), name='schema'),
     path('api/docs/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
+
+    # Observability: Prometheus scrape endpoint
+    path('metrics', metrics_view, name='metrics'),
 ]
\ No newline at end of file
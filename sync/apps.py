@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class SyncConfig(AppConfig):
+    name = 'sync'
+
+    def ready(self):
+        # Records every Shipment / ShipmentLog / InternationalCargo change in the sync log
+        from . import tracking  # noqa: F401
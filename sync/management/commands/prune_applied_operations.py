@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from sync.models import AppliedOperation
+
+
+class Command(BaseCommand):
+    help = "Deletes replayed offline operation keys older than REPLAY_KEY_RETENTION_DAYS, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help="Keep keys applied in the last N days (default: the setting).")
+        parser.add_argument('--batch-size', type=int, default=5000, help="Rows deleted per query.")
+
+    def handle(self, *args, **options):
+        days = options['days'] if options['days'] is not None else settings.REPLAY_KEY_RETENTION_DAYS
+        if days < 1:
+            raise CommandError("--days must be at least 1.")
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+
+        cutoff = timezone.now() - timedelta(days=days)
+        total = 0
+        while True:
+            # Short deletes, so replaying tablets are not blocked behind one long one
+            batch = list(
+                AppliedOperation.objects.filter(applied_at__lt=cutoff)
+                .values_list('pk', flat=True)[:options['batch_size']]
+            )
+            if not batch:
+                break
+            total += AppliedOperation.objects.filter(pk__in=batch).delete()[0]
+
+        self.stdout.write(self.style.SUCCESS(f"Deleted {total} applied operations older than {days} days."))
@@ -0,0 +1,28 @@
+# Generated by Django 6.0.1 on 2026-10-19 17:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLogEntry',
+            fields=[
+                ('seq', models.BigAutoField(primary_key=True, serialize=False)),
+                ('model', models.CharField(choices=[('shipment', 'Shipment'), ('shipment_log', 'Shipment Log'), ('cargo', 'International Cargo')], max_length=20)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('op', models.CharField(choices=[('U', 'Created or Updated'), ('D', 'Deleted')], default='U', max_length=1)),
+                ('visible_to', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('changed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('model', 'object_id'), name='unique_change_per_object')],
+            },
+        ),
+    ]
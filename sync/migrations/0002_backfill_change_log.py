@@ -0,0 +1,40 @@
+from django.db import migrations
+
+BATCH_SIZE = 2000
+
+
+def backfill(apps, schema_editor):
+    """
+    Gives every existing row a change log entry, so a first sync (no token) returns it.
+    """
+    ChangeLogEntry = apps.get_model('sync', 'ChangeLogEntry')
+    sources = [
+        ('shipment', apps.get_model('domestic', 'Shipment'), False),
+        ('shipment_log', apps.get_model('domestic', 'ShipmentLog'), False),
+        ('cargo', apps.get_model('international', 'InternationalCargo'), True),
+    ]
+
+    for model_name, model, private in sources:
+        fields = ('pk', 'owner_id') if private else ('pk',)
+        batch = []
+        for row in model.objects.order_by('pk').values_list(*fields).iterator(chunk_size=BATCH_SIZE):
+            batch.append(ChangeLogEntry(
+                model=model_name, object_id=row[0], visible_to=row[1] if private else None
+            ))
+            if len(batch) >= BATCH_SIZE:
+                ChangeLogEntry.objects.bulk_create(batch)
+                batch = []
+        ChangeLogEntry.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sync', '0001_initial'),
+        ('domestic', '0002_tariff'),
+        ('international', '0002_corridordailyrollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
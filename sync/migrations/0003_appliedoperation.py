@@ -0,0 +1,32 @@
+# Generated by Django 6.0.1 on 2026-10-19 17:44
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sync', '0002_backfill_change_log'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppliedOperation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64)),
+                ('op_type', models.CharField(max_length=30)),
+                ('client_ts', models.DateTimeField()),
+                ('outcome', models.CharField(max_length=20)),
+                ('result', models.JSONField(default=dict)),
+                ('applied_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'key'), name='unique_operation_key_per_user')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-19 18:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sync', '0003_appliedoperation'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='appliedoperation',
+            name='applied_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
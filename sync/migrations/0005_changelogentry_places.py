@@ -0,0 +1,60 @@
+# Generated by Django 6.0.1 on 2026-10-19 19:32
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_places(apps, schema_editor):
+    """
+    Copies each shipment's owner and places onto its entries and its logs' entries.
+    Tombstones of rows already deleted keep a null owner_id.
+    """
+    ChangeLogEntry = apps.get_model('sync', 'ChangeLogEntry')
+    Shipment = apps.get_model('domestic', 'Shipment')
+    ShipmentLog = apps.get_model('domestic', 'ShipmentLog')
+
+    for model_name, rows, prefix in (
+        ('shipment', Shipment.objects.filter(pk=OuterRef('object_id')), ''),
+        ('shipment_log', ShipmentLog.objects.filter(pk=OuterRef('object_id')), 'shipment__'),
+    ):
+        ChangeLogEntry.objects.filter(model=model_name).update(
+            owner_id=Subquery(rows.values(f'{prefix}owner_id')[:1]),
+            origin_location=Coalesce(Subquery(rows.values(f'{prefix}origin_location')[:1]), Value('')),
+            destination_location=Coalesce(Subquery(rows.values(f'{prefix}destination_location')[:1]), Value('')),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sync', '0004_appliedoperation_applied_at_index'),
+        ('domestic', '0004_shipment_locations'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='changelogentry',
+            name='unique_change_per_object',
+        ),
+        migrations.AddField(
+            model_name='changelogentry',
+            name='destination_location',
+            field=models.CharField(blank=True, max_length=60),
+        ),
+        migrations.AddField(
+            model_name='changelogentry',
+            name='origin_location',
+            field=models.CharField(blank=True, max_length=60),
+        ),
+        migrations.AddField(
+            model_name='changelogentry',
+            name='owner_id',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_places, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='changelogentry',
+            constraint=models.UniqueConstraint(condition=models.Q(('op', 'U')), fields=('model', 'object_id'), name='one_live_change_per_object'),
+        ),
+    ]
@@ -0,0 +1,77 @@
+from django.conf import settings
+from django.db import models
+
+
+class ChangeLogEntry(models.Model):
+    """
+    The latest change to one synced row (Shipment, ShipmentLog or InternationalCargo).
+    Each write replaces the row's previous entry with a new one, so `seq` only
+    grows and the table holds one live entry per object. Deleted objects keep a
+    tombstone, and so do the places a shipment moved away from (sync/tracking.py).
+    A client's sync token is the last `seq` it has seen.
+    """
+    SHIPMENT = 'shipment'
+    SHIPMENT_LOG = 'shipment_log'
+    CARGO = 'cargo'
+    MODEL_CHOICES = [
+        (SHIPMENT, 'Shipment'),
+        (SHIPMENT_LOG, 'Shipment Log'),
+        (CARGO, 'International Cargo'),
+    ]
+
+    UPSERT = 'U'
+    DELETE = 'D'
+    OP_CHOICES = [
+        (UPSERT, 'Created or Updated'),
+        (DELETE, 'Deleted'),
+    ]
+
+    # AUTOINCREMENT on SQLite: a seq is never reused, even after its entry is replaced
+    seq = models.BigAutoField(primary_key=True)
+    model = models.CharField(max_length=20, choices=MODEL_CHOICES)
+    object_id = models.PositiveBigIntegerField()
+    op = models.CharField(max_length=1, choices=OP_CHOICES, default=UPSERT)
+
+    # Owner pk for rows only their owner may see (cargo); null = filtered by manifest
+    visible_to = models.PositiveBigIntegerField(null=True, blank=True)
+
+    # The shipment's manifest columns (for a log, its shipment's), so entries are
+    # filtered with the same Q as the shipment list (domestic/manifests.py).
+    # owner_id is null on cargo, and on tombstones written before these columns.
+    owner_id = models.PositiveBigIntegerField(null=True, blank=True)
+    origin_location = models.CharField(max_length=60, blank=True)
+    destination_location = models.CharField(max_length=60, blank=True)
+    changed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['model', 'object_id'], condition=models.Q(op='U'), name='one_live_change_per_object'
+            ),
+        ]
+
+    def __str__(self):
+        return f"#{self.seq} {self.op} {self.model}:{self.object_id}"
+
+
+class AppliedOperation(models.Model):
+    """
+    An offline operation that has been replayed, keyed by the client's idempotency key.
+    Replaying the same key again returns the stored result instead of re-applying it.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    key = models.CharField(max_length=64)
+    op_type = models.CharField(max_length=30)
+    client_ts = models.DateTimeField()
+    outcome = models.CharField(max_length=20)
+    result = models.JSONField(default=dict)
+    # Indexed for prune_applied_operations
+    applied_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_operation_key_per_user'),
+        ]
+
+    def __str__(self):
+        return f"{self.key} ({self.op_type}: {self.outcome})"
@@ -0,0 +1,187 @@
+"""
+Replays the operations an agent's tablet queued while it was offline.
+
+A batch is an ordered list of operations, each with a client-generated
+idempotency key and the time it happened on the tablet (client_ts):
+
+    {"key": "...", "type": "create_shipment", "client_ts": "...", "data": {"origin": ..., "destination": ...}}
+    {"key": "...", "type": "update_status", "client_ts": "...", "shipment_id": 12,
+     "data": {"status": "IN_TRANSIT", "location": "Muhanga"}}
+
+An update_status can point at a shipment created earlier (in this batch or a
+previous one) with "shipment_key" instead of "shipment_id".
+
+The whole batch runs in one transaction and every operation in a savepoint, so
+one bad operation is reported without undoing the others. Keys that were
+already applied are skipped and their stored result is returned. Status
+conflicts are decided by client_ts: an update older than the shipment's
+current status_changed_at is "superseded" and not applied, so the final
+status is the same whatever order the tablets reconnect in. Updates the status
+state machine does not allow (e.g. after DELIVERED) are reported as errors.
+
+A scan may only target a shipment the user can list (manifest_queryset():
+an agent's area, a customer's own shipments, everything for admins);
+anything else is reported as not found. Applied keys are kept for
+REPLAY_KEY_RETENTION_DAYS, see the prune_applied_operations command.
+"""
+import logging
+from datetime import timezone as dt_timezone
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from domestic.manifests import manifest_queryset
+from domestic.models import Shipment
+from domestic.serializers import ShipmentSerializer
+from domestic.services import StaleShipmentError, StatusTransitionError, record_status_update
+
+from .models import AppliedOperation
+
+logger = logging.getLogger(__name__)
+
+MAX_OPERATIONS = 500
+
+CREATE_SHIPMENT = 'create_shipment'
+UPDATE_STATUS = 'update_status'
+
+VALID_STATUSES = {code for code, _ in Shipment.STATUS_CHOICES}
+
+
+class OperationError(Exception):
+    """
+    An operation that cannot be applied; reported back with its errors.
+    """
+
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+def parse_client_ts(value, now):
+    """
+    Parses the client's ISO 8601 timestamp. Naive times are taken as UTC and
+    times in the future (bad tablet clock) are clamped to now, so one wrong
+    clock cannot freeze a shipment's status.
+    """
+    client_ts = parse_datetime(value) if isinstance(value, str) else None
+    if client_ts is None:
+        raise OperationError({"client_ts": ["A valid ISO 8601 timestamp is required."]})
+    if timezone.is_naive(client_ts):
+        client_ts = timezone.make_aware(client_ts, dt_timezone.utc)
+    return min(client_ts, now)
+
+
+class BatchReplay:
+    """
+    State for one batch: earlier results, shipments created so far and the SMS to send.
+    """
+
+    def __init__(self, user, keys):
+        self.user = user
+        self.now = timezone.now()
+        self.applied = {op.key: op for op in AppliedOperation.objects.filter(user=user, key__in=keys)}
+        self.notifications = []  # (phone, message), sent by the view after commit
+
+    def replay(self, operation):
+        key = operation.get('key') if isinstance(operation, dict) else None
+        if not isinstance(key, str) or not 0 < len(key) <= 64:
+            return {"key": key, "outcome": "error", "errors": {"key": ["A key of 1-64 characters is required."]}}
+
+        # 1. Already applied (a retried batch, or a repeat inside this one)
+        previous = self.applied.get(key)
+        if previous is not None:
+            return {"key": key, "outcome": previous.outcome, "replayed": True, "result": previous.result}
+
+        handlers = {CREATE_SHIPMENT: self.create_shipment, UPDATE_STATUS: self.update_status}
+        handler = handlers.get(operation.get('type'))
+        if handler is None:
+            return {"key": key, "outcome": "error", "errors": {"type": [f"Must be one of {sorted(handlers)}."]}}
+
+        # 2. Apply it in a savepoint, together with its idempotency record
+        try:
+            with transaction.atomic():
+                client_ts = parse_client_ts(operation.get('client_ts'), self.now)
+                outcome, result = handler(operation, client_ts)
+                self.applied[key] = AppliedOperation.objects.create(
+                    user=self.user, key=key, op_type=operation['type'],
+                    client_ts=client_ts, outcome=outcome, result=result,
+                )
+        except OperationError as error:
+            return {"key": key, "outcome": "error", "errors": error.errors}
+        except IntegrityError:
+            if AppliedOperation.objects.filter(user=self.user, key=key).exists():
+                # The same key was applied by a concurrent request
+                return {"key": key, "outcome": "error", "errors": {"key": ["Already being applied."]}}
+            logger.exception("Replay of operation %s failed", key)
+            return {"key": key, "outcome": "error", "errors": {"non_field_errors": ["Could not be applied."]}}
+
+        return {"key": key, "outcome": outcome, "replayed": False, "result": result}
+
+    def create_shipment(self, operation, client_ts):
+        serializer = ShipmentSerializer(data=operation.get('data') or {})
+        if not serializer.is_valid():
+            raise OperationError(serializer.errors)
+
+        shipment = serializer.save(owner=self.user)
+        return "applied", {"id": shipment.pk, "tracking_number": shipment.tracking_number}
+
+    def update_status(self, operation, client_ts):
+        data = operation.get('data') or {}
+        new_status = data.get('status')
+        if new_status not in VALID_STATUSES:
+            raise OperationError({"status": [f"Must be one of {sorted(VALID_STATUSES)}."]})
+
+        shipment = self._target_shipment(operation)
+
+        # Last writer wins by client time; ties keep the status already stored
+        if shipment.status_changed_at is not None and client_ts <= shipment.status_changed_at:
+            return "superseded", {"id": shipment.pk, "current_status": shipment.current_status}
+
+        location = str(data.get('location') or 'Unknown Location')[:100]
+        try:
+            record_status_update(shipment, new_status, location, changed_at=client_ts)
+        except StatusTransitionError as error:
+            raise OperationError({"status": [str(error)]})
+        except StaleShipmentError:
+            # Not recorded as applied, so the tablet retries it with its next batch
+            raise OperationError({"shipment_id": ["Changed by another request, retry."]})
+        self.notifications.append(
+            (shipment.owner.phone, f"Your package is now {new_status} at {location}")
+        )
+        return "applied", {"id": shipment.pk, "current_status": new_status}
+
+    def _target_shipment(self, operation):
+        shipment_id = operation.get('shipment_id')
+        shipment_key = operation.get('shipment_key')
+        if shipment_id is None and shipment_key is not None:
+            created = self.applied.get(shipment_key) or (
+                AppliedOperation.objects.filter(user=self.user, key=shipment_key).first()
+            )
+            if created is None or created.op_type != CREATE_SHIPMENT:
+                raise OperationError({"shipment_key": ["No applied create_shipment has this key."]})
+            shipment_id = created.result['id']
+
+        # Only shipments this user may see. No row lock: record_status_update
+        # only applies if the shipment's version is unchanged. bool is an int
+        # subclass, but true/false are not shipment IDs
+        is_id = isinstance(shipment_id, int) and not isinstance(shipment_id, bool)
+        shipment = (
+            manifest_queryset(self.user).select_related('owner')
+            .filter(pk=shipment_id).first() if is_id else None
+        )
+        if shipment is None:
+            raise OperationError({"shipment_id": ["Shipment not found."]})
+        return shipment
+
+
+def replay_operations(user, operations):
+    """
+    Applies a batch in one transaction. Returns (results, notifications).
+    """
+    keys = [op.get('key') for op in operations if isinstance(op, dict) and isinstance(op.get('key'), str)]
+
+    with transaction.atomic():
+        batch = BatchReplay(user, keys)
+        results = [batch.replay(operation) for operation in operations]
+    return results, batch.notifications
@@ -0,0 +1,304 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError, IntegrityError
+from django.utils import timezone
+from django.test import AsyncClient, TestCase
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.models import User
+from domestic.models import Shipment
+from domestic.services import record_status_update
+from international.models import InternationalCargo
+from international.reconciliation import reconcile_clearances
+from .models import AppliedOperation, ChangeLogEntry
+
+
+class DeltaSyncTests(TestCase):
+    """
+    Tests for the delta sync endpoint used by agent tablets.
+    """
+    url = '/api/sync/changes/'
+
+    def setUp(self):
+        self.agent = User.objects.create_user(
+            username='+250788000030', phone='+250788000030', password='pass12345', role='AGENT'
+        )
+        self.other = User.objects.create_user(
+            username='+250788000031', phone='+250788000031', password='pass12345', role='AGENT'
+        )
+        self.shipments = [
+            Shipment.objects.create(owner=self.agent, origin='Kigali', destination='Huye')
+            for _ in range(3)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.agent)
+
+    def sync(self, token=None, **params):
+        if token is not None:
+            params['token'] = token
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_first_sync_returns_everything(self):
+        """Without a token the whole manifest comes back."""
+        data = self.sync()
+        self.assertEqual({row['id'] for row in data['changes']['shipment']}, {s.pk for s in self.shipments})
+        self.assertFalse(data['has_more'])
+
+    def test_delta_only_contains_changes(self):
+        """After a status update, only that shipment and its new log entry are sent."""
+        token = self.sync()['token']
+        record_status_update(self.shipments[1], 'IN_TRANSIT', 'Muhanga')
+
+        data = self.sync(token)
+        self.assertEqual([row['id'] for row in data['changes']['shipment']], [self.shipments[1].pk])
+        self.assertEqual(data['changes']['shipment'][0]['current_status'], 'IN_TRANSIT')
+        self.assertEqual(len(data['changes']['shipment_log']), 1)
+
+        # Nothing new: same empty answer, same token
+        again = self.sync(data['token'])
+        self.assertEqual(again['changes']['shipment'], [])
+        self.assertEqual(again['token'], data['token'])
+
+    def test_deletions_are_reported(self):
+        """Deleted rows come back as ids under 'deleted'."""
+        token = self.sync()['token']
+        deleted_pk = self.shipments[0].pk
+        self.shipments[0].delete()
+
+        data = self.sync(token)
+        self.assertEqual(data['deleted']['shipment'], [deleted_pk])
+
+    def test_pages_follow_the_token(self):
+        """Small pages chain through has_more / token without losing rows."""
+        seen, token = set(), None
+        for _ in range(5):
+            data = self.sync(token, limit=2)
+            seen |= {row['id'] for row in data['changes']['shipment']}
+            token = data['token']
+            if not data['has_more']:
+                break
+        self.assertEqual(seen, {s.pk for s in self.shipments})
+
+    def test_log_keeps_one_entry_per_object(self):
+        """Repeated updates replace the object's entry instead of growing the log."""
+        for status in ('IN_TRANSIT', 'DELIVERED'):
+            record_status_update(self.shipments[0], status, 'Huye')
+        self.assertEqual(
+            ChangeLogEntry.objects.filter(model=ChangeLogEntry.SHIPMENT, object_id=self.shipments[0].pk).count(), 1
+        )
+
+    def test_cargo_is_private_and_bulk_writes_are_tracked(self):
+        """Bulk-ingested and reconciled cargo is synced, but only to its owner."""
+        InternationalCargo.objects.create(
+            owner=self.other, manifest_id='EAC-900', tin_number='T', destination_country='UG', weight_kg=5
+        )
+        upload = SimpleUploadedFile('m.csv', b"manifest_id,tin_number,destination_country,weight_kg\nEAC-901,T,TZ,9\n")
+        self.client.post('/api/international/cargo/bulk/', {'file': upload}, format='multipart')
+
+        data = self.sync()
+        self.assertEqual([row['manifest_id'] for row in data['changes']['cargo']], ['EAC-901'])
+
+        reconcile_clearances(['EAC-901'])
+        cleared = self.sync(data['token'])
+        self.assertTrue(cleared['changes']['cargo'][0]['is_customs_cleared'])
+
+    def test_shipments_are_limited_to_the_manifest(self):
+        """Shipments and their logs only reach users who can list them."""
+        record_status_update(self.shipments[0], 'IN_TRANSIT', 'Muhanga')
+        self.client.force_authenticate(self.other)
+        data = self.sync()
+        self.assertEqual(data['changes']['shipment'], [])
+        self.assertEqual(data['changes']['shipment_log'], [])
+        self.assertEqual(data['deleted']['shipment'], [])
+
+        # An agent whose area contains the destination pulls them
+        self.other.assigned_sector = 'Huye'
+        self.other.save()
+        data = self.sync()
+        self.assertEqual({row['id'] for row in data['changes']['shipment']}, {s.pk for s in self.shipments})
+        self.assertEqual(len(data['changes']['shipment_log']), 1)
+
+    def test_pages_are_filtered_before_the_limit(self):
+        """Other users' churn does not turn a delta into empty pages."""
+        token = self.sync()['token']
+        for _ in range(5):
+            Shipment.objects.create(owner=self.other, origin='Musanze', destination='Rubavu')
+        mine = Shipment.objects.create(owner=self.agent, origin='Kigali', destination='Huye')
+
+        data = self.sync(token, limit=2)
+        self.assertEqual([row['id'] for row in data['changes']['shipment']], [mine.pk])
+        self.assertFalse(data['has_more'])
+
+    def test_moving_off_the_manifest_is_a_deletion(self):
+        """A shipment that moves is deleted for the agents it left and arrives, with its logs, for the new ones."""
+        self.agent.assigned_sector = 'Huye'
+        self.agent.save()
+        self.other.assigned_sector = 'Musanze'
+        self.other.save()
+        record_status_update(self.shipments[0], 'IN_TRANSIT', 'Muhanga')
+        huye_token = self.sync()['token']
+        self.client.force_authenticate(self.other)
+        musanze_token = self.sync()['token']
+
+        shipment = Shipment.objects.get(pk=self.shipments[0].pk)
+        shipment.destination = 'Musanze'
+        shipment.save()
+
+        moved_in = self.sync(musanze_token)
+        self.assertEqual([row['id'] for row in moved_in['changes']['shipment']], [shipment.pk])
+        self.assertEqual(len(moved_in['changes']['shipment_log']), 1)
+        self.client.force_authenticate(self.agent)
+        moved_out = self.sync(huye_token)
+        self.assertEqual(moved_out['changes']['shipment'], [])
+        self.assertEqual(moved_out['deleted']['shipment'], [shipment.pk])
+        self.assertEqual(len(moved_out['deleted']['shipment_log']), 1)
+
+    async def test_create_and_its_entry_commit_together(self):
+        """A create whose change log entry fails is rolled back instead of never being synced."""
+        refresh = await sync_to_async(RefreshToken.for_user)(self.agent)
+        client = AsyncClient(raise_request_exception=False)
+        with mock.patch('sync.tracking.write_entries', side_effect=DatabaseError('disk I/O error')):
+            response = await client.post(
+                '/api/domestic/shipments/', {'origin': 'Kigali', 'destination': 'Huye'},
+                content_type='application/json', headers={'Authorization': f'Bearer {refresh.access_token}'},
+            )
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(await Shipment.objects.acount(), 3)
+
+    def test_location_normalisation_is_synced(self):
+        """Shipments rewritten by normalize_shipment_locations come back in the next delta, and only they do."""
+        Shipment.objects.filter(pk=self.shipments[0].pk).update(destination_location='')
+        token = self.sync()['token']
+        call_command('normalize_shipment_locations', stdout=StringIO())
+
+        data = self.sync(token)
+        self.assertEqual([row['id'] for row in data['changes']['shipment']], [self.shipments[0].pk])
+        self.assertEqual(data['changes']['shipment'][0]['destination_location'], 'RW/SOUTHERN/HUYE')
+
+    def test_bad_token_rejected(self):
+        """A malformed token is a 400, not a full resync."""
+        response = self.client.get(self.url, {'token': 'abc'})
+        self.assertEqual(response.status_code, 400)
+
+
+@mock.patch('sync.views.send_sms_notification', new_callable=mock.AsyncMock)
+class BatchReplayTests(TestCase):
+    """
+    Tests for replaying operations queued on a tablet while offline.
+    """
+    url = '/api/sync/batch/'
+
+    def setUp(self):
+        self.agent = User.objects.create_user(
+            username='+250788000032', phone='+250788000032', password='pass12345', role='AGENT'
+        )
+        self.shipment = Shipment.objects.create(owner=self.agent, origin='Kigali', destination='Huye')
+        self.client = APIClient()
+        self.client.force_authenticate(self.agent)
+
+    def replay(self, *operations):
+        response = self.client.post(self.url, {'operations': list(operations)}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.data['results']
+
+    def scan(self, key, status, client_ts, **target):
+        target = target or {'shipment_id': self.shipment.pk}
+        return {
+            'key': key, 'type': 'update_status', 'client_ts': client_ts,
+            'data': {'status': status, 'location': 'Muhanga'}, **target,
+        }
+
+    def test_create_then_scan_in_one_batch(self, send_sms):
+        """A scan can target a shipment created earlier in the same batch."""
+        results = self.replay(
+            {'key': 'c1', 'type': 'create_shipment', 'client_ts': '2026-01-05T08:00:00Z',
+             'data': {'origin': 'Rubavu', 'destination': 'Kigali'}},
+            self.scan('s1', 'IN_TRANSIT', '2026-01-05T09:00:00Z', shipment_key='c1'),
+        )
+        self.assertEqual([r['outcome'] for r in results], ['applied', 'applied'])
+        created = Shipment.objects.get(pk=results[0]['result']['id'])
+        self.assertEqual(created.current_status, 'IN_TRANSIT')
+        send_sms.assert_awaited_once()
+
+    def test_retried_batch_is_not_applied_twice(self, send_sms):
+        """Keys already applied return their stored result and write nothing."""
+        batch = [{'key': 'c2', 'type': 'create_shipment', 'client_ts': '2026-01-05T08:00:00Z',
+                  'data': {'origin': 'Huye', 'destination': 'Kigali'}}]
+        first = self.replay(*batch)
+        second = self.replay(*batch)
+
+        self.assertTrue(second[0]['replayed'])
+        self.assertEqual(second[0]['result'], first[0]['result'])
+        self.assertEqual(Shipment.objects.count(), 2)
+
+    def test_older_scan_is_superseded(self, send_sms):
+        """Whatever the upload order, the scan with the latest client time wins."""
+        results = self.replay(
+            self.scan('late', 'FAILED', '2026-01-05T12:00:00Z'),
+            self.scan('early', 'IN_TRANSIT', '2026-01-05T10:00:00Z'),
+        )
+        self.assertEqual([r['outcome'] for r in results], ['applied', 'superseded'])
+        self.shipment.refresh_from_db()
+        self.assertEqual(self.shipment.current_status, 'FAILED')
+
+    def test_bad_operation_does_not_undo_the_rest(self, send_sms):
+        """An invalid operation is reported; the others in the batch still apply."""
+        results = self.replay(
+            self.scan('ok', 'IN_TRANSIT', '2026-01-05T10:00:00Z'),
+            self.scan('bad', 'LOST', '2026-01-05T11:00:00Z'),
+            self.scan('missing', 'FAILED', '2026-01-05T11:00:00Z', shipment_id=999999),
+        )
+        self.assertEqual([r['outcome'] for r in results], ['applied', 'error', 'error'])
+        self.assertEqual(set(AppliedOperation.objects.values_list('key', flat=True)), {'ok'})
+        self.shipment.refresh_from_db()
+        self.assertEqual(self.shipment.current_status, 'IN_TRANSIT')
+
+    def test_scans_are_limited_to_visible_shipments(self, send_sms):
+        """A user cannot replay a scan onto a shipment outside their manifest."""
+        stranger = User.objects.create_user(username='+250788000033', phone='+250788000033', password='pass12345')
+        self.client.force_authenticate(stranger)
+
+        [result] = self.replay(self.scan('theirs', 'IN_TRANSIT', '2026-01-05T10:00:00Z'))
+
+        self.assertEqual(result['errors'], {"shipment_id": ["Shipment not found."]})
+        self.shipment.refresh_from_db()
+        self.assertEqual(self.shipment.current_status, 'PENDING')
+
+    def test_booleans_are_not_shipment_ids(self, send_sms):
+        """true/false are not taken as primary keys 1/0."""
+        [result] = self.replay(self.scan('bool', 'IN_TRANSIT', '2026-01-05T10:00:00Z', shipment_id=True))
+
+        self.assertEqual(result['errors'], {"shipment_id": ["Shipment not found."]})
+        self.shipment.refresh_from_db()
+        self.assertEqual(self.shipment.current_status, 'PENDING')
+
+    def test_other_integrity_errors_are_not_key_conflicts(self, send_sms):
+        """Only a clash on the operation key is reported as 'Already being applied'."""
+        with mock.patch('sync.replay.ShipmentSerializer.save', side_effect=IntegrityError('boom')), \
+                self.assertLogs('sync.replay', level='ERROR'):
+            [result] = self.replay({'key': 'c9', 'type': 'create_shipment', 'client_ts': '2026-01-05T08:00:00Z',
+                                    'data': {'origin': 'Huye', 'destination': 'Kigali'}})
+        self.assertEqual(result['errors'], {"non_field_errors": ["Could not be applied."]})
+
+    def test_prune_removes_old_keys(self, send_sms):
+        """prune_applied_operations deletes keys past the retention window only."""
+        self.replay(self.scan('old', 'IN_TRANSIT', '2026-01-05T10:00:00Z'))
+        self.replay(self.scan('new', 'FAILED', '2026-01-05T11:00:00Z'))
+        AppliedOperation.objects.filter(key='old').update(applied_at=timezone.now() - timedelta(days=31))
+
+        call_command('prune_applied_operations', '--days', '30', stdout=StringIO())
+
+        self.assertEqual(list(AppliedOperation.objects.values_list('key', flat=True)), ['new'])
+
+    def test_empty_batch_rejected(self, send_sms):
+        """A request without operations is a 400."""
+        response = self.client.post(self.url, {'operations': []}, format='json')
+        self.assertEqual(response.status_code, 400)
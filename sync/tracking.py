@@ -0,0 +1,205 @@
+"""
+Keeps the sync change log in step with the synced models.
+
+Single saves and deletes arrive through post_save / post_delete. Bulk and
+conditional updates skip those signals, so the apps announce them
+themselves: shipment_status_changed (status transitions), shipments_relocated
+(location normalisation), cargo_created (bulk ingest) and customs_cleared
+(reconciliation).
+
+Shipment and shipment log entries carry the shipment's owner and places, so
+the sync view filters them by manifest in SQL. When a save moves a shipment,
+it and its logs get tombstones at the old places before their entries at the
+new ones: agents whose manifest it left pull a deletion, agents whose
+manifest it joined pull it with its history.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from domestic.models import Shipment, ShipmentLog
+from domestic.signals import shipment_status_changed, shipments_relocated
+from international.models import InternationalCargo
+from international.signals import cargo_created, customs_cleared
+
+from .models import ChangeLogEntry
+
+MODEL_NAMES = {
+    Shipment: ChangeLogEntry.SHIPMENT,
+    ShipmentLog: ChangeLogEntry.SHIPMENT_LOG,
+    InternationalCargo: ChangeLogEntry.CARGO,
+}
+
+# The manifest columns copied from a shipment onto its entries and its logs' entries
+PLACE_FIELDS = ('owner_id', 'origin_location', 'destination_location')
+
+
+def places(shipment):
+    return {field: getattr(shipment, field) for field in PLACE_FIELDS}
+
+
+def write_entries(entries):
+    """
+    Inserts new entries (seqs follow the list order), replacing the live entries
+    of their objects: one DELETE and one INSERT in all. Tombstones are kept.
+    """
+    if not entries:
+        return
+
+    object_ids = defaultdict(set)
+    for entry in entries:
+        object_ids[entry.model].add(entry.object_id)
+    stale = Q()
+    for model_name, ids in object_ids.items():
+        stale |= Q(model=model_name, object_id__in=sorted(ids))
+    # No savepoint inside the caller's transaction: a failure here rolls back the write it records
+    with transaction.atomic(savepoint=False):
+        ChangeLogEntry.objects.filter(stale, op=ChangeLogEntry.UPSERT).delete()
+        ChangeLogEntry.objects.bulk_create(entries)
+
+
+def record_changes(model_name, object_ids, op=ChangeLogEntry.UPSERT, visible_to=None, shipment=None):
+    """
+    Replaces the log entries of these objects with fresh ones (new, higher seqs).
+    visible_to makes them private to that user (cargo); shipment gives them its places.
+    """
+    record_many({model_name: object_ids}, op, visible_to, shipment)
+
+
+def record_many(changes, op=ChangeLogEntry.UPSERT, visible_to=None, shipment=None):
+    """
+    record_changes() for several models at once ({model name: object ids}).
+    """
+    shipment_places = places(shipment) if shipment is not None else {}
+    write_entries([
+        ChangeLogEntry(model=model_name, object_id=object_id, op=op, visible_to=visible_to, **shipment_places)
+        for model_name, object_ids in changes.items()
+        for object_id in object_ids
+    ])
+
+
+def record_shipments(shipments):
+    """
+    Fresh entries for saved shipments whose places may have changed. A shipment
+    that moved gets tombstones for itself and its logs at the places its live
+    entry has, and its logs are recorded again at the new places.
+    """
+    current = {shipment.pk: places(shipment) for shipment in shipments}
+    if not current:
+        return
+
+    with transaction.atomic():
+        # 1. Where the log last put them
+        before = {
+            row[0]: dict(zip(PLACE_FIELDS, row[1:]))
+            for row in ChangeLogEntry.objects.filter(
+                model=ChangeLogEntry.SHIPMENT, object_id__in=sorted(current), op=ChangeLogEntry.UPSERT,
+            ).values_list('object_id', *PLACE_FIELDS)
+        }
+        moved = sorted(pk for pk, old in before.items() if old != current[pk])
+        logs = defaultdict(list)
+        for log_id, shipment_id in ShipmentLog.objects.filter(shipment_id__in=moved).values_list('pk', 'shipment_id'):
+            logs[shipment_id].append(log_id)
+
+        # 2. Tombstones first, so they get lower seqs than the entries at the new places
+        entries = []
+        for shipment_id in moved:
+            old = before[shipment_id]
+            entries.append(
+                ChangeLogEntry(model=ChangeLogEntry.SHIPMENT, object_id=shipment_id, op=ChangeLogEntry.DELETE, **old)
+            )
+            entries += [
+                ChangeLogEntry(model=ChangeLogEntry.SHIPMENT_LOG, object_id=log_id, op=ChangeLogEntry.DELETE, **old)
+                for log_id in logs[shipment_id]
+            ]
+        for shipment_id, shipment_places in current.items():
+            entries.append(ChangeLogEntry(model=ChangeLogEntry.SHIPMENT, object_id=shipment_id, **shipment_places))
+            entries += [
+                ChangeLogEntry(model=ChangeLogEntry.SHIPMENT_LOG, object_id=log_id, **shipment_places)
+                for log_id in logs[shipment_id]
+            ]
+        write_entries(entries)
+
+
+def record_deletions(model_name, object_ids):
+    """
+    Replaces the live entries of deleted shipments or logs with tombstones at
+    the same places, so the readers that had them are the ones told.
+    """
+    with transaction.atomic():
+        live = {
+            row[0]: dict(zip(PLACE_FIELDS, row[1:]))
+            for row in ChangeLogEntry.objects.filter(
+                model=model_name, object_id__in=object_ids, op=ChangeLogEntry.UPSERT,
+            ).values_list('object_id', *PLACE_FIELDS)
+        }
+        # Without a live entry the places are unknown: the tombstone goes to everyone
+        write_entries([
+            ChangeLogEntry(model=model_name, object_id=object_id, op=ChangeLogEntry.DELETE, **live.get(object_id, {}))
+            for object_id in object_ids
+        ])
+
+
+@receiver(post_save, sender=Shipment)
+def shipment_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return  # loaddata: the backfill migration covers fixtures
+    if created:
+        record_changes(ChangeLogEntry.SHIPMENT, [instance.pk], shipment=instance)
+    else:
+        record_shipments([instance])
+
+
+@receiver(post_save, sender=ShipmentLog)
+def log_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        record_changes(ChangeLogEntry.SHIPMENT_LOG, [instance.pk], shipment=instance.shipment)
+
+
+@receiver(post_save, sender=InternationalCargo)
+def cargo_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        record_changes(ChangeLogEntry.CARGO, [instance.pk], visible_to=instance.owner_id)
+
+
+@receiver(post_delete, sender=Shipment)
+@receiver(post_delete, sender=ShipmentLog)
+@receiver(post_delete, sender=InternationalCargo)
+def object_deleted(sender, instance, **kwargs):
+    if sender is InternationalCargo:
+        record_changes(ChangeLogEntry.CARGO, [instance.pk], ChangeLogEntry.DELETE, visible_to=instance.owner_id)
+    else:
+        record_deletions(MODEL_NAMES[sender], [instance.pk])
+
+
+@receiver(shipment_status_changed)
+def shipment_status_updated(sender, shipment, log, **kwargs):
+    record_many({ChangeLogEntry.SHIPMENT: [shipment.pk], ChangeLogEntry.SHIPMENT_LOG: [log.pk]}, shipment=shipment)
+
+
+@receiver(shipments_relocated)
+def shipments_moved(sender, shipment_ids, **kwargs):
+    shipments = Shipment.objects.filter(pk__in=shipment_ids).only('owner', 'origin_location', 'destination_location')
+    record_shipments(shipments)
+
+
+@receiver(cargo_created)
+def cargo_bulk_created(sender, cargo, **kwargs):
+    by_owner = {}
+    for item in cargo:
+        by_owner.setdefault(item.owner_id, []).append(item.pk)
+    for owner_id, cargo_ids in by_owner.items():
+        record_changes(ChangeLogEntry.CARGO, cargo_ids, visible_to=owner_id)
+
+
+@receiver(customs_cleared)
+def cargo_cleared(sender, cargo_ids, **kwargs):
+    owners = InternationalCargo.objects.filter(pk__in=cargo_ids).values_list('pk', 'owner_id')
+    by_owner = {}
+    for cargo_id, owner_id in owners:
+        by_owner.setdefault(owner_id, []).append(cargo_id)
+    for owner_id, ids in by_owner.items():
+        record_changes(ChangeLogEntry.CARGO, ids, visible_to=owner_id)
@@ -0,0 +1,10 @@
+from django.urls import path
+from .views import BatchReplayView, DeltaSyncView
+
+urlpatterns = [
+    # Agent tablets: only what changed since the last sync token
+    path('changes/', DeltaSyncView.as_view(), name='sync-changes'),
+
+    # Agent tablets: replay operations queued while offline
+    path('batch/', BatchReplayView.as_view(), name='sync-batch'),
+]
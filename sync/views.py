@@ -0,0 +1,181 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.db.models import Max, Q
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from drf_spectacular.utils import extend_schema, OpenApiParameter
+from ishemalink.async_views import AsyncAPIView
+from ishemalink.db_router import ReadReplicaMixin
+
+from domestic.manifests import manifest_filter, manifest_queryset
+from domestic.models import Shipment, ShipmentLog
+from domestic.utils import send_sms_notification
+from international.models import InternationalCargo
+
+from .models import ChangeLogEntry
+from .replay import MAX_OPERATIONS, replay_operations
+
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 2000
+
+# What a tablet needs per row; same fields as the list endpoints, minus nested logs
+SYNC_FIELDS = {
+    ChangeLogEntry.SHIPMENT: (
+        Shipment, [
+            'id', 'tracking_number', 'current_status', 'origin', 'destination', 'created_at', 'status_changed_at',
+            'origin_location', 'destination_location', 'destination_zone', 'version',
+        ],
+    ),
+    ChangeLogEntry.SHIPMENT_LOG: (
+        ShipmentLog, ['id', 'shipment_id', 'status', 'location', 'timestamp'],
+    ),
+    ChangeLogEntry.CARGO: (
+        InternationalCargo, [
+            'id', 'manifest_id', 'tin_number', 'passport_number', 'destination_country',
+            'weight_kg', 'is_customs_cleared', 'created_at',
+        ],
+    ),
+}
+
+
+def visible_entries(user):
+    """
+    The change log entries a user may pull: their own cargo, and shipment and log
+    entries whose places are on their manifest. Tombstones written before entries
+    had places (null owner_id) go to everyone; they only carry an id.
+    """
+    shared = Q(visible_to__isnull=True)
+    manifest = manifest_filter(user)
+    if manifest is not None:
+        shared &= Q(owner_id__isnull=True) | manifest
+    return Q(visible_to=user.pk) | shared
+
+
+def visible_rows(model_name, user):
+    """
+    The rows of a synced model the user may pull: shipments (and logs) on their
+    manifest. Cargo entries are already narrowed to the owner by visible_to.
+    """
+    if model_name == ChangeLogEntry.SHIPMENT:
+        return manifest_queryset(user)
+    if model_name == ChangeLogEntry.SHIPMENT_LOG:
+        return ShipmentLog.objects.filter(shipment__in=manifest_queryset(user))
+    return SYNC_FIELDS[model_name][0].objects.all()
+
+
+class DeltaSyncView(ReadReplicaMixin, APIView):
+    """
+    GET /api/sync/changes/?token=<token>&limit=500
+    Returns the shipments and shipment logs on the user's manifest and their own
+    cargo created, changed or deleted since the token, oldest change first, plus the token to send next
+    time. Without a token the whole manifest is returned, page by page.
+    Keep calling with the new token while has_more is true.
+    """
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter('token', str, description="Sync token from the previous response (omit for a full sync)."),
+            OpenApiParameter('limit', int, description=f"Changes per page (max {MAX_LIMIT})."),
+        ],
+        responses={200: None},
+        description="Delta sync for agent tablets: only rows changed or deleted since the token."
+    )
+    def get(self, request):
+        # 1. Parse the token and page size
+        try:
+            since = int(request.query_params.get('token') or 0)
+            limit = min(int(request.query_params.get('limit', DEFAULT_LIMIT)), MAX_LIMIT)
+        except ValueError:
+            return Response({"error": "token and limit must be integers."}, status=status.HTTP_400_BAD_REQUEST)
+        if since < 0 or limit < 1:
+            return Response({"error": "token and limit must be positive."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # 2. Read the newest seq BEFORE the page, so nothing committed in between is skipped
+        newest = ChangeLogEntry.objects.aggregate(newest=Max('seq'))['newest'] or 0
+
+        # 3. One page of this user's changes, by seq (primary key index), filtered before the LIMIT
+        entries = list(
+            ChangeLogEntry.objects
+            .filter(visible_entries(request.user), seq__gt=since)
+            .order_by('seq')
+            .values_list('seq', 'model', 'object_id', 'op')[:limit + 1]
+        )
+        has_more = len(entries) > limit
+        entries = entries[:limit]
+
+        # 4. Fetch the changed rows with one query per model
+        upserts = {name: [] for name in SYNC_FIELDS}
+        deleted = {name: [] for name in SYNC_FIELDS}
+        for _, model_name, object_id, op in entries:
+            (upserts if op == ChangeLogEntry.UPSERT else deleted)[model_name].append(object_id)
+
+        changes = {}
+        for model_name, object_ids in upserts.items():
+            rows = []
+            if object_ids:
+                fields = SYNC_FIELDS[model_name][1]
+                rows = list(visible_rows(model_name, request.user).filter(pk__in=object_ids).values(*fields))
+            # A row deleted or moved off the manifest after its entry was read: the client drops it now
+            found = {row['id'] for row in rows}
+            missing = [object_id for object_id in object_ids if object_id not in found]
+            # A move puts a tombstone at the old places and an entry at the new ones; if the
+            # user can see both, the row is still theirs
+            deleted[model_name] = list(dict.fromkeys(
+                object_id for object_id in deleted[model_name] + missing if object_id not in found
+            ))
+            changes[model_name] = rows
+
+        # 5. New token: the last seq sent, or the newest seq when this user has nothing left
+        if has_more:
+            next_token = entries[-1][0]
+        else:
+            next_token = max([since, newest] + [entry[0] for entry in entries[-1:]])
+
+        return Response({
+            "token": str(next_token),
+            "has_more": has_more,
+            "changes": changes,
+            "deleted": deleted,
+        })
+
+
+class BatchReplayView(AsyncAPIView):
+    """
+    POST /api/sync/batch/
+    Replays the creates and status scans a tablet queued while offline, in
+    order, in one transaction. Each operation carries an idempotency key and
+    its client timestamp; see sync/replay.py for the format. Returns one
+    result per operation: applied, superseded (older than the current status),
+    error, or the stored result of an already-applied key.
+    """
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        request=None,
+        responses={200: None},
+        description="Batch replay of queued offline operations with idempotency keys."
+    )
+    async def post(self, request):
+        # 1. Validate the envelope
+        operations = request.data.get('operations') if isinstance(request.data, dict) else None
+        if not isinstance(operations, list) or not operations:
+            return Response({"error": "Send a non-empty 'operations' list."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(operations) > MAX_OPERATIONS:
+            return Response(
+                {"error": f"At most {MAX_OPERATIONS} operations per batch."}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # 2. Apply the batch (DB work, one transaction)
+        results, notifications = await sync_to_async(replay_operations)(request.user, operations)
+
+        # 3. Customers get the same SMS as for live updates, sent concurrently after commit
+        await asyncio.gather(*(send_sms_notification(phone, message) for phone, message in notifications))
+
+        summary = {}
+        for result in results:
+            summary[result['outcome']] = summary.get(result['outcome'], 0) + 1
+        return Response({"summary": summary, "results": results}, status=status.HTTP_200_OK)